@@ -0,0 +1,356 @@
+#Benchmark del ETL con datos sintéticos (sin MongoDB): mide cada método de Transformation y cada
+#destino de Carga (SQLite con to_sql y por lotes, Excel con xlsxwriter u openpyxl) a varias escalas.
+#Los tiempos se toman con perfilado (mismas etapas que `main_etl.py --perfil`); de cada etapa se guarda
+#la mejor de N repeticiones. Cada corrida se guarda en benchmarks/resultados/ para compararla con otras,
+#y la sábana (y lo leído de SQLite) se compara por huella contra una corrida de referencia y contra los
+#caminos alternativos del ETL (procesos de texto, bloques de listings, esquema estrella, Excel en paralelo).
+#
+#Uso (desde la raíz del repositorio):
+#  python benchmarks/bench_etl.py --escalas 1 10 --guardar-referencia     # fija la referencia
+#  python benchmarks/bench_etl.py --escalas 1 10 --etiqueta mi_cambio      # mide y verifica equivalencia
+#  python benchmarks/bench_etl.py --escalas 1 10 --comparar benchmarks/resultados/<corrida>.json
+import argparse
+import hashlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+DIR_BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIR_BENCH, "..", "src"))
+
+import perfilado  # noqa: E402
+import plan_tipos  # noqa: E402
+import sintetico  # noqa: E402
+from carga import Carga  # noqa: E402
+from transformacion import Transformation  # noqa: E402
+
+DIR_RESULTADOS = os.path.join(DIR_BENCH, "resultados")
+RUTA_REFERENCIA = os.path.join(DIR_BENCH, "referencia.json")
+ESCALAS = [1, 10, 100]
+SINKS = ["sqlite_pandas", "sqlite_bulk", "excel_xlsxwriter", "excel_openpyxl"]
+SINKS_DEFECTO = ["sqlite_pandas", "sqlite_bulk", "excel_xlsxwriter"]
+# Variantes de ejecución verificadas contra la sábana serial (ver variantes_equivalentes)
+TEXT_WORKERS = 2
+FILAS_TEXTO_POR_BLOQUE = 64
+LISTINGS_POR_BLOQUE = 50
+EXCEL_WORKERS = 2
+FILAS_EXCEL_VARIANTE = 20_000
+
+
+# --------- Huellas para verificar equivalencia ---------
+#Forma canónica: columnas ordenadas, filas por (listing_id, date), category → object,
+#floats redondeados (evita diferencias de último bit) y nulos unificados.
+def _canonica(df):
+    df = df[sorted(map(str, df.columns))].copy() if len(df.columns) else df.copy()
+    claves = [c for c in ("listing_id", "date") if c in df.columns]
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype) or s.dtype == object:
+            s = s.astype(object)
+            df[c] = s.where(s.notna(), None).map(lambda v: None if v is None else str(v))
+        elif pd.api.types.is_float_dtype(s.dtype):
+            df[c] = s.astype("float64").round(9)
+        elif pd.api.types.is_bool_dtype(s.dtype) or pd.api.types.is_integer_dtype(s.dtype):
+            df[c] = s.astype("int64")
+    if claves:
+        df = df.sort_values(claves, kind="stable")
+    return df.reset_index(drop=True)
+
+
+def huella_df(df):
+    """Huella sha1 total y por columna de la forma canónica de df."""
+    df = _canonica(df)
+    por_columna = {}
+    for c in df.columns:
+        h = pd.util.hash_pandas_object(df[c], index=False).to_numpy()
+        por_columna[c] = hashlib.sha1(h.tobytes()).hexdigest()
+    total = hashlib.sha1(json.dumps(por_columna, sort_keys=True).encode("utf-8")).hexdigest()
+    return {"filas": len(df), "columnas": len(df.columns), "total": total, "por_columna": por_columna}
+
+
+def comparar_huellas(actual, referencia):
+    if referencia is None:
+        return {"estado": "sin_referencia"}
+    if actual["total"] == referencia["total"]:
+        return {"estado": "ok"}
+    a, r = actual["por_columna"], referencia["por_columna"]
+    return {
+        "estado": "distinta",
+        "filas": [actual["filas"], referencia["filas"]],
+        "columnas_distintas": sorted(c for c in a.keys() & r.keys() if a[c] != r[c]),
+        "columnas_nuevas": sorted(a.keys() - r.keys()),
+        "columnas_faltantes": sorted(r.keys() - a.keys()),
+    }
+
+
+def leer_sqlite(ruta, tabla):
+    conn = sqlite3.connect(ruta)
+    try:
+        return pd.read_sql(f'SELECT * FROM "{tabla}"', conn)
+    finally:
+        conn.close()
+
+
+# --------- Medición ---------
+def _sink(nombre, flat, directorio):
+    cg = Carga(flat, sqlite_path=os.path.join(directorio, "bench.db"))
+    if nombre == "sqlite_pandas":
+        cg.insertar_en_sqlite(f"bench_{nombre}")
+    elif nombre == "sqlite_bulk":
+        cg.insertar_en_sqlite_bulk(f"bench_{nombre}")
+    elif nombre.startswith("excel_"):
+        cg.exportar_a_excel_particionado(df=flat, base_path=os.path.join(directorio, nombre),
+                                         motor=nombre.split("_", 1)[1])
+
+
+def repeticion(datos, sinks, directorio, usar_tracemalloc=False):
+    """Una corrida completa medida: Transformation.run y cada sink. Retorna (registros, flat)."""
+    listings, calendar, reviews = datos
+    perfilador = perfilado.activar(perfilado.Perfilador(directorio, usar_tracemalloc=usar_tracemalloc,
+                                                        nombre="bench"))
+    try:
+        tf = Transformation(listings, calendar, reviews)
+        tf.run(text_workers=1)
+        flat = tf.flat_sheet
+        for nombre in sinks:
+            with perfilado.etapa(f"carga.{nombre}", len(flat)) as reg:
+                _sink(nombre, flat, directorio)
+                reg["filas_salida"] = len(flat)
+    finally:
+        perfilado.desactivar()
+    return perfilador.registros, flat
+
+
+#Entradas como las entrega Extraction con el plan de tipos: fechas como texto YYYY-MM-DD (colecciones
+#importadas del CSV de Inside Airbnb) y calendar/reviews con PLAN_TIPOS aplicado (date, available y price
+#como category), el caso que el benchmark con las entradas crudas no recorre
+def con_plan_tipos(datos):
+    listings, calendar, reviews = datos
+    tipadas = [listings]
+    for df, base in ((calendar, "calendar"), (reviews, "reviews")):
+        df = df.copy()
+        df["date"] = [d["$date"][:10] if isinstance(d, dict) else d for d in df["date"]]
+        plan_tipos.aplicar_tipos(df, base)
+        tipadas.append(df)
+    return tuple(tipadas)
+
+
+def sabana_con_plan_tipos(datos):
+    """Sábana de Transformation.run con las entradas tipadas como en la extracción (sin medir)."""
+    tf = Transformation(*con_plan_tipos(datos))
+    tf.run(text_workers=1)
+    return tf.flat_sheet
+
+
+def _leer_partes_excel(rutas):
+    return pd.concat([pd.read_excel(r, engine="openpyxl") for r in rutas], ignore_index=True)
+
+
+def variantes_equivalentes(datos, flat, directorio):
+    """
+    Las mismas entradas por los caminos alternativos del ETL (sin medir); cada uno debe dar la sábana serial:
+    - flat_sheet_text_workers: limpieza de texto largo en TEXT_WORKERS procesos (bloques chicos para que
+      a estas escalas el texto pase de verdad por el pool)
+    - flat_sheet_chunk_listings: iter_flat_sheet por bloques de LISTINGS_POR_BLOQUE listings, concatenados
+    - star_schema_vista: tablas del esquema estrella cargadas como en ejecutar_carga_estrella (sin su Excel) y
+      leídas de la vista, contra la sábana cargada con insertar_en_sqlite_bulk y leída de SQLite
+    - excel_paralelo: las primeras FILAS_EXCEL_VARIANTE filas en 4 partes escritas con EXCEL_WORKERS procesos
+      y releídas, contra las mismas partes escritas en secuencia (releer Excel es lento a escala 100)
+    Retorna {nombre: huella de la variante} y {nombre: huella contra la que se compara}.
+    """
+    huella_flat = huella_df(flat)
+    variantes, contra = {}, {}
+
+    tf = Transformation(*datos)
+    tf.text_chunk_rows = FILAS_TEXTO_POR_BLOQUE
+    tf.run(text_workers=TEXT_WORKERS)
+    variantes["flat_sheet_text_workers"], contra["flat_sheet_text_workers"] = huella_df(tf.flat_sheet), huella_flat
+
+    tf = Transformation(*datos)
+    bloques = list(tf.run(text_workers=1, chunk_listings=LISTINGS_POR_BLOQUE))
+    variantes["flat_sheet_chunk_listings"] = huella_df(pd.concat(bloques, ignore_index=True))
+    contra["flat_sheet_chunk_listings"] = huella_flat
+
+    ruta_db = os.path.join(directorio, "variantes.db")
+    tf = Transformation(*datos)
+    tablas = tf.run(text_workers=1, star_schema=True)
+    cg = Carga(None, sqlite_path=ruta_db)
+    for nombre, df in tablas.items():
+        if df is not None:
+            cg.insertar_en_sqlite_bulk(nombre, df=df)
+    cg.crear_vista_sabana("estrella_limpio", tf.star_columns,
+                          reviews="fact_reviews_month" if tablas.get("fact_reviews_month") is not None else None)
+    Carga(flat, sqlite_path=ruta_db).insertar_en_sqlite_bulk("plano_limpio")
+    variantes["star_schema_vista"] = huella_df(leer_sqlite(ruta_db, "estrella_limpio"))
+    contra["star_schema_vista"] = huella_df(leer_sqlite(ruta_db, "plano_limpio"))
+
+    partes = {}
+    muestra = flat.head(FILAS_EXCEL_VARIANTE)
+    por_parte = max(1, -(-len(muestra) // 4))
+    for workers in (1, EXCEL_WORKERS):
+        partes[workers] = Carga(muestra, sqlite_path=ruta_db).exportar_a_excel_particionado(
+            df=muestra.copy(), base_path=os.path.join(directorio, f"excel_w{workers}"), max_rows_per_file=por_parte,
+            motor="xlsxwriter", max_workers=workers)
+    variantes["excel_paralelo"] = huella_df(_leer_partes_excel(partes[EXCEL_WORKERS]))
+    contra["excel_paralelo"] = huella_df(_leer_partes_excel(partes[1]))
+    return variantes, contra
+
+
+def resumir(repeticiones):
+    """Por etapa: la repetición más rápida (tiempo de pared mínimo) más mediana y número de corridas."""
+    por_etapa = {}
+    for registros in repeticiones:
+        for r in registros:
+            if r["nivel"] == 0:
+                por_etapa.setdefault(r["etapa"], []).append(r)
+    resumen = {}
+    for etapa, regs in por_etapa.items():
+        mejor = min(regs, key=lambda r: r["pared_s"])
+        resumen[etapa] = {
+            "pared_s": round(mejor["pared_s"], 4),
+            "pared_s_mediana": round(statistics.median(r["pared_s"] for r in regs), 4),
+            "cpu_s": round(mejor["cpu_s"], 4),
+            "rss_pico_mb": mejor["rss_pico_mb"] and round(mejor["rss_pico_mb"], 1),
+            "tracemalloc_pico_mb": mejor["tracemalloc_pico_mb"] and round(mejor["tracemalloc_pico_mb"], 2),
+            "filas": mejor["filas_salida"] if mejor["filas_salida"] is not None else mejor["filas_entrada"],
+            "filas_por_s": mejor["filas_por_s"] and round(mejor["filas_por_s"], 1),
+            "corridas": len(regs),
+        }
+    return resumen
+
+
+def correr_escala(escala, args, referencia):
+    datos = sintetico.generar(escala, args.semilla, args.dias)
+    directorio = tempfile.mkdtemp(prefix=f"bench_x{escala}_")
+    try:
+        repeticiones, flat = [], None
+        for _ in range(args.repeticiones):
+            registros, flat = repeticion(datos, args.sinks, directorio, args.tracemalloc)
+            repeticiones.append(registros)
+
+        clave = f"x{escala}_s{args.semilla}_d{args.dias}"
+        huellas = {"flat_sheet": huella_df(flat)}
+        for nombre in (s for s in args.sinks if s.startswith("sqlite_")):
+            huellas[nombre] = huella_df(leer_sqlite(os.path.join(directorio, "bench.db"), f"bench_{nombre}"))
+        ref = (referencia or {}).get(clave, {})
+        equivalencia = {k: comparar_huellas(h, ref.get(k)) for k, h in huellas.items()}
+        if "sqlite_pandas" in huellas and "sqlite_bulk" in huellas:
+            equivalencia["sqlite_bulk_vs_pandas"] = comparar_huellas(huellas["sqlite_bulk"], huellas["sqlite_pandas"])
+        # Mismas entradas con los dtypes de la extracción (category en fechas): la sábana no debe cambiar
+        equivalencia["flat_sheet_plan_tipos"] = comparar_huellas(huella_df(sabana_con_plan_tipos(datos)),
+                                                                 huellas["flat_sheet"])
+        # Procesos de texto, bloques de listings, esquema estrella y Excel en paralelo: misma salida que la serial
+        if not args.sin_variantes:
+            variantes, contra = variantes_equivalentes(datos, flat, directorio)
+            equivalencia.update({k: comparar_huellas(h, contra[k]) for k, h in variantes.items()})
+        return clave, {
+            "escala": escala,
+            "entrada": {"listings": len(datos[0]), "calendar": len(datos[1]), "reviews": len(datos[2])},
+            "etapas": resumir(repeticiones),
+            "equivalencia": equivalencia,
+        }, huellas
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+# --------- Reporte y comparación ---------
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIR_BENCH, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir(resultado, anterior=None):
+    for clave, esc in resultado["escalas"].items():
+        print(f"\n=== Escala {esc['escala']}x | {esc['entrada']} ===")
+        previas = (anterior or {}).get("escalas", {}).get(clave, {}).get("etapas", {})
+        for etapa, m in esc["etapas"].items():
+            linea = f"{etapa:<42} {m['pared_s']:>9.3f}s  {m['cpu_s']:>9.3f}s CPU  filas/s={m['filas_por_s']}"
+            if etapa in previas and m["pared_s"] > 0:
+                linea += f"  | antes {previas[etapa]['pared_s']:.3f}s (aceleración ×{previas[etapa]['pared_s'] / m['pared_s']:.2f})"
+            print(linea)
+        for k, v in esc["equivalencia"].items():
+            print(f"equivalencia {k}: {v['estado']}" + (f" {v}" if v["estado"] == "distinta" else ""))
+
+
+def construir_parser():
+    parser = argparse.ArgumentParser(description="Benchmark del ETL Airbnb con datos sintéticos")
+    parser.add_argument("--escalas", type=float, nargs="+", default=ESCALAS,
+                        help=f"Escalas (1 = {sintetico.LISTINGS_BASE} listings) (por defecto: %(default)s).")
+    parser.add_argument("--dias", type=int, default=sintetico.DIAS_BASE,
+                        help="Días de calendar por listing (por defecto: %(default)s).")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla del generador (por defecto: %(default)s).")
+    parser.add_argument("--repeticiones", type=int, default=3,
+                        help="Repeticiones por escala; se reporta la más rápida (por defecto: %(default)s).")
+    parser.add_argument("--sinks", nargs="+", choices=SINKS, default=SINKS_DEFECTO,
+                        help="Destinos de carga a medir (por defecto: %(default)s).")
+    parser.add_argument("--tracemalloc", action="store_true", help="Medir también memoria asignada (más lento).")
+    parser.add_argument("--sin-variantes", action="store_true",
+                        help="No verificar las variantes (text_workers, chunk_listings, estrella, Excel en paralelo).")
+    parser.add_argument("--etiqueta", default="corrida", help="Nombre de la corrida en resultados/.")
+    parser.add_argument("--guardar-referencia", action="store_true",
+                        help="Guardar las huellas de esta corrida como referencia de equivalencia.")
+    parser.add_argument("--comparar", default=None, help="Resultado JSON anterior para comparar tiempos.")
+    return parser
+
+
+def main(argv=None):
+    args = construir_parser().parse_args(argv)
+    args.escalas = [int(e) if float(e).is_integer() else e for e in args.escalas]
+
+    referencia = None
+    if os.path.exists(RUTA_REFERENCIA):
+        with open(RUTA_REFERENCIA, encoding="utf-8") as f:
+            referencia = json.load(f)
+
+    resultado = {
+        "etiqueta": args.etiqueta,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "entorno": {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                    "plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("comparar", "guardar_referencia")},
+        "escalas": {},
+    }
+    huellas_corrida = {}
+    for escala in args.escalas:
+        clave, esc, huellas = correr_escala(escala, args, referencia)
+        resultado["escalas"][clave] = esc
+        huellas_corrida[clave] = huellas
+
+    os.makedirs(DIR_RESULTADOS, exist_ok=True)
+    ruta = os.path.join(DIR_RESULTADOS, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{args.etiqueta}.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+    if args.guardar_referencia:
+        referencia = {**(referencia or {}), **huellas_corrida}
+        with open(RUTA_REFERENCIA, "w", encoding="utf-8") as f:
+            json.dump(referencia, f, indent=1, sort_keys=True)
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+    imprimir(resultado, anterior)
+    print(f"\nResultado: {ruta}" + (f" | referencia actualizada: {RUTA_REFERENCIA}" if args.guardar_referencia else ""))
+
+    distintas = [(c, k) for c, e in resultado["escalas"].items()
+                 for k, v in e["equivalencia"].items() if v["estado"] == "distinta"]
+    return 1 if distintas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
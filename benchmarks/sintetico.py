@@ -0,0 +1,201 @@
+#Generador determinista de datos sintéticos con la forma de las colecciones de Inside Airbnb tal como
+#llegan de MongoDB: listings con las 77 columnas del scrape (amenities como texto de lista, fechas como
+#dicts {'$date': ...}), calendar con precios "$1,234.00" y disponibilidad 't'/'f', y reviews.
+#La escala 1 son LISTINGS_BASE listings con DIAS_BASE días de calendar y REVIEWS_POR_LISTING reviews
+#promedio por listing; las demás escalas multiplican el número de listings (mismo rango de fechas).
+import json
+import numpy as np
+import pandas as pd
+
+LISTINGS_BASE = 200
+DIAS_BASE = 90
+REVIEWS_POR_LISTING = 15
+FECHA_SCRAPE = "2025-03-20"
+
+COLONIAS = [
+    "Cuauhtémoc", "Miguel Hidalgo", "Benito Juárez", "Coyoacán", "Álvaro Obregón", "Tlalpan",
+    "Iztapalapa", "Gustavo A. Madero", "Azcapotzalco", "Venustiano Carranza", "Xochimilco",
+    "Iztacalco", "Cuajimalpa de Morelos", "La Magdalena Contreras", "Tláhuac", "Milpa Alta",
+]
+TIPOS_PROPIEDAD = ["Entire rental unit", "Private room in home", "Entire condo", "Entire loft",
+                   "Private room in rental unit", "Entire home", "Room in hotel", "Entire serviced apartment"]
+TIPOS_HABITACION = ["Entire home/apt", "Private room", "Hotel room", "Shared room"]
+TIEMPOS_RESPUESTA = ["within an hour", "within a few hours", "within a day", "a few days or more", "N/A"]
+AMENITIES = [
+    "Wifi", "Kitchen", "Essentials", "Hot water", "Hair dryer", "Hangers", "Iron", "TV",
+    "Dedicated workspace", "Self check-in", "Free parking on premises", "Refrigerator", "Microwave",
+    "Stove", "Coffee maker", "Cooking basics", "Dishes and silverware", "Room-darkening shades",
+    "Washer", "Smoke alarm", "Carbon monoxide alarm", "Fire extinguisher", "First aid kit",
+    "Wine glasses", "Free washer – In unit", "Bed linens", "Extra pillows and blankets",
+    "Elevator", "Shampoo", "Body soap", "Long term stays allowed", "Lockbox", "Paid parking off premises",
+]
+VERIFICACIONES = ["['email', 'phone']", "['phone']", "['email', 'phone', 'work_email']", "['phone', 'work_email']", "[]"]
+TEXTOS = [
+    "Hermoso departamento en el corazón de la ciudad, cerca de <b>restaurantes</b> y transporte.",
+    "Comfortably furnished, sunny apartment<br/>with balcony and  fast wifi.",
+    "Estudio tranquilo y seguro, ideal para nómadas digitales. Café, parques y museos a pasos.",
+    "Great space in historical neighborhood &mdash; walk to everything!",
+    "Loft moderno con terraza compartida y vista a la ciudad. <p>Check-in autónomo.</p>",
+]
+NOMBRES = ["Ana", "Luis", "María", "José", "Sofía", "Carlos", "Lucía", "Diego", "Valeria", "Jorge", "Host"]
+
+
+def _fecha_mongo(fechas):
+    # Fechas como las entrega Mongo exportado a JSON: {'$date': 'YYYY-MM-DDT00:00:00.000Z'}
+    return [{"$date": f"{d}T00:00:00.000Z"} for d in fechas]
+
+
+def _con_nulos(rng, valores, proporcion):
+    valores = np.asarray(valores, dtype=object)
+    valores[rng.random(len(valores)) < proporcion] = None
+    return valores
+
+
+def _fechas(rng, n, inicio, dias):
+    base = np.datetime64(inicio)
+    return (base + rng.integers(0, dias, n).astype("timedelta64[D]")).astype(str)
+
+
+def generar_listings(rng, n):
+    ids = np.sort(rng.choice(np.arange(30_000, 30_000 + 50 * n), n, replace=False)).astype("int64")
+    host_ids = rng.integers(10_000, 10_000 + max(n // 2, 1) * 10, n).astype("int64")
+    host_count = rng.integers(1, 40, n).astype(float)
+    precio = np.round(rng.lognormal(7.0, 0.6, n))
+    tiene_reviews = rng.random(n) < 0.87
+    first = _fechas(rng, n, "2012-01-01", 4_000)
+    last = _fechas(rng, n, "2023-06-01", 650)
+    scores = lambda: np.where(tiene_reviews, np.round(rng.uniform(3.5, 5.0, n), 2), np.nan)
+    n_amen = rng.integers(5, len(AMENITIES), n)
+    amenities = [json.dumps(list(rng.choice(AMENITIES, k, replace=False)), ensure_ascii=False) for k in n_amen]
+    texto = lambda p: _con_nulos(rng, rng.choice(TEXTOS, n), p)
+    hosts_nb = _con_nulos(rng, rng.choice(COLONIAS, n), 0.47)
+
+    df = pd.DataFrame({
+        "_id": [f"{i:024x}" for i in range(n)],
+        "id": ids,
+        "listing_url": [f"https://www.airbnb.com/rooms/{i}" for i in ids],
+        "scrape_id": np.full(n, 20250319150644, dtype="int64"),
+        "last_scraped": _fecha_mongo(_fechas(rng, n, FECHA_SCRAPE, 3)),
+        "source": rng.choice(["city scrape", "previous scrape"], n),
+        "name": [f"{t.split('.')[0][:40]} #{i}" for i, t in enumerate(rng.choice(TEXTOS, n))],
+        "description": texto(0.03),
+        "neighborhood_overview": texto(0.45),
+        "picture_url": [f"https://a0.muscache.com/pictures/{i}.jpg" for i in ids],
+        "host_id": host_ids,
+        "host_url": [f"https://www.airbnb.com/users/show/{h}" for h in host_ids],
+        "host_name": _con_nulos(rng, rng.choice(NOMBRES, n), 0.001),
+        "host_since": _con_nulos(rng, _fecha_mongo(_fechas(rng, n, "2009-01-01", 5_800)), 0.001),
+        "host_location": _con_nulos(rng, rng.choice(["Mexico City, Mexico", "Mexico", "Guadalajara, Mexico"], n), 0.21),
+        "host_about": texto(0.4),
+        "host_response_time": _con_nulos(rng, rng.choice(TIEMPOS_RESPUESTA, n), 0.001),
+        "host_response_rate": _con_nulos(rng, [f"{v}%" for v in rng.integers(40, 101, n)], 0.15),
+        "host_acceptance_rate": _con_nulos(rng, np.where(rng.random(n) < 0.08, "N/A",
+                                                         [f"{v}%" for v in rng.integers(30, 101, n)]), 0.01),
+        "host_is_superhost": _con_nulos(rng, rng.choice(["t", "f"], n), 0.05),
+        "host_thumbnail_url": [f"https://a0.muscache.com/im/users/{h}/small.jpg" for h in host_ids],
+        "host_picture_url": [f"https://a0.muscache.com/im/users/{h}/large.jpg" for h in host_ids],
+        "host_listings_count": host_count,
+        "host_total_listings_count": np.where(rng.random(n) < 0.001, np.nan, host_count + rng.integers(0, 5, n)),
+        "host_verifications": rng.choice(VERIFICACIONES, n, p=[0.7, 0.15, 0.1, 0.04, 0.01]),
+        "host_has_profile_pic": _con_nulos(rng, rng.choice(["t", "f"], n, p=[0.97, 0.03]), 0.001),
+        "host_identity_verified": _con_nulos(rng, rng.choice(["t", "f"], n, p=[0.9, 0.1]), 0.001),
+        "neighbourhood": _con_nulos(rng, np.full(n, "Mexico City, Distrito Federal, Mexico"), 0.45),
+        "neighbourhood_cleansed": rng.choice(COLONIAS, n),
+        "latitude": np.round(19.43 + rng.normal(0, 0.05, n), 6),
+        "longitude": np.round(-99.13 + rng.normal(0, 0.05, n), 6),
+        "property_type": rng.choice(TIPOS_PROPIEDAD, n),
+        "room_type": rng.choice(TIPOS_HABITACION, n, p=[0.65, 0.31, 0.02, 0.02]),
+        "accommodates": rng.integers(1, 9, n).astype("int64"),
+        "bathrooms": np.where(rng.random(n) < 0.15, np.nan, rng.integers(1, 4, n).astype(float)),
+        "bathrooms_text": _con_nulos(rng, rng.choice(["1 bath", "1.5 baths", "2 baths", "1 private bath", "Half-bath"], n), 0.001),
+        "bedrooms": np.where(rng.random(n) < 0.04, np.nan, rng.integers(1, 5, n).astype(float)),
+        "beds": np.where(rng.random(n) < 0.15, np.nan, rng.integers(1, 6, n).astype(float)),
+        "amenities": amenities,
+        "price": _con_nulos(rng, [f"${p:,.2f}" for p in precio], 0.15),
+    })
+    noches_min = rng.choice([1, 2, 3, 7, 30], n, p=[0.5, 0.25, 0.15, 0.05, 0.05]).astype("int64")
+    noches_max = rng.choice([30, 90, 365, 1125], n).astype("int64")
+    for c in ["minimum_nights", "minimum_minimum_nights", "maximum_minimum_nights"]:
+        df[c] = noches_min
+    for c in ["maximum_nights", "minimum_maximum_nights", "maximum_maximum_nights"]:
+        df[c] = noches_max
+    df["minimum_nights_avg_ntm"] = noches_min.astype(float)
+    df["maximum_nights_avg_ntm"] = noches_max.astype(float)
+    df["has_availability"] = _con_nulos(rng, np.full(n, "t"), 0.04)
+    a365 = rng.integers(0, 366, n)
+    df["availability_30"] = np.minimum(a365, 30)
+    df["availability_60"] = np.minimum(a365, 60)
+    df["availability_90"] = np.minimum(a365, 90)
+    df["availability_365"] = a365
+    df["calendar_last_scraped"] = _fecha_mongo(np.full(n, FECHA_SCRAPE))
+    n_reviews = np.where(tiene_reviews, rng.integers(1, 400, n), 0)
+    df["number_of_reviews"] = n_reviews
+    df["number_of_reviews_ltm"] = n_reviews // 4
+    df["number_of_reviews_l30d"] = n_reviews // 40
+    df["availability_eoy"] = np.minimum(a365, 280)
+    df["number_of_reviews_ly"] = n_reviews // 5
+    df["estimated_occupancy_l365d"] = rng.integers(0, 255, n)
+    df["estimated_revenue_l365d"] = np.where(df["price"].isna(), np.nan, df["estimated_occupancy_l365d"] * precio)
+    df["instant_bookable"] = rng.choice(["t", "f"], n, p=[0.45, 0.55])
+    df["calculated_host_listings_count"] = host_count.astype("int64")
+    df["calculated_host_listings_count_entire_homes"] = (host_count * 0.7).astype("int64")
+    df["calculated_host_listings_count_private_rooms"] = (host_count * 0.3).astype("int64")
+    df["calculated_host_listings_count_shared_rooms"] = 0
+    df["host_neighbourhood"] = hosts_nb
+    df["first_review"] = _con_nulos(rng, np.where(tiene_reviews, first, None), 0.0)
+    df["last_review"] = np.where(tiene_reviews, np.array(_fecha_mongo(last), dtype=object), None)
+    for c in ["review_scores_rating", "review_scores_accuracy", "review_scores_cleanliness",
+              "review_scores_checkin", "review_scores_communication", "review_scores_location",
+              "review_scores_value"]:
+        df[c] = scores()
+    df["reviews_per_month"] = np.where(tiene_reviews, np.round(rng.uniform(0.05, 6, n), 2), np.nan)
+    return df
+
+
+def generar_calendar(rng, ids, dias, inicio=FECHA_SCRAPE):
+    n = len(ids) * dias
+    fechas = pd.date_range(inicio, periods=dias).strftime("%Y-%m-%d").to_numpy()
+    fechas = np.tile(fechas, len(ids)).astype(object)
+    # Una parte de las fechas llega como {'$date': ...} (documentos importados con mongoimport)
+    mongo = np.flatnonzero(rng.random(n) < 0.01)
+    fechas[mongo] = _fecha_mongo(fechas[mongo])
+    base = np.repeat(np.round(rng.lognormal(7.0, 0.6, len(ids))), dias)
+    precio = np.round(base * rng.choice([1.0, 1.0, 1.1, 1.25], n))
+    return pd.DataFrame({
+        "_id": np.arange(n),
+        "listing_id": np.repeat(ids, dias),
+        "date": fechas,
+        "available": rng.choice(["t", "f"], n, p=[0.6, 0.4]),
+        "price": _con_nulos(rng, [f"${p:,.2f}" for p in precio], 0.002),
+        "adjusted_price": None,
+        "minimum_nights": np.where(rng.random(n) < 0.001, np.nan, np.repeat(rng.choice([1, 2, 3, 7], len(ids)), dias)),
+        "maximum_nights": np.repeat(rng.choice([30, 90, 365, 1125], len(ids)), dias).astype(float),
+    })
+
+
+def generar_reviews(rng, ids, n):
+    listing = rng.choice(ids[: max(int(len(ids) * 0.87), 1)], n)
+    fechas = _fechas(rng, n, "2012-01-01", 4_800)
+    return pd.DataFrame({
+        "_id": np.arange(n),
+        "listing_id": listing,
+        "id": np.arange(10 ** 6, 10 ** 6 + n, dtype="int64"),
+        "date": _fecha_mongo(fechas),
+        "reviewer_id": rng.integers(1, 5 * 10 ** 8, n),
+        "reviewer_name": _con_nulos(rng, rng.choice(NOMBRES, n), 0.00001),
+        "comments": _con_nulos(rng, [f"{t} ({i})" for i, t in enumerate(rng.choice(TEXTOS, n))], 0.002),
+    })
+
+
+def generar(escala=1, semilla=0, dias=DIAS_BASE):
+    """
+    Retorna (listings, calendar, reviews) deterministas para la escala y semilla dadas:
+    round(LISTINGS_BASE * escala) listings, `dias` días de calendar por listing y
+    REVIEWS_POR_LISTING reviews promedio por listing.
+    """
+    rng = np.random.default_rng(semilla)
+    n = max(int(round(LISTINGS_BASE * escala)), 1)
+    listings = generar_listings(rng, n)
+    calendar = generar_calendar(rng, listings["id"].to_numpy(), dias)
+    reviews = generar_reviews(rng, listings["id"].to_numpy(), n * REVIEWS_POR_LISTING)
+    return listings, calendar, reviews
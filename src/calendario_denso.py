@@ -0,0 +1,277 @@
+#Calendar como matriz densa listing × día (alternativa compacta al formato largo de calendar).
+#Filas = listings (ordenados), columnas = días consecutivos desde el primero del calendar.
+#- presente / disponible: bitmaps empaquetados (np.packbits, 1 bit por celda); una celda sin fila en
+#  calendar queda con presente = 0 y no cuenta en ningún cálculo
+#- precio: float32 (NaN sin dato); min_noches / max_noches: int16 (-1 sin dato, saturado a 32767)
+#Con un directorio, las matrices se escriben como .npy y se abren memory-mapped (no ocupan RAM).
+import json
+import os
+import numpy as np
+import pandas as pd
+
+ARCHIVO_META = "calendario_denso.json"
+
+#Bits en 1 por valor de byte (popcount por tabla)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+#Sentinela de noches sin dato y tope de int16
+_SIN_NOCHES = -1
+_MAX_NOCHES = np.iinfo(np.int16).max
+
+
+#Matriz destino: en memoria, o .npy memory-mapped dentro de directorio
+def _matriz(directorio, nombre, shape, dtype, relleno):
+    if directorio is None:
+        return np.full(shape, relleno, dtype=dtype)
+    m = np.lib.format.open_memmap(os.path.join(directorio, f"{nombre}.npy"), mode="w+", dtype=dtype, shape=shape)
+    m[:] = relleno
+    return m
+
+
+#Noches → int16 con sentinela para faltantes y saturación en el tope
+def _noches_int16(s):
+    v = pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64)
+    return np.where(np.isnan(v), _SIN_NOCHES, np.clip(v, 0, _MAX_NOCHES)).astype(np.int16)
+
+
+class CalendarioDenso:
+    """
+    Calendar listing × día con bitmaps de presencia/disponibilidad y matrices de precio y noches.
+    Las consultas aceptan una ventana de fechas [inicio, fin] (ambas incluidas; None = extremo del
+    calendar) y un subconjunto de listings (None = todos) y se resuelven con operaciones sobre matrices.
+    """
+
+    MATRICES = ("presente", "disponible", "precio", "min_noches", "max_noches")
+
+    def __init__(self, listings, inicio, n_dias, presente, disponible, precio, min_noches, max_noches):
+        self.listings = pd.Index(listings, name="listing_id")
+        self.inicio = np.datetime64(inicio, "D")
+        self.n_dias = int(n_dias)
+        self.presente = presente
+        self.disponible = disponible
+        self.precio = precio
+        self.min_noches = min_noches
+        self.max_noches = max_noches
+
+    # ------------------------ Construcción y disco ------------------------
+
+    @classmethod
+    def desde_largo(cls, cal, fechas=None, directorio=None):
+        """
+        Construye la matriz desde calendar en formato largo (listing_id, date, available, price_num,
+        minimum_nights, maximum_nights). fechas: datetime64 ya parseado de cal['date'] (si no, se parsea).
+        Filas sin listing_id o sin fecha válida se omiten; si un (listing, día) se repite gana la última.
+        Con directorio, las matrices quedan en .npy memory-mapped junto a un json de metadatos.
+        """
+        if fechas is None:
+            fechas = pd.to_datetime(cal["date"], errors="coerce", utc=True)
+        if getattr(fechas.dt, "tz", None) is not None:
+            fechas = fechas.dt.tz_convert(None)
+        dias = fechas.to_numpy().astype("datetime64[D]")
+        validas = ~np.isnat(dias) & cal["listing_id"].notna().to_numpy()
+
+        codigos, listings = pd.factorize(cal["listing_id"].to_numpy()[validas], sort=True)
+        dias = dias[validas]
+        inicio = dias.min() if len(dias) else np.datetime64("1970-01-01", "D")
+        columnas = (dias - inicio).astype(np.int64)
+        n, m = len(listings), (int(columnas.max()) + 1 if len(columnas) else 0)
+
+        if directorio is not None:
+            os.makedirs(directorio, exist_ok=True)
+        bytes_fila = (m + 7) // 8
+        presente = _matriz(directorio, "presente", (n, bytes_fila), np.uint8, 0)
+        disponible = _matriz(directorio, "disponible", (n, bytes_fila), np.uint8, 0)
+        precio = _matriz(directorio, "precio", (n, m), np.float32, np.nan)
+        min_noches = _matriz(directorio, "min_noches", (n, m), np.int16, _SIN_NOCHES)
+        max_noches = _matriz(directorio, "max_noches", (n, m), np.int16, _SIN_NOCHES)
+
+        celdas = np.zeros((n, m), dtype=bool)
+        celdas[codigos, columnas] = True
+        presente[:] = np.packbits(celdas, axis=1)
+        if "available" in cal.columns:
+            celdas[:] = False
+            celdas[codigos, columnas] = cal["available"].to_numpy()[validas].astype(bool)
+            disponible[:] = np.packbits(celdas, axis=1)
+        del celdas
+        if "price_num" in cal.columns:
+            precio[codigos, columnas] = pd.to_numeric(cal["price_num"], errors="coerce").to_numpy()[validas]
+        if "minimum_nights" in cal.columns:
+            min_noches[codigos, columnas] = _noches_int16(cal["minimum_nights"])[validas]
+        if "maximum_nights" in cal.columns:
+            max_noches[codigos, columnas] = _noches_int16(cal["maximum_nights"])[validas]
+
+        matriz = cls(listings, inicio, m, presente, disponible, precio, min_noches, max_noches)
+        if directorio is not None:
+            matriz.guardar(directorio)
+        return matriz
+
+    def guardar(self, directorio):
+        """
+        Escribe las matrices (.npy) y los metadatos (listings, inicio, n_dias) en directorio.
+        Las matrices que ya son memory-maps de ese directorio solo se sincronizan a disco.
+        """
+        os.makedirs(directorio, exist_ok=True)
+        for nombre in self.MATRICES:
+            m = getattr(self, nombre)
+            ruta = os.path.join(directorio, f"{nombre}.npy")
+            if isinstance(m, np.memmap) and os.path.abspath(m.filename) == os.path.abspath(ruta):
+                m.flush()
+            else:
+                np.save(ruta, m)
+        meta = {"inicio": str(self.inicio), "n_dias": self.n_dias,
+                "listings": [v.item() if hasattr(v, "item") else v for v in self.listings],
+                "matrices": list(self.MATRICES)}
+        with open(os.path.join(directorio, ARCHIVO_META), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def abrir(cls, directorio, mmap=True):
+        """
+        Abre una matriz guardada; con mmap=True las matrices se leen memory-mapped (solo lectura),
+        así solo se cargan en RAM las filas/columnas que toca cada consulta.
+        """
+        with open(os.path.join(directorio, ARCHIVO_META), encoding="utf-8") as f:
+            meta = json.load(f)
+        matrices = {n: np.load(os.path.join(directorio, f"{n}.npy"), mmap_mode="r" if mmap else None)
+                    for n in cls.MATRICES}
+        return cls(meta["listings"], meta["inicio"], meta["n_dias"], **matrices)
+
+    # ------------------------ Utilidades ------------------------
+
+    @property
+    def dias(self):
+        """Índice de días (datetime64) de las columnas."""
+        return pd.DatetimeIndex(self.inicio + np.arange(self.n_dias), name="date")
+
+    @property
+    def shape(self):
+        return len(self.listings), self.n_dias
+
+    def memoria_mb(self):
+        """Tamaño de las matrices en MB (en disco si están memory-mapped)."""
+        return sum(getattr(self, n).nbytes for n in self.MATRICES) / 1024 ** 2
+
+    def _ventana(self, inicio=None, fin=None):
+        """[inicio, fin] (fechas incluidas) → rango de columnas [a, b) recortado al calendar."""
+        a = 0 if inicio is None else int((np.datetime64(pd.Timestamp(inicio).date(), "D") - self.inicio).astype(int))
+        b = self.n_dias if fin is None else int((np.datetime64(pd.Timestamp(fin).date(), "D") - self.inicio).astype(int)) + 1
+        return max(a, 0), max(min(b, self.n_dias), max(a, 0))
+
+    def _filas(self, listings=None):
+        """Listings pedidos → posiciones de fila (los que no están en la matriz se omiten)."""
+        if listings is None:
+            return np.arange(len(self.listings))
+        pos = self.listings.get_indexer(pd.Index(listings))
+        return pos[pos >= 0]
+
+    def _bits(self, bitmap, filas, a, b):
+        """Bitmap empaquetado → matriz bool de filas × [a, b)."""
+        sub = np.unpackbits(bitmap[filas, a // 8:(b + 7) // 8], axis=1)
+        inicio = a - (a // 8) * 8
+        return sub[:, inicio:inicio + (b - a)].astype(bool)
+
+    def _contar(self, filas, a, b, reservadas=False):
+        """Celdas presentes (o reservadas: presentes y no disponibles) por fila en [a, b), sin desempaquetar."""
+        if b <= a:
+            return np.zeros(len(filas), dtype=np.int64)
+        ba, bb = a // 8, (b + 7) // 8
+        sub = self.presente[filas, ba:bb]
+        if reservadas:
+            sub = sub & ~self.disponible[filas, ba:bb]
+        else:
+            sub = np.array(sub)
+        # Bits fuera de la ventana en el primer y último byte (packbits: el bit alto es el primer día)
+        sub[:, 0] &= np.uint8(0xFF >> (a % 8))
+        if b % 8:
+            sub[:, -1] &= np.uint8((0xFF << (8 - b % 8)) & 0xFF)
+        return _POPCOUNT[sub].sum(axis=1, dtype=np.int64)
+
+    # ------------------------ Consultas ------------------------
+
+    def dias_observados(self, inicio=None, fin=None, listings=None):
+        """Días con fila de calendar por listing en la ventana."""
+        filas = self._filas(listings)
+        a, b = self._ventana(inicio, fin)
+        return pd.Series(self._contar(filas, a, b), index=self.listings[filas], name="dias")
+
+    def noches_reservadas(self, inicio=None, fin=None, listings=None):
+        """Noches reservadas (presentes y no disponibles) por listing en la ventana."""
+        filas = self._filas(listings)
+        a, b = self._ventana(inicio, fin)
+        return pd.Series(self._contar(filas, a, b, reservadas=True), index=self.listings[filas],
+                         name="noches_reservadas")
+
+    def ocupacion(self, inicio=None, fin=None, listings=None):
+        """Tasa de ocupación por listing: noches reservadas / días observados (NaN sin días)."""
+        dias = self.dias_observados(inicio, fin, listings)
+        reservadas = self.noches_reservadas(inicio, fin, listings)
+        return (reservadas / dias.where(dias > 0)).rename("ocupacion")
+
+    def ingresos(self, inicio=None, fin=None, listings=None):
+        """Ingresos por listing: suma de price_num en las noches reservadas (precios sin dato no suman)."""
+        filas = self._filas(listings)
+        a, b = self._ventana(inicio, fin)
+        reservadas = self._bits(self.presente, filas, a, b) & ~self._bits(self.disponible, filas, a, b)
+        precio = np.asarray(self.precio[filas, a:b], dtype=np.float64)
+        total = np.where(reservadas & ~np.isnan(precio), precio, 0.0).sum(axis=1)
+        return pd.Series(total, index=self.listings[filas], name="ingresos")
+
+    def resumen(self, inicio=None, fin=None, listings=None):
+        """DataFrame por listing con dias, noches_reservadas, ocupacion e ingresos de la ventana."""
+        out = pd.concat([self.dias_observados(inicio, fin, listings),
+                         self.noches_reservadas(inicio, fin, listings),
+                         self.ingresos(inicio, fin, listings)], axis=1)
+        out.insert(2, "ocupacion", out["noches_reservadas"] / out["dias"].where(out["dias"] > 0))
+        return out
+
+    def serie_diaria(self, inicio=None, fin=None, listings=None):
+        """
+        Serie por día para el subconjunto de listings: listings observados, noches reservadas,
+        ocupación, ingresos y precio medio (sobre celdas presentes con precio).
+        """
+        filas = self._filas(listings)
+        a, b = self._ventana(inicio, fin)
+        presentes = self._bits(self.presente, filas, a, b)
+        reservadas = presentes & ~self._bits(self.disponible, filas, a, b)
+        precio = np.asarray(self.precio[filas, a:b], dtype=np.float64)
+        con_precio = presentes & ~np.isnan(precio)
+        precio = np.where(con_precio, precio, 0.0)
+        n = presentes.sum(axis=0)
+        out = pd.DataFrame({
+            "listings": n,
+            "noches_reservadas": reservadas.sum(axis=0),
+            "ingresos": np.where(reservadas, precio, 0.0).sum(axis=0),
+            "suma_precio": precio.sum(axis=0),
+            "n_precio": con_precio.sum(axis=0),
+        }, index=self.dias[a:b])
+        out["ocupacion"] = out["noches_reservadas"] / out["listings"].where(out["listings"] > 0)
+        out["precio_medio"] = out["suma_precio"] / out["n_precio"].where(out["n_precio"] > 0)
+        return out.drop(columns=["suma_precio", "n_precio"])
+
+    def a_largo(self, inicio=None, fin=None, listings=None, date_output="iso"):
+        """
+        Vuelve al formato largo de calendar (una fila por celda presente, ordenado por listing y fecha):
+        listing_id, date ('YYYY-MM-DD' o datetime64 UTC según date_output), available, price_num,
+        minimum_nights, maximum_nights. price_num se redondea a 2 decimales (se guardó en float32) y
+        las noches quedan enteras (float con NaN si alguna no tenía dato).
+        """
+        filas = self._filas(listings)
+        a, b = self._ventana(inicio, fin)
+        presentes = self._bits(self.presente, filas, a, b)
+        fila, col = np.nonzero(presentes)
+        disponible = self._bits(self.disponible, filas, a, b)[fila, col]
+        fechas = self.inicio + (a + col)
+        if date_output == "datetime":
+            date = pd.to_datetime(fechas).tz_localize("UTC")
+        else:
+            date = fechas.astype(str).astype(object)
+        out = pd.DataFrame({
+            "listing_id": self.listings[filas].to_numpy()[fila],
+            "date": date,
+            "available": disponible,
+            "price_num": np.round(np.asarray(self.precio[filas, a:b], dtype=np.float64)[fila, col], 2),
+        })
+        for nombre, col_larga in (("min_noches", "minimum_nights"), ("max_noches", "maximum_nights")):
+            v = np.asarray(getattr(self, nombre)[filas, a:b])[fila, col].astype(np.int64)
+            out[col_larga] = v if (v != _SIN_NOCHES).all() else np.where(v == _SIN_NOCHES, np.nan, v)
+        return out
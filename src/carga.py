@@ -1,8 +1,113 @@
 import sqlite3
+import numpy as np
 import pandas as pd
 import os
 from logs import Logs
+import perfilado
 
+# Pragmas de la carga masiva: sin journal en disco ni fsync por transacción, caché de ~256 MB
+PRAGMAS_CARGA = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": -262144,
+    "temp_store": "MEMORY",
+}
+
+# Motores de escritura Excel: openpyxl (write_only) o XlsxWriter (constant_memory, más rápido)
+MOTORES_EXCEL = ("openpyxl", "xlsxwriter")
+
+# Esquema estrella: índices por tabla (se crean después de la carga masiva); las columnas ausentes se omiten
+INDICES_ESTRELLA = {
+    "dim_listing": [("listing_id",), ("neighbourhood_cleansed",)],
+    "fact_calendar_day": [("listing_id", "date"), ("date",)],
+    "fact_reviews_month": [("listing_id", "year", "month")],
+}
+
+
+def _xlsx_openpyxl(df, out_path):
+    """
+    Escribe df en un .xlsx con openpyxl en streaming (write_only). Retorna un aviso o None.
+    """
+    from openpyxl import Workbook
+
+    aviso = None
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title="data")
+    # Eliminar hoja default si la crea
+    try:
+        default_ws = wb._sheets[0]
+        if default_ws.title != "data":
+            wb.remove(default_ws)
+    except Exception:
+        pass
+    # Forzar ZIP64 (método o atributo, según versión)
+    try:
+        wb.use_zip64()
+    except Exception:
+        try:
+            wb.use_zip64 = True
+        except Exception:
+            aviso = "no se pudo activar ZIP64 explícitamente (openpyxl lo activará si es necesario)."
+
+    # Header
+    ws.append(list(df.columns))
+
+    # Filas en streaming (RAM constante)
+    # .itertuples es más rápido y ligero que .values
+    for row in df.itertuples(index=False, name=None):
+        ws.append(row)
+
+    wb.save(out_path)
+    return aviso
+
+
+def _xlsx_xlsxwriter(df, out_path):
+    """
+    Escribe df en un .xlsx con XlsxWriter en modo constant_memory (fila a fila, RAM constante).
+    NaN/NaT se escriben como celdas vacías. Retorna None.
+    """
+    import xlsxwriter
+
+    wb = xlsxwriter.Workbook(out_path, {"constant_memory": True,
+                                        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+                                        "strings_to_numbers": False,
+                                        "strings_to_formulas": False,
+                                        "strings_to_urls": False})
+    wb.use_zip64()
+    ws = wb.add_worksheet("data")
+    ws.write_row(0, 0, [str(c) for c in df.columns])
+    valores = df.astype(object).where(df.notna(), None)
+    for i, row in enumerate(valores.itertuples(index=False, name=None), start=1):
+        ws.write_row(i, 0, row)
+    wb.close()
+    return None
+
+
+def _escribir_parte_excel(df, out_path, motor="openpyxl"):
+    """
+    Escribe una parte con el motor indicado. Retorna (out_path, aviso).
+    """
+    escribir = _xlsx_xlsxwriter if motor == "xlsxwriter" else _xlsx_openpyxl
+    return out_path, escribir(df, out_path)
+
+
+def _escribir_parte_desde_arrow(ruta_arrow, inicio, fin, out_path, motor="openpyxl", ruta_mixtas=None, columnas=None):
+    """
+    Trabajo de un proceso del pool: lee solo sus filas [inicio, fin) del archivo Arrow IPC
+    (memory-mapped, sin copiar el resto) y escribe su parte.
+    ruta_mixtas: pickle con las columnas de tipos mezclados (no van en el Arrow); se reinsertan
+    en el orden de columnas para que la parte salga igual que en la exportación secuencial.
+    """
+    import pyarrow as pa
+    from columnar import tabla_arrow_a_df
+
+    with pa.memory_map(ruta_arrow, "r") as fuente:
+        tabla = pa.ipc.open_file(fuente).read_all().slice(inicio, fin - inicio)
+        df = tabla_arrow_a_df(tabla)
+    if ruta_mixtas:
+        mixtas = pd.read_pickle(ruta_mixtas).iloc[inicio:fin].reset_index(drop=True)
+        df = pd.concat([df, mixtas], axis=1)[columnas]
+    return _escribir_parte_excel(df, out_path, motor)
 
 class Carga:
     """
@@ -12,12 +117,16 @@ class Carga:
     def __init__(self, df, sqlite_path="data/airbnb.db"):
         """
         Inicializa la clase con el DataFrame transformado y la ruta de la base SQLite.
+        df puede ser None cuando la carga se hace por bloques (ejecutar_carga_por_chunks).
         """
-        self.df = df.copy()
+        self.df = df.copy() if df is not None else None
         self.logs = Logs()
         self.sqlite_path = sqlite_path
         os.makedirs(os.path.dirname(sqlite_path), exist_ok=True)
-        self.logs.log(f"Carga inicializada con {len(self.df)} registros.", "info")
+        if self.df is not None:
+            self.logs.log(f"Carga inicializada con {len(self.df)} registros.", "info")
+        else:
+            self.logs.log("Carga inicializada en modo por bloques.", "info")
 
     def _connect_sqlite(self):
         """
@@ -31,14 +140,16 @@ class Carga:
             self.logs.log(f"Error al conectar con SQLite: {e}","error")
             raise
 
-    def insertar_en_sqlite(self, table_name="airbnb_limpio", if_exists="replace"):
+    @perfilado.medir("carga.sqlite", clave="table_name", entrada="df")
+    def insertar_en_sqlite(self, table_name="airbnb_limpio", if_exists="replace", df=None):
         """
-        Inserta el DataFrame transformado en una tabla SQLite.
+        Inserta el DataFrame transformado (o el bloque df) en una tabla SQLite.
   
         """
+        df = self.df if df is None else df
         conn = self._connect_sqlite()
         try:
-            self.df.to_sql(table_name, conn, if_exists=if_exists, index=False)
+            df.to_sql(table_name, conn, if_exists=if_exists, index=False)
             conn.commit()
             self.logs.log(f"Datos insertados en la tabla '{table_name}' correctamente.","info")
         except Exception as e:
@@ -47,6 +158,407 @@ class Carga:
         finally:
             conn.close()
 
+    @staticmethod
+    def _ident_sqlite(nombre):
+        """
+        Identificador SQLite entre comillas dobles (escapa comillas internas).
+        """
+        return '"' + str(nombre).replace('"', '""') + '"'
+
+    @staticmethod
+    def _tipo_sqlite(serie):
+        """
+        Tipo SQLite de una columna (mismo mapeo que to_sql: INTEGER, REAL, TIMESTAMP, TEXT).
+        """
+        dtype = serie.dtype
+        if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+            return "INTEGER"
+        if pd.api.types.is_float_dtype(dtype):
+            return "REAL"
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            return "TIMESTAMP"
+        return "TEXT"
+
+    @staticmethod
+    def _valores_sqlite(serie):
+        """
+        Convierte un bloque de columna a lista de valores que sqlite3 enlaza directamente (NaN/NaT → None).
+        Las columnas numéricas se convierten de forma vectorizada con NumPy.
+        """
+        dtype = serie.dtype
+        if pd.api.types.is_bool_dtype(dtype) and not serie.hasnans:
+            return serie.to_numpy(dtype=np.int64).tolist()
+        if pd.api.types.is_integer_dtype(dtype) and not serie.hasnans:
+            return serie.to_numpy(dtype=np.int64).tolist()
+        if pd.api.types.is_float_dtype(dtype):
+            arr = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+            nulos = np.isnan(arr)
+            if not nulos.any():
+                return arr.tolist()
+            arr = arr.astype(object)
+            arr[nulos] = None
+            return arr.tolist()
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            # Mismo texto que to_sql; con zona horaria se normaliza a UTC
+            if isinstance(dtype, pd.DatetimeTZDtype):
+                texto = serie.dt.tz_convert("UTC").dt.strftime("%Y-%m-%d %H:%M:%S+00:00")
+            else:
+                texto = serie.dt.strftime("%Y-%m-%d %H:%M:%S")
+            return texto.astype(object).where(serie.notna(), None).tolist()
+        # Texto / mixtos: solo se recorre en Python si hay valores que sqlite3 no enlaza
+        valores = serie.astype(object).where(serie.notna(), None)
+        if pd.api.types.infer_dtype(valores, skipna=True) not in ("string", "empty", "integer", "floating", "mixed-integer-float"):
+            valores = valores.map(lambda v: v if v is None or isinstance(v, (str, int, float, bytes)) else str(v))
+        return valores.tolist()
+
+    @perfilado.medir("carga.sqlite_bulk", clave="table_name", entrada="df")
+    def insertar_en_sqlite_bulk(self, table_name="airbnb_limpio", if_exists="replace", df=None, filas_por_lote=100_000):
+        """
+        Carga masiva en SQLite:
+        - Pragmas de carga (journal en memoria, synchronous OFF, caché grande)
+        - CREATE TABLE con esquema tipado explícito
+        - executemany por lotes, una transacción por lote
+        Retorna el número de filas insertadas (tomado del propio insert, sin COUNT(*)).
+        """
+        df = self.df if df is None else df
+        cols = [self._ident_sqlite(c) for c in df.columns]
+        col_sql = ", ".join(cols)
+        tabla_sql = self._ident_sqlite(table_name)
+        esquema = ", ".join(f"{c} {self._tipo_sqlite(df.iloc[:, i])}" for i, c in enumerate(cols))
+        insert_sql = f"INSERT INTO {tabla_sql} ({col_sql}) VALUES ({', '.join('?' * len(cols))})"
+
+        conn = self._connect_sqlite()
+        try:
+            for pragma, valor in PRAGMAS_CARGA.items():
+                conn.execute(f"PRAGMA {pragma}={valor}")
+
+            existe = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)).fetchone()
+            if existe and if_exists == "fail":
+                raise ValueError(f"La tabla '{table_name}' ya existe.")
+            if existe and if_exists == "replace":
+                conn.execute(f"DROP TABLE {tabla_sql}")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {tabla_sql} ({esquema})")
+            conn.commit()
+
+            insertadas = 0
+            n = len(df)
+            for inicio in range(0, n, filas_por_lote):
+                lote = df.iloc[inicio:inicio + filas_por_lote]
+                columnas = [self._valores_sqlite(lote.iloc[:, i]) for i in range(lote.shape[1])]
+                with conn:
+                    cur = conn.executemany(insert_sql, zip(*columnas))
+                    insertadas += cur.rowcount
+                del columnas, lote
+
+            self.logs.log(f"[SQLiteBulk] {insertadas:,} filas insertadas en '{table_name}' ({len(cols)} columnas).","info")
+            return insertadas
+        except Exception as e:
+            self.logs.log(f"Error en la carga masiva a SQLite: {e}","error")
+            raise
+        finally:
+            conn.close()
+
+    def leer_tabla_sqlite(self, table_name, columnas=None, meses=None):
+        """
+        Lee una tabla (o vista) de SQLite, p. ej. el estado del ETL incremental.
+        - columnas: solo esas columnas (las que no existan se omiten)
+        - meses: lista de (year, month); solo las filas de esos meses
+        Retorna un DataFrame vacío si la tabla no existe.
+        """
+        conn = self._connect_sqlite()
+        try:
+            existe = conn.execute("SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name=?", (table_name,)).fetchone()
+            if not existe:
+                return pd.DataFrame()
+            tabla = self._ident_sqlite(table_name)
+            select = "*"
+            if columnas is not None:
+                existentes = {r[1] for r in conn.execute(f"PRAGMA table_info({tabla})")}
+                select = ", ".join(self._ident_sqlite(c) for c in columnas if c in existentes)
+            where, params = "", []
+            if meses is not None:
+                claves = sorted({int(y) * 100 + int(m) for y, m in meses})
+                if not claves:
+                    return pd.DataFrame(columns=list(columnas or []))
+                where = f" WHERE year * 100 + month IN ({', '.join('?' * len(claves))})"
+                params = claves
+            return pd.read_sql(f"SELECT {select} FROM {tabla}{where}", conn, params=params)
+        finally:
+            conn.close()
+
+    @perfilado.medir("carga.meses", clave="table_name", entrada="df")
+    def reemplazar_meses_sqlite(self, df, table_name, filas_por_lote=100_000):
+        """
+        Carga por meses (p. ej. los cubos de agregados): en table_name se reemplazan las filas de los
+        (year, month) que trae df y se conservan los demás meses.
+        - Staging con insertar_en_sqlite_bulk en '_stg_<tabla>'; si la tabla no existe se crea con el esquema de df
+        - DELETE de los meses del staging + INSERT ... SELECT en una sola transacción
+        Retorna {'insertadas': filas, 'borradas': filas}.
+        """
+        tabla = self._ident_sqlite(table_name)
+        stg_name = f"_stg_{table_name}"
+        stg = self._ident_sqlite(stg_name)
+        cols = ", ".join(self._ident_sqlite(c) for c in df.columns)
+        self.insertar_en_sqlite_bulk(stg_name, if_exists="replace", df=df, filas_por_lote=filas_por_lote)
+        self.insertar_en_sqlite_bulk(table_name, if_exists="append", df=df.iloc[:0])
+
+        conn = self._connect_sqlite()
+        try:
+            for pragma, valor in PRAGMAS_CARGA.items():
+                conn.execute(f"PRAGMA {pragma}={valor}")
+            with conn:
+                indice = self._ident_sqlite(f"ix_{table_name}_year_month")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {indice} ON {tabla} (year, month)")
+                borradas = conn.execute(
+                    f"DELETE FROM {tabla} WHERE year * 100 + month IN (SELECT DISTINCT year * 100 + month FROM {stg})"
+                ).rowcount
+                insertadas = conn.execute(f"INSERT INTO {tabla} ({cols}) SELECT {cols} FROM {stg}").rowcount
+                conn.execute(f"DROP TABLE IF EXISTS {stg}")
+            self.logs.log(f"[Meses] '{table_name}': {insertadas:,} filas insertadas | {borradas:,} reemplazadas", "info")
+            return {"insertadas": insertadas, "borradas": borradas}
+        except Exception as e:
+            self.logs.log(f"Error en la carga por meses a SQLite: {e}", "error")
+            raise
+        finally:
+            conn.close()
+
+    @perfilado.medir("carga.upsert", clave="table_name", entrada="df")
+    def upsert_en_sqlite(self, df=None, table_name="airbnb_limpio", claves=("listing_id", "date"),
+                         reemplazar_listings=None, inicio_calendar=None, eliminar_listings=None,
+                         filas_por_lote=100_000):
+        """
+        Carga incremental sobre la tabla destino, sin reescribirla:
+        - Staging: df se carga con insertar_en_sqlite_bulk en una tabla temporal '_stg_<tabla>'
+        - INSERT ... SELECT ... ON CONFLICT(claves) DO UPDATE (índice único sobre claves)
+        - reemplazar_listings: listings reprocesados completos; se borran sus filas que no vinieron en staging
+        - inicio_calendar: DataFrame (listing_id, min_fecha); se borran días anteriores al inicio del calendar en origen
+        - eliminar_listings: listings que ya no existen en origen
+        Si la tabla no existe se crea con el esquema tipado de df; columnas nuevas se agregan con ALTER TABLE.
+        Retorna {'upsert': filas insertadas/actualizadas, 'borradas': filas eliminadas}.
+        """
+        df = self.df if df is None else df
+        hay_datos = df is not None and len(df.columns) > 0
+        tabla = self._ident_sqlite(table_name)
+        stg_name = f"_stg_{table_name}"
+        stg = self._ident_sqlite(stg_name)
+        ids = self._ident_sqlite(f"_stg_{table_name}_ids")
+        cols = [self._ident_sqlite(c) for c in df.columns] if hay_datos else []
+        keys = [self._ident_sqlite(c) for c in claves]
+
+        # Staging (y tabla destino vacía con el mismo esquema si aún no existe)
+        if hay_datos:
+            self.insertar_en_sqlite_bulk(stg_name, if_exists="replace", df=df, filas_por_lote=filas_por_lote)
+            self.insertar_en_sqlite_bulk(table_name, if_exists="append", df=df.iloc[:0])
+
+        conn = self._connect_sqlite()
+        try:
+            for pragma, valor in PRAGMAS_CARGA.items():
+                conn.execute(f"PRAGMA {pragma}={valor}")
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)).fetchone():
+                self.logs.log(f"[Upsert] '{table_name}' no existe y no hay filas nuevas; nada que cargar.", "info")
+                return {"upsert": 0, "borradas": 0}
+            upsert = borradas = 0
+            with conn:
+                existentes = {r[1] for r in conn.execute(f"PRAGMA table_info({tabla})")}
+                for i, c in enumerate(df.columns if hay_datos else []):
+                    if str(c) not in existentes:
+                        conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {cols[i]} {self._tipo_sqlite(df.iloc[:, i])}")
+                        self.logs.log(f"[Upsert] Columna nueva en '{table_name}': {c}", "info")
+                indice = self._ident_sqlite(f"ux_{table_name}_{'_'.join(claves)}")
+                conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {indice} ON {tabla} ({', '.join(keys)})")
+
+                # Upsert (WHERE true evita la ambigüedad de ON CONFLICT tras un SELECT)
+                if hay_datos:
+                    set_sql = ", ".join(f"{c} = excluded.{c}" for c in cols if c not in keys)
+                    conflicto = f"DO UPDATE SET {set_sql}" if set_sql else "DO NOTHING"
+                    upsert = conn.execute(
+                        f"INSERT INTO {tabla} ({', '.join(cols)}) SELECT {', '.join(cols)} FROM {stg} WHERE true "
+                        f"ON CONFLICT ({', '.join(keys)}) {conflicto}"
+                    ).rowcount
+
+                # Listings reprocesados: filas que ya no vienen del origen
+                if reemplazar_listings is not None and len(reemplazar_listings):
+                    conn.execute(f"DROP TABLE IF EXISTS {ids}")
+                    conn.execute(f"CREATE TEMP TABLE {ids} (listing_id PRIMARY KEY)")
+                    conn.executemany(f"INSERT OR IGNORE INTO {ids} VALUES (?)", [(v,) for v in reemplazar_listings])
+                    cond = " AND ".join(f"s.{k} = t.{k}" for k in keys)
+                    sin_staging = f" AND NOT EXISTS (SELECT 1 FROM {stg} AS s WHERE {cond})" if hay_datos else ""
+                    borradas += conn.execute(
+                        f"DELETE FROM {tabla} AS t WHERE t.listing_id IN (SELECT listing_id FROM {ids}){sin_staging}"
+                    ).rowcount
+
+                # Días que salieron del calendar en origen (desplazamiento diario)
+                if inicio_calendar is not None and len(inicio_calendar):
+                    rango = self._ident_sqlite(f"_stg_{table_name}_rango")
+                    conn.execute(f"DROP TABLE IF EXISTS {rango}")
+                    conn.execute(f"CREATE TEMP TABLE {rango} (listing_id PRIMARY KEY, min_fecha TEXT)")
+                    conn.executemany(f"INSERT OR REPLACE INTO {rango} VALUES (?, ?)",
+                                     inicio_calendar[['listing_id', 'min_fecha']].dropna().itertuples(index=False, name=None))
+                    borradas += conn.execute(
+                        f"DELETE FROM {tabla} WHERE date < (SELECT r.min_fecha FROM {rango} AS r "
+                        f"WHERE r.listing_id = {tabla}.listing_id)"
+                    ).rowcount
+
+                # Listings eliminados en origen
+                if eliminar_listings is not None and len(eliminar_listings):
+                    borradas += conn.executemany(f"DELETE FROM {tabla} WHERE listing_id = ?",
+                                                 [(v,) for v in eliminar_listings]).rowcount
+
+                conn.execute(f"DROP TABLE IF EXISTS {stg}")
+
+            self.logs.log(f"[Upsert] '{table_name}': {upsert:,} filas insertadas/actualizadas | {borradas:,} borradas", "info")
+            return {"upsert": upsert, "borradas": borradas}
+        except Exception as e:
+            self.logs.log(f"Error en la carga incremental a SQLite: {e}", "error")
+            raise
+        finally:
+            conn.close()
+
+    @perfilado.medir("carga.actualizar", clave="table_name", entrada="df")
+    def actualizar_columnas_sqlite(self, df, table_name="airbnb_limpio", clave="listing_id", filas_por_lote=100_000):
+        """
+        Actualiza en sitio columnas de table_name con un valor por clave (p. ej. contadores de cada listing
+        repetidos en todas sus filas de la sábana), sin reescribir las filas:
+        - Staging de df (clave + columnas) en '_stg_<tabla>_upd'
+        - UPDATE ... SET c = COALESCE(valor del staging, c): los nulos del staging no pisan lo cargado
+        Solo se actualizan las columnas que ya existen en la tabla.
+        Retorna el número de filas actualizadas.
+        """
+        tabla = self._ident_sqlite(table_name)
+        stg_name = f"_stg_{table_name}_upd"
+        stg = self._ident_sqlite(stg_name)
+        conn = self._connect_sqlite()
+        try:
+            if self._tipo_objeto_sqlite(conn, table_name) != "table" or df is None or len(df) == 0:
+                return 0
+            existentes = {r[1] for r in conn.execute(f"PRAGMA table_info({tabla})")}
+        finally:
+            conn.close()
+        cols = [c for c in df.columns if c != clave and str(c) in existentes]
+        if not cols:
+            return 0
+        self.insertar_en_sqlite_bulk(stg_name, if_exists="replace", df=df[[clave] + cols], filas_por_lote=filas_por_lote)
+
+        k = self._ident_sqlite(clave)
+        set_sql = ", ".join(
+            f"{self._ident_sqlite(c)} = COALESCE((SELECT s.{self._ident_sqlite(c)} FROM {stg} AS s "
+            f"WHERE s.{k} = {tabla}.{k}), {self._ident_sqlite(c)})" for c in cols)
+        conn = self._connect_sqlite()
+        try:
+            for pragma, valor in PRAGMAS_CARGA.items():
+                conn.execute(f"PRAGMA {pragma}={valor}")
+            with conn:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {self._ident_sqlite(f'ix_{stg_name}')} ON {stg} ({k})")
+                filas = conn.execute(f"UPDATE {tabla} SET {set_sql} WHERE {k} IN (SELECT {k} FROM {stg})").rowcount
+                conn.execute(f"DROP TABLE IF EXISTS {stg}")
+            self.logs.log(f"[Actualizar] '{table_name}': {filas:,} filas | columnas={cols}", "info")
+            return filas
+        except Exception as e:
+            self.logs.log(f"Error al actualizar columnas en SQLite: {e}", "error")
+            raise
+        finally:
+            conn.close()
+
+    def _tipo_objeto_sqlite(self, conn, nombre):
+        """'table', 'view' o None según lo que exista con ese nombre en SQLite."""
+        fila = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (nombre,)).fetchone()
+        return fila[0] if fila else None
+
+    def _eliminar_vista(self, nombre):
+        """
+        Elimina la vista 'nombre' si existe (p. ej. la sábana de una corrida en esquema estrella),
+        para poder crear una tabla con ese nombre. Una tabla con ese nombre se deja (la reemplaza la carga);
+        SQLite no admite DROP VIEW sobre una tabla.
+        """
+        conn = self._connect_sqlite()
+        try:
+            if self._tipo_objeto_sqlite(conn, nombre) == "view":
+                conn.execute(f"DROP VIEW {self._ident_sqlite(nombre)}")
+                conn.commit()
+        finally:
+            conn.close()
+
+    @perfilado.medir("carga.indices")
+    def crear_indices(self, indices=None):
+        """
+        Crea los índices {tabla: [(col, ...), ...]} (por defecto INDICES_ESTRELLA) y actualiza las
+        estadísticas del planificador (ANALYZE). Se omiten tablas inexistentes y columnas ausentes.
+        Retorna la lista de índices creados.
+        """
+        indices = INDICES_ESTRELLA if indices is None else indices
+        conn = self._connect_sqlite()
+        creados = []
+        try:
+            for pragma, valor in PRAGMAS_CARGA.items():
+                conn.execute(f"PRAGMA {pragma}={valor}")
+            with conn:
+                for tabla, grupos in indices.items():
+                    existentes = {r[1] for r in conn.execute(f"PRAGMA table_info({self._ident_sqlite(tabla)})")}
+                    for cols in grupos:
+                        if not existentes or not set(cols).issubset(existentes):
+                            continue
+                        nombre = f"ix_{tabla}_{'_'.join(cols)}"
+                        conn.execute(f"CREATE INDEX IF NOT EXISTS {self._ident_sqlite(nombre)} ON "
+                                     f"{self._ident_sqlite(tabla)} ({', '.join(self._ident_sqlite(c) for c in cols)})")
+                        creados.append(nombre)
+                conn.execute("ANALYZE")
+            self.logs.log(f"[Indices] {len(creados)} índices creados: {creados}", "info")
+            return creados
+        except Exception as e:
+            self.logs.log(f"Error al crear índices en SQLite: {e}", "error")
+            raise
+        finally:
+            conn.close()
+
+    def crear_vista_sabana(self, vista, columnas, dim="dim_listing", hechos="fact_calendar_day",
+                           reviews="fact_reviews_month"):
+        """
+        Crea (o reemplaza) la vista 'vista' que reconstruye la sábana desde el esquema estrella:
+        hechos LEFT JOIN dim por listing_id y LEFT JOIN reviews por (listing_id, year, month).
+        columnas: orden de columnas de la sábana (Transformation.star_columns); cada una se toma de
+        los hechos, si no de la dimensión; reviews_in_month sin reviews del mes vale 0.
+        Si una tabla con el nombre de la vista existe (carga plana anterior), se elimina.
+        """
+        conn = self._connect_sqlite()
+        try:
+            def cols_de(tabla):
+                return {r[1] for r in conn.execute(f"PRAGMA table_info({self._ident_sqlite(tabla)})")}
+
+            col_hechos, col_dim = cols_de(hechos), cols_de(dim)
+            col_rev = cols_de(reviews) if reviews else set()
+            select = []
+            for c in columnas:
+                ident = self._ident_sqlite(c)
+                if c in col_hechos:
+                    select.append(f"f.{ident}")
+                elif c in col_dim:
+                    select.append(f"d.{ident}")
+                elif c == "reviews_in_month":
+                    select.append(f"COALESCE(r.{ident}, 0) AS {ident}" if col_rev else f"0 AS {ident}")
+                else:
+                    select.append(f"NULL AS {ident}")
+            joins = f"LEFT JOIN {self._ident_sqlite(dim)} AS d ON d.listing_id = f.listing_id"
+            if col_rev:
+                joins += (f" LEFT JOIN {self._ident_sqlite(reviews)} AS r ON r.listing_id = f.listing_id "
+                          f"AND r.year = f.year AND r.month = f.month")
+
+            vista_sql = self._ident_sqlite(vista)
+            tipo = self._tipo_objeto_sqlite(conn, vista)
+            with conn:
+                # La sábana de una corrida en esquema plano es una tabla con el mismo nombre
+                if tipo:
+                    conn.execute(f"DROP {'VIEW' if tipo == 'view' else 'TABLE'} {vista_sql}")
+                conn.execute(f"CREATE VIEW {vista_sql} AS SELECT {', '.join(select)} "
+                             f"FROM {self._ident_sqlite(hechos)} AS f {joins}")
+            self.logs.log(f"[Vista] '{vista}' creada sobre {hechos}/{dim}"
+                          f"{'/' + reviews if col_rev else ''} ({len(columnas)} columnas).", "info")
+        except Exception as e:
+            self.logs.log(f"Error al crear la vista '{vista}' en SQLite: {e}", "error")
+            raise
+        finally:
+            conn.close()
+
+    @perfilado.medir("carga.verificar", clave="table_name")
     def verificar_carga_sqlite(self, table_name="airbnb_limpio"):
         """
         Verifica la cantidad de registros cargados en la tabla SQLite.
@@ -63,22 +575,30 @@ class Carga:
         finally:
             conn.close()
 
-    def exportar_a_excel_particionado(self, df=None, base_path="data/airbnb_limpio", max_rows_per_file=200_000, truncate_text_cols=True, max_text_len=500):
+    @perfilado.medir("carga.excel", entrada="df", salida=False)
+    def exportar_a_excel_particionado(self, df=None, base_path="data/airbnb_limpio", max_rows_per_file=200_000, truncate_text_cols=True, max_text_len=500, parte_inicial=1, motor="openpyxl", max_workers=1):
         """
         Exporta el DataFrame en varios .xlsx sin reventar:
-        - Streaming con openpyxl (write_only) → baja RAM
+        - Streaming con openpyxl (write_only) o XlsxWriter (constant_memory) → baja RAM
         - ZIP64 activado explícitamente
         - Partición en N archivos (por defecto 200k filas por archivo)
         - (Opcional) Trunca cadenas muy largas para evitar inflar el ZIP
+        - parte_inicial: número del primer archivo (para continuar la numeración entre bloques)
+        - max_workers > 1: las partes se escriben en paralelo en un pool de procesos; el DataFrame
+          se vuelca una vez a un archivo Arrow IPC temporal y cada proceso lee solo su rango (memory-map);
+          las columnas de tipos mezclados (p. ej. 't'/'f' con False) van aparte en un pickle para no pasarlas a texto
         """
         import os, gc
         import pandas as pd
-        from openpyxl import Workbook
+        from concurrent.futures import ProcessPoolExecutor
+        from columnar import arrow_disponible, columnas_mixtas, df_a_tabla_arrow
 
         df = self.df if df is None else df
         if df is None or len(df) == 0:
             self.logs.log("[ExcelPart] DataFrame vacío; no se genera archivo.", "warning")
             return []
+        if motor not in MOTORES_EXCEL:
+            raise ValueError(f"Motor Excel no soportado: {motor} (opciones: {MOTORES_EXCEL})")
 
         # Límite duro de Excel: 1,048,576 filas por hoja (reservamos header)
         EXCEL_HARD_LIMIT = 1_048_576 - 1
@@ -94,7 +614,19 @@ class Carga:
         cols = list(df.columns)
         file_paths = []
 
-        self.logs.log(f"[ExcelPart] Inicio | filas={n:,} | máx/archivo={max_rows_per_file:,} | cols={len(cols)}", "info")
+        # Partición: (inicio, fin, archivo)
+        partes = []
+        for i, start in enumerate(range(0, n, max_rows_per_file)):
+            end = min(start + max_rows_per_file, n)
+            partes.append((start, end, f"{base_path}_part_{parte_inicial + i}.xlsx"))
+
+        paralelo = max_workers is not None and max_workers > 1 and len(partes) > 1
+        if paralelo and not arrow_disponible():
+            self.logs.log("[ExcelPart] pyarrow no disponible; exportación secuencial.", "warning")
+            paralelo = False
+
+        self.logs.log(f"[ExcelPart] Inicio | filas={n:,} | máx/archivo={max_rows_per_file:,} | cols={len(cols)} "
+                      f"| motor={motor} | procesos={min(max_workers, len(partes)) if paralelo else 1}", "info")
 
         # (Opcional) truncar textos para reducir tamaño del ZIP
         if truncate_text_cols:
@@ -105,52 +637,49 @@ class Carga:
                     # mapeo sin copiar todo el DF
                     df[c] = df[c].astype(str).str.slice(0, max_text_len)
 
-        # Partición
-        start = 0
-        part_idx = 1
-        while start < n:
-            end = min(start + max_rows_per_file, n)
-            out_path = f"{base_path}_part_{part_idx}.xlsx"
-            self.logs.log(f"[ExcelPart] Generando '{out_path}' para filas {start:,}..{end-1:,} (total {end-start:,})", "info")
+        # Excel no admite zonas horarias: datetime64 con tz → naive (UTC)
+        for c in [c for c in df.columns if isinstance(df[c].dtype, pd.DatetimeTZDtype)]:
+            df[c] = df[c].dt.tz_localize(None)
 
-            # --- OPENPYXL STREAMING + ZIP64 ---
-            wb = Workbook(write_only=True)
-            ws = wb.create_sheet(title="data")
-            # Eliminar hoja default si la crea
-            try:
-                default_ws = wb._sheets[0]
-                if default_ws.title != "data":
-                    wb.remove(default_ws)
-            except Exception:
-                pass
-            # Forzar ZIP64 (método o atributo, según versión)
+        if not paralelo:
+            for start, end, out_path in partes:
+                self.logs.log(f"[ExcelPart] Generando '{out_path}' para filas {start:,}..{end-1:,} (total {end-start:,})", "info")
+                _, aviso = _escribir_parte_excel(df.iloc[start:end], out_path, motor)
+                if aviso:
+                    self.logs.log(f"[ExcelPart] Aviso: {aviso}", "warning")
+                file_paths.append(out_path)
+                gc.collect()
+                self.logs.log(f"[ExcelPart] OK '{out_path}'", "info")
+        else:
+            # Un solo volcado a Arrow IPC (un lote por parte); los procesos no reciben el DataFrame
+            import pyarrow as pa
+            ruta_arrow = f"{base_path}_excel_tmp.arrow"
+            mixtas = columnas_mixtas(df)
+            tabla = df_a_tabla_arrow(df.drop(columns=mixtas))
+            with pa.OSFile(ruta_arrow, "wb") as sink, pa.ipc.new_file(sink, tabla.schema) as writer:
+                for lote in tabla.to_batches(max_chunksize=max_rows_per_file):
+                    writer.write_batch(lote)
+            del tabla
+            ruta_mixtas = f"{base_path}_excel_tmp.pkl" if mixtas else None
             try:
-                wb.use_zip64()
-            except Exception:
-                try:
-                    wb.use_zip64 = True
-                except Exception:
-                    self.logs.log("[ExcelPart] Aviso: no se pudo activar ZIP64 explícitamente (openpyxl lo activará si es necesario).", "warning")
-
-            # Header
-            ws.append(cols)
-
-            # Filas en streaming (RAM constante)
-            # .itertuples es más rápido y ligero que .values
-            for row in df.iloc[start:end].itertuples(index=False, name=None):
-                ws.append(row)
-
-            # Guardar
-            wb.save(out_path)
-            file_paths.append(out_path)
-
-            # Liberar
-            del wb, ws
-            gc.collect()
-
-            self.logs.log(f"[ExcelPart] OK '{out_path}'", "info")
-            start = end
-            part_idx += 1
+                if ruta_mixtas:
+                    df[mixtas].reset_index(drop=True).rename(columns=str).to_pickle(ruta_mixtas)
+                with ProcessPoolExecutor(max_workers=min(max_workers, len(partes))) as pool:
+                    futuros = []
+                    for start, end, out_path in partes:
+                        self.logs.log(f"[ExcelPart] Generando '{out_path}' para filas {start:,}..{end-1:,} (total {end-start:,})", "info")
+                        futuros.append(pool.submit(_escribir_parte_desde_arrow, ruta_arrow, start, end, out_path, motor,
+                                                 ruta_mixtas, [str(c) for c in cols]))
+                    for f in futuros:
+                        out_path, aviso = f.result()
+                        if aviso:
+                            self.logs.log(f"[ExcelPart] Aviso: {aviso}", "warning")
+                        file_paths.append(out_path)
+                        self.logs.log(f"[ExcelPart] OK '{out_path}'", "info")
+            finally:
+                os.remove(ruta_arrow)
+                if ruta_mixtas and os.path.exists(ruta_mixtas):
+                    os.remove(ruta_mixtas)
 
         self.logs.log(f"[ExcelPart] Total archivos generados: {len(file_paths)}", "info")
         return file_paths
@@ -158,21 +687,132 @@ class Carga:
 
 
 
-    def ejecutar_carga_completa(self, table_name="airbnb_limpio", excel_path="data/airbnb_limpio.xlsx", sql_server_params=None):
+    def ejecutar_carga_completa(self, table_name="airbnb_limpio", excel_path="data/airbnb_limpio.xlsx", sql_server_params=None, modo_sqlite="pandas", excel_motor="openpyxl", excel_workers=1):
         """
         Ejecuta todas las tareas de carga y verificación.
+        modo_sqlite: 'pandas' (to_sql + COUNT(*)) o 'bulk' (insertar_en_sqlite_bulk; el conteo sale del insert).
+        excel_motor / excel_workers: motor de escritura y procesos para exportar_a_excel_particionado.
         """
         try:
             self.logs.log("=== INICIO DE CARGA DE DATOS ===","info")
-            self.insertar_en_sqlite(table_name)
-            registros_sql = self.verificar_carga_sqlite(table_name)
+            self._eliminar_vista(table_name)
+            if modo_sqlite == "bulk":
+                registros_sql = self.insertar_en_sqlite_bulk(table_name)
+            else:
+                self.insertar_en_sqlite(table_name)
+                registros_sql = self.verificar_carga_sqlite(table_name)
             if registros_sql != len(self.df):
                 self.logs.log("La cantidad de registros en SQLite no coincide con el DataFrame original.","warning")
             self.exportar_a_excel_particionado(
             df=self.df,
-            base_path="data/airbnb_limpio"  # generará ..._part_1.xlsx, ..._part_2.xlsx, etc.
+            base_path=os.path.splitext(excel_path)[0],  # generará ..._part_1.xlsx, ..._part_2.xlsx, etc.
+            motor=excel_motor,
+            max_workers=excel_workers,
             )
             self.logs.log("=== FIN DE CARGA DE DATOS ===","info")
         except Exception as e:
             self.logs.log(f"Error durante la carga completa: {str(e)}", "error")
             raise
+
+    def ejecutar_carga_por_chunks(self, chunks, table_name="airbnb_limpio", excel_path="data/airbnb_limpio.xlsx", max_rows_per_file=200_000, modo_sqlite="pandas", excel_motor="openpyxl", excel_workers=1):
+        """
+        Carga una sábana entregada por bloques (p. ej. Transformation.run(chunk_listings=N)):
+        - SQLite: el primer bloque reemplaza la tabla y los siguientes se anexan (modo_sqlite como en ejecutar_carga_completa)
+        - Excel: cada bloque genera sus propios archivos, con numeración continua de partes
+        - Solo un bloque vive en memoria a la vez
+        Retorna un resumen {filas, columnas, archivos}.
+        """
+        try:
+            self.logs.log("=== INICIO DE CARGA DE DATOS (por bloques) ===","info")
+            base_path = os.path.splitext(excel_path)[0]
+            filas, columnas, archivos = 0, 0, []
+            insertadas = 0
+            self._eliminar_vista(table_name)
+            for i, chunk in enumerate(chunks):
+                if len(chunk) == 0:
+                    continue
+                if_exists = "replace" if filas == 0 else "append"
+                if modo_sqlite == "bulk":
+                    insertadas += self.insertar_en_sqlite_bulk(table_name, if_exists=if_exists, df=chunk)
+                else:
+                    self.insertar_en_sqlite(table_name, if_exists=if_exists, df=chunk)
+                filas += len(chunk)
+                columnas = len(chunk.columns)
+                archivos += self.exportar_a_excel_particionado(
+                    df=chunk,
+                    base_path=base_path,
+                    max_rows_per_file=max_rows_per_file,
+                    parte_inicial=len(archivos) + 1,
+                    motor=excel_motor,
+                    max_workers=excel_workers,
+                )
+                self.logs.log(f"[Carga] Bloque {i + 1} cargado | filas={len(chunk):,} | acumulado={filas:,}", "info")
+                del chunk
+
+            if filas == 0:
+                self.logs.log("[Carga] No se recibieron bloques con filas; no se cargó nada.", "warning")
+            else:
+                registros_sql = insertadas if modo_sqlite == "bulk" else self.verificar_carga_sqlite(table_name)
+                if registros_sql != filas:
+                    self.logs.log("La cantidad de registros en SQLite no coincide con la suma de los bloques.","warning")
+            self.logs.log(f"=== FIN DE CARGA DE DATOS (por bloques) | filas={filas:,} | archivos={len(archivos)} ===","info")
+            return {"filas": filas, "columnas": columnas, "archivos": archivos}
+        except Exception as e:
+            self.logs.log(f"Error durante la carga por bloques: {str(e)}", "error")
+            raise
+
+
+    def ejecutar_carga_estrella(self, tablas, columnas, vista="airbnb_limpio", excel_path="data/airbnb_limpio.xlsx", max_rows_per_file=200_000, excel_motor="openpyxl", excel_workers=1, filas_por_lote=100_000):
+        """
+        Carga en esquema estrella (Transformation.build_star_schema):
+        - tablas: {nombre: DataFrame} (dim_listing, fact_calendar_day, fact_reviews_month; None se omite),
+          cada una con insertar_en_sqlite_bulk (reemplaza la tabla)
+        - Índices de INDICES_ESTRELLA después de la carga masiva (crear_indices)
+        - Vista 'vista' con la sábana (crear_vista_sabana) para las consultas existentes sobre airbnb_limpio
+        - Excel: la sábana se lee de la vista por bloques de max_rows_per_file filas y cada bloque genera su parte
+        Retorna un resumen {filas, columnas, archivos, tablas: {nombre: filas}}.
+        """
+        try:
+            self.logs.log("=== INICIO DE CARGA DE DATOS (esquema estrella) ===","info")
+            cargadas = {nombre: self.insertar_en_sqlite_bulk(nombre, if_exists="replace", df=df, filas_por_lote=filas_por_lote)
+                        for nombre, df in tablas.items() if df is not None}
+            # Tablas sin datos en esta corrida (p. ej. sin reviews): no deben quedar de una corrida anterior
+            sin_datos = [nombre for nombre, df in tablas.items() if df is None]
+            if sin_datos:
+                conn = self._connect_sqlite()
+                try:
+                    for nombre in sin_datos:
+                        conn.execute(f"DROP TABLE IF EXISTS {self._ident_sqlite(nombre)}")
+                    conn.commit()
+                finally:
+                    conn.close()
+            self.crear_indices({t: g for t, g in INDICES_ESTRELLA.items() if t in cargadas})
+            self.crear_vista_sabana(vista, columnas,
+                                    reviews="fact_reviews_month" if "fact_reviews_month" in cargadas else None)
+
+            filas = self.verificar_carga_sqlite(vista)
+            if filas != cargadas.get("fact_calendar_day", 0):
+                self.logs.log(f"La vista '{vista}' no tiene las mismas filas que fact_calendar_day.","warning")
+
+            # Excel desde la vista, por bloques (la sábana completa no se materializa)
+            archivos = []
+            conn = self._connect_sqlite()
+            try:
+                bloques = pd.read_sql(f"SELECT * FROM {self._ident_sqlite(vista)}", conn, chunksize=max_rows_per_file)
+                for bloque in bloques:
+                    archivos += self.exportar_a_excel_particionado(
+                        df=bloque,
+                        base_path=os.path.splitext(excel_path)[0],
+                        max_rows_per_file=max_rows_per_file,
+                        parte_inicial=len(archivos) + 1,
+                        motor=excel_motor,
+                        max_workers=excel_workers,
+                    )
+            finally:
+                conn.close()
+            self.logs.log(f"=== FIN DE CARGA DE DATOS (esquema estrella) | tablas={cargadas} | filas vista={filas:,} "
+                          f"| archivos={len(archivos)} ===","info")
+            return {"filas": filas, "columnas": len(columnas), "archivos": archivos, "tablas": cargadas}
+        except Exception as e:
+            self.logs.log(f"Error durante la carga en esquema estrella: {str(e)}", "error")
+            raise
\ No newline at end of file
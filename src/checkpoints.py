@@ -0,0 +1,118 @@
+#Checkpoints por etapa de la transformación: las tablas que deja cada etapa (listings, calendar, reviews,
+#flat_sheet...) en Parquet por partes (columnar) más un manifest con la etapa, los parámetros que la afectan
+#y la huella de las entradas. Un checkpoint es vigente solo si huella y parámetros coinciden con la corrida.
+#Requiere pyarrow (columnar.arrow_disponible); sin él quien llama sigue sin checkpoints.
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+
+import columnar
+
+MANIFEST_ETAPA = "_etapa.json"
+
+
+#Hash de una serie (sin índice); listas/dicts/valores no hashables se hashean como texto
+def _hash_serie(s):
+    try:
+        h = pd.util.hash_pandas_object(s, index=False)
+    except TypeError:
+        h = pd.util.hash_pandas_object(s.astype(str), index=False)
+    return int(h.to_numpy().sum(dtype='uint64'))
+
+
+#Huella de un conjunto de DataFrames ({nombre: df}, None se omite): forma, columnas, dtypes y valores.
+#Recorre los datos una vez; cuando el origen tiene una huella más barata (Extraction.collection_fingerprint)
+#conviene usar esa.
+def huella_frames(frames):
+    partes = {}
+    for nombre, df in frames.items():
+        if df is None:
+            continue
+        partes[nombre] = {
+            'forma': list(df.shape),
+            'columnas': [str(c) for c in df.columns],
+            'dtypes': [str(t) for t in df.dtypes],
+            'valores': [_hash_serie(df[c]) for c in df.columns],
+        }
+    return hashlib.sha1(json.dumps(partes, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+#Normaliza a JSON (tuplas → listas, valores no serializables → str) para comparar con lo guardado
+def _normalizar(valor):
+    return json.loads(json.dumps(valor, sort_keys=True, default=str))
+
+
+#Manifest de una etapa; None si no existe o está corrupto
+def leer_manifest(directorio, etapa):
+    ruta = os.path.join(directorio, etapa, MANIFEST_ETAPA)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+#¿Existe el checkpoint de la etapa y coincide en huella de entrada y parámetros?
+def vigente(directorio, etapa, huella, parametros):
+    manifest = leer_manifest(directorio, etapa)
+    return (manifest is not None and manifest.get('huella') == _normalizar(huella)
+            and manifest.get('parametros') == _normalizar(parametros))
+
+
+#Guarda las tablas de una etapa ({nombre: df}, None se omite) en <directorio>/<etapa>/<tabla>/ y el
+#manifest al final. Se escribe en un temporal y se renombra: un checkpoint con manifest siempre está completo.
+#Las etapas de `posteriores` se borran porque ya no corresponden a esta salida.
+def guardar(directorio, etapa, tablas, huella, parametros, extra=None, posteriores=()):
+    destino = os.path.join(directorio, etapa)
+    tmp = destino + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp, exist_ok=True)
+
+    contenido = {}
+    for nombre, df in tablas.items():
+        if df is None:
+            continue
+        # Columnas de tipos mezclados: aparte con pickle, así la etapa siguiente las recibe idénticas
+        mixtas = columnar.columnas_mixtas(df)
+        columnar.escribir_parquet_particionado(df.drop(columns=mixtas), os.path.join(tmp, nombre))
+        if mixtas:
+            df[mixtas].reset_index(drop=True).to_pickle(os.path.join(tmp, f"{nombre}.pkl"))
+        contenido[nombre] = {'filas': int(len(df)), 'columnas': [str(c) for c in df.columns], 'mixtas': mixtas}
+
+    manifest = {
+        'etapa': etapa,
+        'creado': datetime.now().isoformat(timespec='seconds'),
+        'huella': _normalizar(huella),
+        'parametros': _normalizar(parametros),
+        'tablas': contenido,
+        **_normalizar(extra or {}),
+    }
+    with open(os.path.join(tmp, MANIFEST_ETAPA), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    for posterior in posteriores:
+        shutil.rmtree(os.path.join(directorio, posterior), ignore_errors=True)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(tmp, destino)
+    return manifest
+
+
+#Lee las tablas de una etapa (Parquet + columnas mixtas, en el orden original) → ({nombre: df}, manifest)
+def cargar(directorio, etapa):
+    manifest = leer_manifest(directorio, etapa)
+    if manifest is None:
+        raise FileNotFoundError(f"Sin checkpoint de {etapa} en {directorio}")
+    tablas = {}
+    for nombre, info in manifest['tablas'].items():
+        df = columnar.leer_parquet_particionado(os.path.join(directorio, etapa, nombre))
+        if info['mixtas']:
+            mixtas = pd.read_pickle(os.path.join(directorio, etapa, f"{nombre}.pkl"))
+            df = pd.concat([df, mixtas], axis=1)
+        tablas[nombre] = df[info['columnas']]
+    return tablas, manifest
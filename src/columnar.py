@@ -0,0 +1,150 @@
+#Utilidades de almacenamiento columnar (Parquet/Arrow) para snapshots y checkpoints del ETL.
+#pyarrow es opcional: si no está instalado, arrow_disponible() devuelve False y quien llama
+#debe seguir por el camino normal (Mongo / memoria).
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+MANIFEST = "_manifest.json"
+
+
+#Indica si pyarrow está instalado
+def arrow_disponible():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+#Valor de una celda apto para Arrow: desenvuelve {'$date': ...} y pasa a str lo que Arrow no entiende (ObjectId, dicts)
+def _valor_arrow(v):
+    if isinstance(v, dict) and '$date' in v:
+        return v['$date']
+    if v is None or isinstance(v, (str, bool, int, float, list)):
+        return v
+    return str(v)
+
+
+#Convierte una columna a arreglo Arrow; si los tipos son mixtos, normaliza valores y en último caso usa str
+def _columna_arrow(s):
+    import pyarrow as pa
+    try:
+        return pa.array(s, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        pass
+    limpio = s.map(_valor_arrow)
+    try:
+        return pa.array(limpio, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        return pa.array(limpio.map(lambda v: v if v is None or (isinstance(v, float) and np.isnan(v)) else str(v)),
+                        from_pandas=True)
+
+
+#Columnas que Arrow no puede tipar sin convertir valores (tipos de Python mezclados, p. ej. False y 't'):
+#_columna_arrow las pasaría a texto, así que quien necesita recibirlas idénticas las lleva aparte con pickle
+def columnas_mixtas(df):
+    import pyarrow as pa
+    mixtas = []
+    for c in df.columns:
+        if df[c].dtype == object or isinstance(df[c].dtype, pd.CategoricalDtype):
+            try:
+                pa.array(df[c], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+                mixtas.append(c)
+    return mixtas
+
+
+#DataFrame → pyarrow.Table (una sola tabla, así todas las partes comparten el mismo esquema)
+def df_a_tabla_arrow(df):
+    import pyarrow as pa
+    columnas = [str(c) for c in df.columns]
+    arreglos = [_columna_arrow(df.iloc[:, i]) for i in range(df.shape[1])]
+    return pa.Table.from_arrays(arreglos, names=columnas)
+
+
+#pyarrow.Table → DataFrame; las listas vuelven como listas de Python (no ndarray) y los
+#nulos de texto como NaN (igual que un DataFrame construido desde los documentos de Mongo)
+def tabla_arrow_a_df(tabla):
+    import pyarrow as pa
+    df = tabla.to_pandas()
+    for campo in tabla.schema:
+        if pa.types.is_list(campo.type) or pa.types.is_large_list(campo.type):
+            df[campo.name] = df[campo.name].map(lambda v: list(v) if isinstance(v, np.ndarray) else v)
+        elif pa.types.is_string(campo.type) or pa.types.is_large_string(campo.type):
+            nulos = df[campo.name].isna().to_numpy()
+            if nulos.any():
+                df.loc[nulos, campo.name] = np.nan
+    return df
+
+
+#Lee el manifest de un directorio de partes; None si no existe o está corrupto
+def leer_manifest(directorio):
+    ruta = os.path.join(directorio, MANIFEST)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+#Escribe df como N archivos Parquet (part-00000.parquet, ...) más un manifest.
+#Se escribe en un directorio temporal y se renombra al final: un directorio con manifest siempre está completo.
+def escribir_parquet_particionado(df, directorio, filas_por_parte=500_000, manifest=None):
+    import pyarrow.parquet as pq
+
+    tmp = directorio.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp, exist_ok=True)
+
+    tabla = df_a_tabla_arrow(df)
+    partes = []
+    n = tabla.num_rows
+    for i, inicio in enumerate(range(0, max(n, 1), filas_por_parte)):
+        nombre = f"part-{i:05d}.parquet"
+        pq.write_table(tabla.slice(inicio, filas_por_parte), os.path.join(tmp, nombre))
+        partes.append(nombre)
+    del tabla
+
+    contenido = dict(manifest or {})
+    contenido.update({"filas": int(n), "columnas": [str(c) for c in df.columns], "partes": partes})
+    with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(contenido, f, ensure_ascii=False, indent=2, default=str)
+
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.replace(tmp, directorio)
+    return contenido
+
+
+#Lee todas las partes de un directorio (memory-mapped) y las une en un DataFrame
+def leer_parquet_particionado(directorio, columnas=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    manifest = leer_manifest(directorio)
+    if manifest is None:
+        raise FileNotFoundError(f"Sin manifest en {directorio}")
+    tablas = [pq.read_table(os.path.join(directorio, p), columns=columnas, memory_map=True)
+              for p in manifest["partes"]]
+    tabla = pa.concat_tables(tablas) if len(tablas) > 1 else tablas[0]
+    return tabla_arrow_a_df(tabla)
+
+
+#Reemplaza por mes un dataset Parquet de un archivo por mes (<directorio>/YYYY-MM.parquet) con las filas
+#de df (columnas year y month); los meses que df no trae se conservan. Cada archivo se escribe en
+#temporal y se renombra, así un lector nunca ve un mes a medio escribir. Retorna los archivos escritos.
+def reemplazar_meses_parquet(df, directorio):
+    import pyarrow.parquet as pq
+
+    os.makedirs(directorio, exist_ok=True)
+    escritos = []
+    for (year, month), grupo in df.groupby(["year", "month"], sort=True):
+        ruta = os.path.join(directorio, f"{int(year):04d}-{int(month):02d}.parquet")
+        pq.write_table(df_a_tabla_arrow(grupo.reset_index(drop=True)), ruta + ".tmp")
+        os.replace(ruta + ".tmp", ruta)
+        escritos.append(ruta)
+    return escritos
@@ -0,0 +1,139 @@
+#Cubos de agregados para las preguntas de negocio (ocupación por colonia/quarter, precio–ocupación en el
+#tiempo, superhost ↔ calificación, ingresos por bucket de precio). Todas las medidas son sumas o conteos
+#aditivos, así que un tablero puede subir de nivel con SUM sin volver a leer la sábana:
+#ocupación = noches_reservadas / dias, precio medio = suma_precio / n_precio, rating medio = suma_rating / n_rating.
+#Cada cubo incluye year/quarter/month y se actualiza reemplazando solo los meses que trae la corrida.
+import numpy as np
+import pandas as pd
+
+#Dimensiones del cubo base (granularidad mínima)
+DIMENSIONES = ['neighbourhood_cleansed', 'room_type', 'price_bucket', 'year', 'quarter', 'month', 'host_is_superhost']
+DIMENSIONES_TIEMPO = ['year', 'quarter', 'month']
+#Dimensiones booleanas: según el origen llegan como 't'/'f' (Mongo), True/False (clean_nulls rellena con
+#False) o 0/1 (SQLite), y se etiquetan siempre 't'/'f'
+DIMENSIONES_BOOL = ['host_is_superhost']
+ETIQUETAS_BOOL = {'t': 't', 'true': 't', '1': 't', '1.0': 't', 'f': 'f', 'false': 'f', '0': 'f', '0.0': 'f'}
+
+#Medidas: diarias (suma sobre filas de calendar) y por listing-mes (una vez por listing y mes)
+MEDIDAS = ['dias', 'noches_reservadas', 'ingresos', 'suma_precio', 'n_precio',
+           'listings', 'reviews', 'suma_rating', 'n_rating']
+
+#Columnas de la sábana que se leen para construir los cubos
+COLUMNAS_SABANA = ['listing_id', 'booked_night', 'daily_revenue', 'price_num', 'reviews_in_month',
+                   'review_scores_rating'] + DIMENSIONES
+
+#Cubos materializados: {tabla: dimensiones}; cubo_base tiene todas y el resto son agregaciones de él
+CUBOS = {
+    'cubo_base': DIMENSIONES,
+    'cubo_barrio': ['neighbourhood_cleansed'] + DIMENSIONES_TIEMPO,
+    'cubo_price_bucket': ['price_bucket'] + DIMENSIONES_TIEMPO,
+    'cubo_superhost': ['host_is_superhost'] + DIMENSIONES_TIEMPO,
+}
+
+
+#Codifica una dimensión como enteros (nulos → -1) con etiquetas de texto (str del valor); valores con el
+#mismo texto comparten código. Con booleano=True las variantes de verdadero/falso se etiquetan 't'/'f',
+#así la etiqueta no depende de si la sábana vino de pandas o de SQLite.
+def _codificar(s, booleano=False):
+    codigos, unicos = pd.factorize(s)
+    textos = [str(u) for u in unicos]
+    if booleano:
+        textos = [ETIQUETAS_BOOL.get(t.strip().lower(), t) for t in textos]
+    por_texto, etiquetas = pd.factorize(pd.Index(textos, dtype=object))
+    codigos = np.where(codigos >= 0, por_texto[codigos] if len(por_texto) else codigos, -1)
+    return codigos, np.append(np.asarray(etiquetas, dtype=object), None)
+
+
+#Agrega un bloque de la sábana (DataFrame completo o bloque de iter_flat_sheet) al cubo base.
+#Cada bloque debe traer todas las filas de sus listings (como iter_flat_sheet) para que los conteos
+#por listing-mes no se repitan entre bloques. Se agrupa sobre códigos enteros y las etiquetas se
+#recuperan al final (el cubo tiene miles de filas, la sábana millones).
+def agregar(flat):
+    faltan = [c for c in ['listing_id'] + DIMENSIONES_TIEMPO if c not in flat.columns]
+    if faltan:
+        raise ValueError(f"La sábana no trae las columnas necesarias para los cubos: {faltan}")
+    df = pd.DataFrame({'listing_id': pd.factorize(flat['listing_id'])[0]})
+    etiquetas = {}
+    for c in DIMENSIONES:
+        if c in DIMENSIONES_TIEMPO:
+            df[c] = pd.to_numeric(flat[c], errors='coerce').to_numpy()
+        elif c in flat.columns:
+            df[c], etiquetas[c] = _codificar(flat[c], booleano=c in DIMENSIONES_BOOL)
+        else:
+            df[c], etiquetas[c] = -1, np.array([None], dtype=object)
+    for origen, destino in [('booked_night', 'noches_reservadas'), ('daily_revenue', 'ingresos'),
+                            ('price_num', 'precio'), ('reviews_in_month', 'reviews'),
+                            ('review_scores_rating', 'rating')]:
+        df[destino] = pd.to_numeric(flat[origen], errors='coerce').to_numpy() if origen in flat.columns else np.nan
+
+    # 1) listing-mes: medidas diarias sumadas; reviews_in_month y rating son constantes en el listing-mes
+    por_listing = (df.groupby(DIMENSIONES + ['listing_id'], dropna=False, sort=False)
+                     .agg(dias=('listing_id', 'size'), noches_reservadas=('noches_reservadas', 'sum'),
+                          ingresos=('ingresos', 'sum'), suma_precio=('precio', 'sum'), n_precio=('precio', 'count'),
+                          reviews=('reviews', 'first'), rating=('rating', 'first'))
+                     .reset_index())
+    por_listing['reviews'] = por_listing['reviews'].fillna(0)
+
+    # 2) celda del cubo: suma de listing-meses
+    base = (por_listing.groupby(DIMENSIONES, dropna=False, sort=False)
+                       .agg(dias=('dias', 'sum'), noches_reservadas=('noches_reservadas', 'sum'),
+                            ingresos=('ingresos', 'sum'), suma_precio=('suma_precio', 'sum'),
+                            n_precio=('n_precio', 'sum'), listings=('listing_id', 'size'),
+                            reviews=('reviews', 'sum'), suma_rating=('rating', 'sum'), n_rating=('rating', 'count'))
+                       .reset_index())
+    for c, etiqueta in etiquetas.items():
+        base[c] = etiqueta[base[c].to_numpy()]
+    return base
+
+
+#Une cubos base parciales (p. ej. uno por bloque de listings) sumando celda a celda
+def combinar(partes):
+    partes = [p for p in partes if p is not None and len(p)]
+    if not partes:
+        return pd.DataFrame(columns=DIMENSIONES + MEDIDAS)
+    if len(partes) == 1:
+        return partes[0]
+    return pd.concat(partes, ignore_index=True).groupby(DIMENSIONES, dropna=False, sort=False)[MEDIDAS].sum().reset_index()
+
+
+#Deriva todos los cubos de CUBOS a partir del cubo base; enteros en conteos y orden por dimensiones
+def derivar(base, cubos=None):
+    salida = {}
+    for nombre, dims in (cubos or CUBOS).items():
+        cubo = base if dims == DIMENSIONES else base.groupby(dims, dropna=False, sort=False)[MEDIDAS].sum().reset_index()
+        cubo = cubo[dims + MEDIDAS].copy()
+        for c in DIMENSIONES_TIEMPO + ['dias', 'noches_reservadas', 'n_precio', 'listings', 'reviews', 'n_rating']:
+            if c in cubo.columns and cubo[c].notna().all():
+                cubo[c] = cubo[c].astype('int64')
+        salida[nombre] = cubo.sort_values(dims, na_position='first', ignore_index=True)
+    return salida
+
+
+#Generador que deja pasar los bloques de la sábana y va agregando cada uno al cubo base (en partes)
+def acumular(bloques, partes):
+    for bloque in bloques:
+        if len(bloque):
+            partes.append(agregar(bloque))
+        yield bloque
+
+
+#Sábana mínima para los cubos desde el esquema estrella (Transformation.build_star_schema), sin las
+#columnas que no se usan: hechos ← dimensión por listing_id y reviews por (listing_id, year, month)
+def sabana_desde_estrella(tablas):
+    hechos = tablas['fact_calendar_day']
+    dim = tablas['dim_listing']
+    flat = hechos[[c for c in hechos.columns if c in COLUMNAS_SABANA]]
+    flat = flat.merge(dim[[c for c in dim.columns if c in COLUMNAS_SABANA and (c == 'listing_id' or c not in flat.columns)]],
+                      on='listing_id', how='left')
+    rmon = tablas.get('fact_reviews_month')
+    if rmon is not None:
+        flat = flat.merge(rmon, on=['listing_id', 'year', 'month'], how='left')
+    return flat
+
+
+#Meses (year, month) presentes en un cubo o bloque
+def meses(df):
+    if len(df) == 0:
+        return []
+    pares = df[['year', 'month']].dropna().drop_duplicates()
+    return sorted((int(y), int(m)) for y, m in pares.itertuples(index=False, name=None))
@@ -1,19 +1,30 @@
 #Importando las librerias para extracción y conexión a mongo
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import hashlib
+import json
+import os
 import pandas as pd
 from pymongo import MongoClient
 from pymongo.errors import ConfigurationError
 from logs import Logs
+import columnar
+import perfilado
+import plan_tipos
 
 class Extraction:
-    #Constructor con la clase logs
+    #Constructor con la clase logs y un único MongoClient (con pool de conexiones) para toda la corrida
     def __init__(self):
         self.logs = Logs()
+        self.client = None
 
-    #Función para realizar la conexión a la base de datos MongoDB
-    def mongodb_connection(self, uri, database):
+    #Función para realizar la conexión a la base de datos MongoDB.
+    #Reutiliza el cliente ya abierto: todas las lecturas (incluidas las paralelas) comparten su pool.
+    def mongodb_connection(self, uri, database, max_pool_size=50):
         try:
-            client = MongoClient(uri)
-            db = client[database]
+            if self.client is None:
+                self.client = MongoClient(uri, maxPoolSize=max_pool_size)
+            db = self.client[database]
             db.list_collection_names()
 
             print(f"Conexión exitosa a la base de datos: {database}")
@@ -24,26 +35,336 @@ class Extraction:
             self.logs.log(f'Error al conectar con la base de datos {database}: {str(e)}', 'error')
             return None
     
-    #Función para cargar colecciones a un dataframe
-    def load_mongodb_datasets(self, db, colecction_name):
+    #Generador que lee una colección por lotes y entrega un DataFrame por lote.
+    #La proyección se aplica en el servidor, así los campos descartados nunca llegan a pandas
+    #y la memoria de documentos Python queda acotada por batch_size.
+    #dtypes: plan de tipos (ver plan_tipos) aplicado a cada lote, antes de acumularlos.
+    def iter_mongodb_batches(self, db, colecction_name, projection=None, batch_size=50_000, query=None, dtypes=None):
+        if db is None:
+            self.logs.log(f'Atención: función de conección no llamada, no se puede continuar con la operación', 'warning')
+            raise RuntimeError("Primero se debe llamar al metodo mongodb_connection()")
+
+        cursor = db[colecction_name].find(query or {}, projection, batch_size=batch_size)
+        try:
+            while True:
+                docs = list(islice(cursor, batch_size))
+                if not docs:
+                    break
+                df = pd.DataFrame.from_records(docs)
+                del docs
+                if dtypes:
+                    plan_tipos.aplicar_tipos(df, dtypes)
+                yield df
+        finally:
+            cursor.close()
+
+    #Función para cargar colecciones a un dataframe (lectura por lotes + proyección)
+    @perfilado.medir("extraccion", clave="colecction_name")
+    def load_mongodb_datasets(self, db, colecction_name, projection=None, batch_size=50_000, query=None, dtypes=None):
         if db is None:
             self.logs.log(f'Atención: función de conección no llamada, no se puede continuar con la operación', 'warning')
             raise RuntimeError("Primero se debe llamar al metodo mongodb_connection()")
         
         try:
-            cursor = db[colecction_name].find()
-            data = list(cursor)
-            df = pd.DataFrame(data)
+            # Los lotes se unen a medida que llegan (plan_tipos.concatenar_lotes), no al final
+            df = plan_tipos.concatenar_lotes(self.iter_mongodb_batches(db, colecction_name, projection, batch_size,
+                                                                       query, dtypes))
             n = len(df) #Número de registros de la colección para el log
+            self.logs.log(f'Colección {colecction_name}: proyección={projection} | batch_size={batch_size}', 'info')
             self.logs.log(f'Colección {colecction_name} añadida al dataframe exitosamente. \
                           #Número de registros: {n}', 'info')
+            plan_tipos.inferir_tipos(df, plan_tipos.coleccion_base(colecction_name))
+            self._log_memoria(colecction_name, df, dtypes)
             return df
         except Exception as e:
             self.logs.log(f'Error al cargar la coleccion {colecction_name}: {str(e)}', 'error')
             print(f'Error al cargar la colección {colecction_name}')
 
-    def close_mongodb_connection(self, uri):
-        client = MongoClient(uri)
-        if client:
-            client.close()
+    #Calcula límites de rango sobre partition_key a partir de una muestra ($sample),
+    #para repartir la colección en n_partitions rangos de tamaño parecido.
+    #El campo debe existir en todos los documentos y tener un tipo homogéneo (p. ej. _id o listing_id).
+    def partition_bounds(self, db, colecction_name, n_partitions, partition_key='_id', sample_size=2_000, query=None):
+        if n_partitions <= 1:
+            return []
+        pipeline = [{'$match': query}] if query else []
+        pipeline += [{'$sample': {'size': sample_size}},
+                     {'$project': {'_id': 0, 'k': f'${partition_key}'}}]
+        try:
+            keys = sorted(d['k'] for d in db[colecction_name].aggregate(pipeline) if d.get('k') is not None)
+        except TypeError:
+            self.logs.log(f'Colección {colecction_name}: {partition_key} con tipos mixtos, se lee en una sola partición', 'warning')
+            return []
+        bounds = []
+        for i in range(1, n_partitions):
+            if not keys:
+                break
+            b = keys[i * len(keys) // n_partitions]
+            if not bounds or b > bounds[-1]:
+                bounds.append(b)
+        return bounds
+
+    #Convierte los límites en filtros [lo, hi) combinados con el filtro base
+    def _range_queries(self, bounds, partition_key, query=None):
+        edges = [None] + list(bounds) + [None]
+        queries = []
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            cond = {}
+            if lo is not None: cond['$gte'] = lo
+            if hi is not None: cond['$lt'] = hi
+            q = {partition_key: cond} if cond else {}
+            if query:
+                q = {'$and': [query, q]} if q else query
+            queries.append(q)
+        return queries
+
+    #Carga una colección en paralelo: N rangos de partition_key leídos por lotes en un pool de hilos
+    #sobre el mismo MongoClient (pool de conexiones compartido); las partes se concatenan al final.
+    @perfilado.medir("extraccion", clave="colecction_name")
+    def load_mongodb_parallel(self, db, colecction_name, n_partitions=4, partition_key='_id',
+                              projection=None, batch_size=50_000, query=None, max_workers=None, dtypes=None):
+        if db is None:
+            self.logs.log(f'Atención: función de conección no llamada, no se puede continuar con la operación', 'warning')
+            raise RuntimeError("Primero se debe llamar al metodo mongodb_connection()")
+
+        def cargar_rango(q):
+            df = plan_tipos.concatenar_lotes(self.iter_mongodb_batches(db, colecction_name, projection, batch_size,
+                                                                       q, dtypes))
+            return df if len(df.columns) else None
+
+        try:
+            bounds = self.partition_bounds(db, colecction_name, n_partitions, partition_key, query=query)
+            queries = self._range_queries(bounds, partition_key, query)
+            with ThreadPoolExecutor(max_workers=max_workers or len(queries)) as pool:
+                parts = [p for p in pool.map(cargar_rango, queries) if p is not None]
+            df = plan_tipos.concatenar(parts)
+            del parts
+            self.logs.log(f'Colección {colecction_name} añadida al dataframe en paralelo. '
+                          f'Particiones: {len(queries)} por {partition_key} | Número de registros: {len(df)}', 'info')
+            plan_tipos.inferir_tipos(df, plan_tipos.coleccion_base(colecction_name))
+            self._log_memoria(colecction_name, df, dtypes)
+            return df
+        except Exception as e:
+            self.logs.log(f'Error al cargar en paralelo la coleccion {colecction_name}: {str(e)}', 'error')
+            print(f'Error al cargar la colección {colecction_name}')
+
+    #Expresión de agregación que lleva un campo a número para sumarlo en una firma de contenido:
+    #números tal cual (NaN → 0, si no la suma entera queda NaN y deja de detectar ediciones), t/True → 1,
+    #f/False → 0 y texto como precio ("$1,234.00" → 1234.0); lo demás → 0.
+    #Usa $isNumber/$replaceAll/$convert (MongoDB 4.4 o posterior).
+    @staticmethod
+    def _numeric_expr(field):
+        valor = f'${field}'
+        limpio = {'$replaceAll': {'input': {'$replaceAll': {'input': valor, 'find': {'$literal': '$'}, 'replacement': ''}},
+                                  'find': ',', 'replacement': ''}}
+        return {'$switch': {'branches': [
+            {'case': {'$eq': [valor, {'$literal': float('nan')}]}, 'then': 0},
+            {'case': {'$isNumber': valor}, 'then': valor},
+            {'case': {'$in': [valor, [True, 't']]}, 'then': 1},
+            {'case': {'$in': [valor, [False, 'f', None]]}, 'then': 0},
+        ], 'default': {'$convert': {'input': limpio, 'to': 'double', 'onError': 0, 'onNull': 0}}}}
+
+    #Acumuladores $group con la suma numérica de cada campo de contenido (suma_<campo>)
+    def _content_accumulators(self, content_fields):
+        return {f'suma_{c}': {'$sum': self._numeric_expr(c)} for c in content_fields or []}
+
+    #Huella de la colección en origen: conteo exacto + _id máximo (índice) + máximo de un campo opcional
+    #(p. ej. last_scraped), junto con la proyección/filtro usados. Si no cambia, el snapshot sigue vigente.
+    #Sin un campo que delate las ediciones, content_fields agrega una firma $group con la suma de esos
+    #campos (precio, disponibilidad...): una actualización en sitio (mismo _id) también cambia la huella.
+    def collection_fingerprint(self, db, colecction_name, fingerprint_field=None, projection=None, query=None,
+                               content_fields=None):
+        coll = db[colecction_name]
+        huella = {
+            'coleccion': colecction_name,
+            'documentos': self.count_mongodb_documents(db, colecction_name, exact=True, query=query),
+            'max_id': None,
+            'max_campo': None,
+            'contenido': None,
+            'proyeccion': projection,
+            'filtro': query,
+        }
+        top = list(coll.find(query or {}, {'_id': 1}).sort('_id', -1).limit(1))
+        if top:
+            huella['max_id'] = str(top[0]['_id'])
+        if fingerprint_field:
+            top = list(coll.find(query or {}, {'_id': 0, fingerprint_field: 1}).sort(fingerprint_field, -1).limit(1))
+            if top:
+                huella['max_campo'] = str(top[0].get(fingerprint_field))
+        if content_fields:
+            pipeline = [{'$match': query}] if query else []
+            pipeline.append({'$group': {'_id': None, **self._content_accumulators(content_fields)}})
+            firma = next(iter(coll.aggregate(pipeline, allowDiskUse=True)), {})
+            huella['contenido'] = {k: round(v, 6) if isinstance(v, float) else v for k, v in firma.items() if k != '_id'}
+        huella['hash'] = hashlib.sha1(json.dumps(huella, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return huella
+
+    #Carga una colección usando un snapshot Parquet local cuando la huella del origen no cambió.
+    #Si no hay snapshot vigente (o refresh=True) lee de Mongo (por lotes o en paralelo) y lo reescribe.
+    @perfilado.medir("extraccion.snapshot", clave="colecction_name")
+    def load_mongodb_snapshot(self, db, colecction_name, snapshot_dir='data/snapshots', refresh=False,
+                              fingerprint_field=None, projection=None, batch_size=50_000, query=None,
+                              n_partitions=1, partition_key='_id', dtypes=None, content_fields=None):
+        def cargar_de_mongo():
+            if n_partitions > 1:
+                return self.load_mongodb_parallel(db, colecction_name, n_partitions, partition_key,
+                                                  projection, batch_size, query, dtypes=dtypes)
+            return self.load_mongodb_datasets(db, colecction_name, projection, batch_size, query, dtypes)
+
+        if not columnar.arrow_disponible():
+            self.logs.log(f'pyarrow no instalado: {colecction_name} se lee directo de Mongo (sin snapshot)', 'warning')
+            return cargar_de_mongo()
+
+        directorio = os.path.join(snapshot_dir, colecction_name)
+        huella = self.collection_fingerprint(db, colecction_name, fingerprint_field, projection, query, content_fields)
+        manifest = columnar.leer_manifest(directorio)
+        if not refresh and manifest and manifest.get('huella', {}).get('hash') == huella['hash']:
+            df = columnar.leer_parquet_particionado(directorio)
+            self.logs.log(f'Colección {colecction_name} leída desde snapshot {directorio}. '
+                          f'Número de registros: {len(df)}', 'info')
+            if dtypes:
+                plan_tipos.aplicar_tipos(df, dtypes)
+            plan_tipos.inferir_tipos(df, plan_tipos.coleccion_base(colecction_name))
+            self._log_memoria(colecction_name, df, dtypes)
+            return df
+
+        motivo = 'refresh forzado' if refresh else ('huella distinta' if manifest else 'sin snapshot')
+        df = cargar_de_mongo()
+        if df is not None:
+            columnar.escribir_parquet_particionado(df, directorio, filas_por_parte=max(batch_size, 500_000),
+                                                   manifest={'huella': huella})
+            self.logs.log(f'Snapshot de {colecction_name} escrito en {directorio} ({motivo})', 'info')
+        return df
+
+    #Firma por grupo calculada en el servidor ($group): conteo y fechas mínima/máxima por clave.
+    #Sirve para detectar cambios sin traer los documentos (ETL incremental).
+    #content_fields agrega la firma de contenido por grupo (suma_<campo>, ver _numeric_expr) y, con
+    #content_before, la misma firma solo de los documentos con fecha < content_before (n_antes, suma_<campo>_antes):
+    #así se comparan los días ya procesados aunque el origen haya sumado días nuevos.
+    @perfilado.medir("extraccion.firmas", clave="colecction_name")
+    def group_signatures(self, db, colecction_name, key='listing_id', date_field='date', query=None,
+                         content_fields=None, content_before=None):
+        if db is None:
+            self.logs.log(f'Atención: función de conección no llamada, no se puede continuar con la operación', 'warning')
+            raise RuntimeError("Primero se debe llamar al metodo mongodb_connection()")
+        grupo = {'_id': f'${key}', 'n': {'$sum': 1},
+                 'min_fecha': {'$min': f'${date_field}'},
+                 'max_fecha': {'$max': f'${date_field}'},
+                 **self._content_accumulators(content_fields)}
+        if content_fields and content_before is not None:
+            antes = {'$lt': [f'${date_field}', content_before]}
+            grupo['n_antes'] = {'$sum': {'$cond': [antes, 1, 0]}}
+            grupo.update({f'suma_{c}_antes': {'$sum': {'$cond': [antes, self._numeric_expr(c), 0]}}
+                          for c in content_fields})
+        pipeline = [{'$match': query}] if query else []
+        pipeline.append({'$group': grupo})
+        docs = list(db[colecction_name].aggregate(pipeline, allowDiskUse=True))
+        df = pd.DataFrame.from_records(docs, columns=list(grupo)).rename(columns={'_id': key})
+        self.logs.log(f'Colección {colecction_name}: firmas por {key} calculadas en Mongo ({len(df)} grupos)', 'info')
+        return df
+
+    #Valores de contenido por documento (los mismos números que suman las firmas de group_signatures) de los
+    #documentos con fecha anterior a `before`: con ellos se descuentan de la firma guardada los días que
+    #salen del origen entre corridas. Se calculan en el servidor y solo viajan clave, fecha y valores.
+    @perfilado.medir("extraccion.firmas", clave="colecction_name")
+    def content_values(self, db, colecction_name, content_fields, before, key='listing_id', date_field='date', query=None):
+        if db is None:
+            self.logs.log(f'Atención: función de conección no llamada, no se puede continuar con la operación', 'warning')
+            raise RuntimeError("Primero se debe llamar al metodo mongodb_connection()")
+        filtro = {date_field: {'$lt': before}}
+        pipeline = [{'$match': {'$and': [query, filtro]} if query else filtro},
+                    {'$project': {'_id': 0, key: 1, 'fecha': f'${date_field}',
+                                  **{c: self._numeric_expr(c) for c in content_fields}}}]
+        docs = list(db[colecction_name].aggregate(pipeline, allowDiskUse=True))
+        df = pd.DataFrame.from_records(docs, columns=[key, 'fecha'] + list(content_fields))
+        self.logs.log(f'Colección {colecction_name}: valores de contenido antes de {before} ({len(df)} documentos)', 'info')
+        return df
+
+    #Valor de un campo en un documento cualquiera (p. ej. para saber si las fechas llegan como texto o Date)
+    def sample_value(self, db, colecction_name, field, query=None):
+        if db is None:
+            self.logs.log(f'Atención: función de conección no llamada, no se puede continuar con la operación', 'warning')
+            raise RuntimeError("Primero se debe llamar al metodo mongodb_connection()")
+        filtro = {field: {'$ne': None}}
+        doc = db[colecction_name].find_one({'$and': [query, filtro]} if query else filtro, {'_id': 0, field: 1})
+        return None if doc is None else doc.get(field)
+
+    #Resumen por (clave, año, mes) calculado en el servidor: conteo de documentos con id y fechas mínima/máxima.
+    #La fecha se convierte con $convert (texto ISO o Date; lo no convertible se descarta) y se parte con
+    #$dateToParts (UTC). Reemplaza la colección de reviews completa cuando la transformación solo necesita
+    #reviews_in_month y first/last_review (Transformation(review_summary=...)).
+    @perfilado.medir("extraccion.resumen", clave="colecction_name")
+    def review_month_summary(self, db, colecction_name, key='listing_id', date_field='date', query=None):
+        if db is None:
+            self.logs.log(f'Atención: función de conección no llamada, no se puede continuar con la operación', 'warning')
+            raise RuntimeError("Primero se debe llamar al metodo mongodb_connection()")
+        pipeline = [{'$match': query}] if query else []
+        pipeline += [
+            {'$match': {key: {'$ne': None}}},
+            {'$project': {'_id': 0, key: 1, 'id': 1,
+                          'fecha': {'$convert': {'input': f'${date_field}', 'to': 'date',
+                                                 'onError': None, 'onNull': None}}}},
+            {'$match': {'fecha': {'$ne': None}}},
+            {'$addFields': {'partes': {'$dateToParts': {'date': '$fecha'}}}},
+            {'$group': {'_id': {'k': f'${key}', 'year': '$partes.year', 'month': '$partes.month'},
+                        'n': {'$sum': {'$cond': [{'$eq': [{'$ifNull': ['$id', None]}, None]}, 0, 1]}},
+                        'min_fecha': {'$min': '$fecha'},
+                        'max_fecha': {'$max': '$fecha'}}},
+            {'$project': {'_id': 0, key: '$_id.k', 'year': '$_id.year', 'month': '$_id.month',
+                          'n': 1, 'min_fecha': 1, 'max_fecha': 1}},
+        ]
+        docs = list(db[colecction_name].aggregate(pipeline, allowDiskUse=True))
+        df = pd.DataFrame.from_records(docs, columns=[key, 'year', 'month', 'n', 'min_fecha', 'max_fecha'])
+        self.logs.log(f'Colección {colecction_name}: resumen por {key} y mes calculado en Mongo '
+                      f'({len(df)} grupos, {int(df["n"].sum()) if len(df) else 0} documentos)', 'info')
+        return df
+
+    #Posición de un valor en [0, 1) según un hash estable (blake2b de "semilla:valor"): el mismo id y la misma
+    #semilla dan siempre la misma posición, en cualquier proceso o máquina (hash() de Python cambia por proceso).
+    #Los ids float enteros (1.0) se tratan como int para no depender del tipo con que llegaron.
+    @staticmethod
+    def sample_position(value, seed=0):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        digest = hashlib.blake2b(f'{seed}:{value}'.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') / 2 ** 64
+
+    #Muestra determinista de listings: los ids cuya posición (sample_position) queda bajo `fraction`.
+    #Solo se leen los ids (proyección en el servidor); con ellos se filtran listings, calendar y reviews
+    #con $in, así cada listing elegido llega con todos sus días y reviews y los joins no se rompen.
+    #Subir la fracción con la misma semilla solo agrega listings a la muestra anterior.
+    @perfilado.medir("extraccion.muestra", clave="colecction_name")
+    def sample_listing_ids(self, db, colecction_name, fraction, seed=0, key='id'):
+        if db is None:
+            self.logs.log(f'Atención: función de conección no llamada, no se puede continuar con la operación', 'warning')
+            raise RuntimeError("Primero se debe llamar al metodo mongodb_connection()")
+        if not 0 < fraction <= 1:
+            raise ValueError(f"La fracción de la muestra debe estar en (0, 1]: {fraction}")
+        cursor = db[colecction_name].find({key: {'$ne': None}}, {'_id': 0, key: 1})
+        ids = list(dict.fromkeys(d[key] for d in cursor if key in d))
+        muestra = [v for v in ids if self.sample_position(v, seed) < fraction]
+        self.logs.log(f'Muestra de {colecction_name}: {len(muestra)} de {len(ids)} listings '
+                      f'(fracción={fraction}, semilla={seed})', 'info')
+        return muestra
+
+    #Reporte de memoria por colección cuando se aplicó un plan de tipos
+    def _log_memoria(self, colecction_name, df, dtypes):
+        if dtypes and df is not None:
+            tipos = df.dtypes.astype(str).value_counts().to_dict()
+            self.logs.log(f'[plan_tipos] {colecction_name}: {plan_tipos.memoria_mb(df):,.1f} MB | dtypes={tipos}', 'info')
+
+    #Conteo de documentos: por defecto estimado (metadatos de la colección, no recorre documentos);
+    #exact=True (o un filtro) usa count_documents, que sí recorre la colección.
+    def count_mongodb_documents(self, db, colecction_name, exact=False, query=None):
+        if db is None:
+            self.logs.log(f'Atención: función de conección no llamada, no se puede continuar con la operación', 'warning')
+            raise RuntimeError("Primero se debe llamar al metodo mongodb_connection()")
+        if exact or query:
+            return db[colecction_name].count_documents(query or {})
+        return db[colecction_name].estimated_document_count()
+
+    #Cierra el cliente compartido (el mismo que abrió mongodb_connection)
+    def close_mongodb_connection(self, uri=None):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
             self.logs.log(f'Conexión con MongoDB cerrada existosamente', 'info')
\ No newline at end of file
@@ -0,0 +1,313 @@
+#ETL incremental: detección de cambios por listing contra una tabla de estado en SQLite.
+#Un listing se reprocesa completo (todo su calendar y sus reviews) si es nuevo, si cambió el contenido
+#de su documento (sin campos volátiles como last_scraped ni el valor de los contadores de ventana móvil),
+#si cambió la firma de sus reviews (conteo y fecha máxima) o si cambió en origen algún día de calendar ya
+#cargado (firma de contenido: suma de precio, disponibilidad y noches por listing). Del resto solo se extraen
+#los días de calendar posteriores al último procesado (el calendar se desplaza un día por corrida), en la
+#carga se borran los días que salieron del origen y los contadores se actualizan en sitio.
+import hashlib
+import json
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+TABLA_ESTADO = "etl_estado_listings"
+
+#Campos que cambian en cada scrape sin que cambie el listing
+CAMPOS_VOLATILES = ("_id", "scrape_id", "last_scraped", "calendar_last_scraped")
+
+#Contadores de ventana móvil (disponibilidad, reviews de los últimos 30 días/12 meses, estimaciones): cambian
+#casi cada noche sin que cambie el listing. En la huella solo cuenta si son nulos (un nulo se imputa con
+#medianas de grupo, así que ese caso sí reprocesa); sus valores tienen huella aparte y se actualizan en sitio
+#en las filas ya cargadas (Carga.actualizar_columnas_sqlite).
+CAMPOS_CONTADORES = ("availability_30", "availability_60", "availability_90", "availability_365", "availability_eoy",
+                     "number_of_reviews_ltm", "number_of_reviews_l30d", "number_of_reviews_ly", "reviews_per_month")
+PREFIJOS_CONTADORES = ("estimated_",)
+
+#Días del inicio de cada calendar que el estado guarda uno por uno para descontar de la firma de contenido
+#los días que salen del origen entre corridas; si el calendar avanzó más que esto, el listing se reprocesa
+DIAS_FIRMA_INICIO = 7
+
+COLUMNAS_ESTADO = ["listing_id", "huella", "huella_contadores", "n_reviews", "max_fecha_review",
+                   "min_fecha_calendar", "max_fecha_calendar", "firma_calendar", "procesado_en"]
+
+
+#Fechas de Mongo (str ISO, datetime o {'$date': ...}) → 'YYYY-MM-DD'; inválidas → NaN
+def fechas_iso(s):
+    s = pd.Series(s)
+    if s.dtype == object:
+        s = s.map(lambda v: v.get('$date') if isinstance(v, dict) else v)
+    dt = pd.to_datetime(s, format='ISO8601', errors='coerce', utc=True)
+    return dt.dt.strftime('%Y-%m-%d').where(dt.notna())
+
+
+#Columnas de contadores de ventana móvil presentes en df
+def columnas_contadores(df):
+    return [c for c in df.columns
+            if isinstance(c, str) and (c in CAMPOS_CONTADORES or c.startswith(PREFIJOS_CONTADORES))]
+
+
+#sha1 por fila de `contenido` (columnas ordenadas por nombre)
+def _huellas_filas(contenido, ids, nombre):
+    contenido.columns = list(map(str, contenido.columns))
+    cols = sorted(contenido.columns)
+    huellas = [hashlib.sha1(json.dumps(dict(zip(cols, fila)), sort_keys=True, default=str).encode('utf-8')).hexdigest()
+               for fila in contenido[cols].itertuples(index=False, name=None)]
+    return pd.Series(huellas, index=ids, name=nombre)
+
+
+#Huella sha1 por listing sobre el documento completo menos los campos volátiles; de los contadores solo
+#entra si son nulos
+def huellas_listings(df, id_col='id', volatiles=CAMPOS_VOLATILES):
+    contenido = df.drop(columns=[c for c in volatiles if c in df.columns and c != id_col])
+    for c in columnas_contadores(contenido):
+        contenido[c] = contenido[c].isna()
+    return _huellas_filas(contenido, df[id_col].tolist(), 'huella')
+
+
+#Huella sha1 por listing de los valores de sus contadores (decide qué filas cargadas se actualizan en sitio)
+def huellas_contadores(df, id_col='id'):
+    return _huellas_filas(df[[id_col] + columnas_contadores(df)].copy(), df[id_col].tolist(), 'huella_contadores')
+
+
+#Contadores de los listings `ids` con el valor que toman en la sábana (clean_nulls: enteros >= 0;
+#reviews_per_month tal cual). Los nulos quedan nulos y no pisan lo cargado.
+def contadores_sabana(df, ids, id_col='id'):
+    df = df[df[id_col].isin(list(ids))]
+    out = pd.DataFrame({'listing_id': df[id_col].to_numpy()})
+    for c in columnas_contadores(df):
+        v = pd.to_numeric(df[c], errors='coerce').to_numpy(dtype=float)
+        out[c] = v if c == 'reviews_per_month' else np.maximum(0, np.floor(v))
+    return out
+
+
+#Universo de listings: los de listings más los que solo aparecen en calendar (la sábana parte de calendar,
+#así que sus filas existen aunque falte el documento); sin documento la huella queda vacía
+def huellas_con_calendar(huellas, firmas_calendar):
+    ids = pd.Index(huellas.index).union(pd.Index(firmas_calendar.index))
+    return huellas.reindex(ids).fillna('')
+
+
+#Firmas (n, min_fecha, max_fecha y, si vienen, n_antes/suma_*) por listing_id desde un $group en Mongo,
+#con fechas normalizadas a ISO
+def normalizar_firmas(firmas):
+    if firmas is None or len(firmas) == 0:
+        return pd.DataFrame(columns=['n', 'min_fecha', 'max_fecha'])
+    extra = [c for c in firmas.columns if c == 'n_antes' or c.startswith('suma_')]
+    out = firmas.set_index('listing_id')[['n'] + extra].copy()
+    out['min_fecha'] = fechas_iso(firmas['min_fecha']).to_numpy()
+    out['max_fecha'] = fechas_iso(firmas['max_fecha']).to_numpy()
+    return out[['n', 'min_fecha', 'max_fecha'] + extra]
+
+
+#Día siguiente al último día de calendar procesado (ISO): la firma de contenido en origen se compara
+#sobre los días anteriores a esta fecha; None sin estado
+def corte_calendar(estado):
+    fechas = estado['max_fecha_calendar'].dropna() if len(estado) else []
+    if not len(fechas):
+        return None
+    return (pd.Timestamp(max(fechas)) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+#Fecha (ISO) antes de la cual los días de calendar se guardan uno por uno en la firma: el inicio más
+#temprano del calendar en origen + DIAS_FIRMA_INICIO; None sin calendar
+def limite_inicio(firmas_calendar, dias=DIAS_FIRMA_INICIO):
+    fechas = firmas_calendar['min_fecha'].dropna() if len(firmas_calendar) else []
+    if not len(fechas):
+        return None
+    return (pd.Timestamp(min(fechas)) + pd.Timedelta(days=dias)).strftime('%Y-%m-%d')
+
+
+#Firma de contenido del calendar por listing para el estado (JSON): campos, conteo y sumas de todo el
+#calendar en origen, más los valores de los días anteriores a `limite` ([fecha, valores...]).
+#valores_inicio viene de Extraction.content_values (listing_id, fecha, campos).
+def firmas_calendar_estado(firmas_calendar, valores_inicio, campos, limite):
+    campos = list(campos)
+    inicio = {}
+    if valores_inicio is not None and len(valores_inicio):
+        fechas = fechas_iso(valores_inicio['fecha']).to_numpy()
+        valores = valores_inicio[campos].astype(float).to_numpy().tolist()
+        for lid, fecha, v in zip(valores_inicio['listing_id'].tolist(), fechas, valores):
+            if isinstance(fecha, str):
+                inicio.setdefault(lid, []).append([fecha] + v)
+    sumas = firmas_calendar[[f'suma_{c}' for c in campos]].astype(float).to_numpy().tolist()
+    firmas = [json.dumps({'campos': campos, 'n': int(n), 'suma': s, 'limite': limite, 'inicio': sorted(inicio.get(lid, []))})
+              for lid, n, s in zip(firmas_calendar.index, firmas_calendar['n'], sumas)]
+    return pd.Series(firmas, index=firmas_calendar.index, name='firma_calendar')
+
+
+#Firma guardada en el estado → dict; None si no hay o no se puede leer
+def _leer_firma(texto):
+    if not isinstance(texto, str) or not texto:
+        return None
+    try:
+        return json.loads(texto)
+    except ValueError:
+        return None
+
+
+#Listings cuyo calendar ya cargado cambió en origen (precio, disponibilidad o noches editados en días ya
+#procesados, o días agregados/borrados dentro del rango). La firma en origen de los días anteriores al corte
+#(n_antes, suma_<campo>_antes) debe ser la guardada menos los días que salieron del origen (anteriores al
+#nuevo inicio). Sin firma guardada comparable, o si salieron más días de los guardados uno por uno, el
+#listing se da por cambiado.
+def calendar_editados(ids, firmas_calendar, estado, campos):
+    campos = list(campos)
+    antes = [f'suma_{c}_antes' for c in campos]
+    if not len(ids) or 'n_antes' not in firmas_calendar.columns:
+        return []
+    firmas_guardadas = estado['firma_calendar'] if 'firma_calendar' in estado.columns else pd.Series(dtype=object)
+    editados = []
+    for lid in ids:
+        if lid not in firmas_calendar.index:
+            continue  # sin calendar en origen: los días cargados salen con inicio_calendar
+        fila = firmas_calendar.loc[lid]
+        previa = _leer_firma(firmas_guardadas.get(lid))
+        if previa is None or previa.get('campos') != campos:
+            editados.append(lid)
+            continue
+        inicio = fila['min_fecha'] if isinstance(fila['min_fecha'], str) else ''
+        max_previa = estado.at[lid, 'max_fecha_calendar']
+        if isinstance(max_previa, str) and inicio > max_previa:
+            continue  # todo lo cargado salió del origen
+        if inicio > (previa.get('limite') or ''):
+            editados.append(lid)
+            continue
+        salen = [d[1:] for d in previa['inicio'] if d[0] < inicio]
+        esperado = np.asarray(previa['suma'], dtype=float) - (np.sum(salen, axis=0) if salen else 0.0)
+        actual = fila[antes].to_numpy(dtype=float)
+        if int(fila['n_antes']) != previa['n'] - len(salen) or not np.allclose(actual, esperado, rtol=1e-9, atol=1e-6, equal_nan=True):
+            editados.append(lid)
+    return editados
+
+
+#Compara el origen con el estado guardado y clasifica los listings
+def detectar_cambios(huellas, firmas_reviews, estado, firmas_calendar=None, campos_calendar=None,
+                     huellas_cont=None):
+    """
+    huellas: Serie listing_id → huella (origen)
+    firmas_reviews: DataFrame normalizado (índice listing_id; n, max_fecha)
+    estado: DataFrame de la tabla de estado (puede venir vacío)
+    firmas_calendar / campos_calendar: firmas normalizadas con n_antes/suma_<campo>_antes (ver
+      calendar_editados); si se pasan, un calendar editado en origen también marca el listing como cambiado
+    huellas_cont: Serie listing_id → huella de contadores (ver huellas_contadores)
+    Retorna {'nuevos', 'cambiados', 'sin_cambio', 'eliminados'} (listas de listing_id),
+    'calendar_editado' (los cambiados solo por su calendar), 'contadores' (sin_cambio con contadores
+    distintos a los cargados) y 'cortes' (Serie listing_id → max_fecha_calendar procesada, solo de sin_cambio).
+    """
+    estado = estado.set_index('listing_id') if len(estado) else pd.DataFrame(columns=COLUMNAS_ESTADO[1:])
+    ids = pd.Index(huellas.index)
+    previos = ids.intersection(estado.index)
+
+    rev = firmas_reviews.reindex(ids)
+    n_rev = rev['n'].fillna(0).astype('int64')
+    max_rev = rev['max_fecha'].fillna('')
+
+    prev = estado.reindex(previos)
+    distinto = ((huellas.reindex(previos) != prev['huella'])
+                | (n_rev.reindex(previos).to_numpy() != pd.to_numeric(prev['n_reviews'], errors='coerce').fillna(0).astype('int64').to_numpy())
+                | (max_rev.reindex(previos).to_numpy() != prev['max_fecha_review'].fillna('').astype(str).to_numpy()))
+
+    cambiados = previos[distinto.to_numpy()].tolist()
+    sin_cambio = previos[~distinto.to_numpy()].tolist()
+
+    editados = []
+    if firmas_calendar is not None and campos_calendar:
+        editados = calendar_editados(sin_cambio, firmas_calendar, estado, campos_calendar)
+        if editados:
+            quitar = set(editados)
+            cambiados += editados
+            sin_cambio = [i for i in sin_cambio if i not in quitar]
+
+    contadores = []
+    if huellas_cont is not None and sin_cambio:
+        previa = estado['huella_contadores'] if 'huella_contadores' in estado.columns else pd.Series(dtype=object)
+        actual = huellas_cont.reindex(sin_cambio)
+        contadores = [i for i, h in zip(sin_cambio, actual.tolist()) if isinstance(h, str) and h != previa.get(i)]
+
+    return {
+        'nuevos': ids.difference(estado.index).tolist(),
+        'cambiados': cambiados,
+        'sin_cambio': sin_cambio,
+        'eliminados': pd.Index(estado.index).difference(ids).tolist(),
+        'calendar_editado': editados,
+        'contadores': contadores,
+        'cortes': estado.loc[sin_cambio, 'max_fecha_calendar'] if sin_cambio else pd.Series(dtype=object),
+    }
+
+
+#Valor de fecha para filtros de Mongo con el mismo tipo que el campo en origen (str o datetime)
+def fecha_mongo(iso, ejemplo):
+    if isinstance(ejemplo, datetime):
+        return datetime.fromisoformat(iso)
+    return iso
+
+
+#Filtro de calendar: todo lo de los listings a reprocesar + días posteriores al corte del resto
+def filtro_calendar(reprocesar, cortes, ejemplo_fecha=None, date_field='date'):
+    condiciones = []
+    if reprocesar:
+        condiciones.append({'listing_id': {'$in': list(reprocesar)}})
+    cortes = cortes.dropna()
+    if len(cortes):
+        condiciones.append({'listing_id': {'$in': cortes.index.tolist()},
+                            date_field: {'$gt': fecha_mongo(str(cortes.min()), ejemplo_fecha)}})
+    if not condiciones:
+        return None
+    return condiciones[0] if len(condiciones) == 1 else {'$or': condiciones}
+
+
+#Sin reviews, first_review/last_review se completan con el rango del calendar (Transformation._fill_review_dates),
+#que avanza en cada corrida: en las filas ya cargadas de esos listings se actualizan en sitio como los contadores
+COLUMNAS_RANGO_CALENDAR = ("first_review", "last_review")
+
+
+#first_review/last_review (una fila por listing) de la sábana del lote para los listings de `continuan` sin
+#reviews en origen; DataFrame vacío si no hay
+def rango_calendar_sabana(df, continuan, firmas_reviews):
+    ids = {str(i) for i in continuan if i not in firmas_reviews.index}
+    cols = [c for c in COLUMNAS_RANGO_CALENDAR if df is not None and c in df.columns]
+    if not ids or not cols:
+        return pd.DataFrame()
+    df = df[df['listing_id'].astype(str).isin(ids)]
+    return df.drop_duplicates('listing_id')[['listing_id'] + cols].reset_index(drop=True)
+
+
+#Listings sin cambio cuyo calendar en origen trae días posteriores a su corte (entran al lote solo con esos días)
+def con_dias_nuevos(cortes, firmas_calendar):
+    cortes = cortes.dropna()
+    if not len(cortes) or not len(firmas_calendar):
+        return []
+    max_fecha = firmas_calendar['max_fecha'].reindex(cortes.index)
+    nuevos = max_fecha.notna().to_numpy() & (max_fecha.fillna('').astype(str).to_numpy() > cortes.astype(str).to_numpy())
+    return cortes.index[nuevos].tolist()
+
+
+#Del calendar extraído conserva los listings a reprocesar y, del resto, solo días > su corte
+def filtrar_dias_nuevos(cal, reprocesar, cortes, date_field='date'):
+    if len(cal) == 0:
+        return cal
+    completo = cal['listing_id'].isin(list(reprocesar))
+    corte = cal['listing_id'].map(cortes.dropna())
+    fechas = fechas_iso(cal[date_field]).fillna('').to_numpy()
+    nuevo = corte.notna().to_numpy() & (fechas > corte.fillna('').astype(str).to_numpy())
+    return cal[completo | nuevo].reset_index(drop=True)
+
+
+#Estado a guardar tras una carga correcta: huellas, firmas de reviews y rango y firma de calendar por listing
+def estado_nuevo(huellas, firmas_reviews, firmas_calendar, huellas_cont=None, firmas_contenido=None):
+    ids = pd.Index(huellas.index)
+    rev = firmas_reviews.reindex(ids)
+    cal = firmas_calendar.reindex(ids)
+    vacias = pd.Series(dtype=object)
+    return pd.DataFrame({
+        'listing_id': ids,
+        'huella': huellas.to_numpy(),
+        'huella_contadores': (huellas_cont if huellas_cont is not None else vacias).reindex(ids).to_numpy(),
+        'n_reviews': rev['n'].fillna(0).astype('int64').to_numpy(),
+        'max_fecha_review': rev['max_fecha'].to_numpy(),
+        'min_fecha_calendar': cal['min_fecha'].to_numpy(),
+        'max_fecha_calendar': cal['max_fecha'].to_numpy(),
+        'firma_calendar': (firmas_contenido if firmas_contenido is not None else vacias).reindex(ids).to_numpy(),
+        'procesado_en': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+    })
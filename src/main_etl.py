@@ -1,47 +1,403 @@
 # main_etl.py
+import argparse
+import os
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from extraction import Extraction
 from transformacion import Transformation
 from carga import Carga
 from logs import Logs
-from pymongo import MongoClient
+import plan_tipos
+import incremental
+import perfilado
+import cubos
+from columnar import arrow_disponible, reemplazar_meses_parquet
 
 # --------- Configuración ---------
 MONGO_URI = "mongodb://localhost:27017/"
 DB_NAME   = "bi_mx"
+SUFIJO    = "mx"          # colecciones listings_<sufijo>, calendar_<sufijo>, reviews_<sufijo>
+SALIDA_DIR = "data"       # SQLite y Excel de la corrida
 
-def contar_mongo(coleccion: str) -> int:
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
-    n = db[coleccion].count_documents({})
-    client.close()
-    return n
+# Lectura por lotes y proyección en origen (campos que la transformación descarta)
+BATCH_SIZE  = 50_000
+PROYECCIONES = {
+    "calendar": {"_id": 0, "adjusted_price": 0},
+    "reviews":  {"_id": 0},
+}
 
-def main():
+# Lectura en paralelo: colecciones simultáneas y rangos de _id por colección grande
+CARGA_CONCURRENTE = True
+PARTICIONES = {"calendar": 4}
+
+# Conteo en origen: estimado (metadatos) por defecto; exacto solo con --conteo-exacto
+CONTEO_EXACTO = False
+
+# Snapshots Parquet de las colecciones extraídas, opcionales con --snapshot (se reutilizan si la huella
+# del origen no cambió). La huella lleva conteo exacto y _id máximo, más el máximo de CAMPOS_HUELLA y, en
+# colecciones sin un campo que delate ediciones en sitio, la suma de CAMPOS_CONTENIDO (firma $group)
+USAR_SNAPSHOT = False
+SNAPSHOT_DIR = "data/snapshots"
+CAMPOS_HUELLA = {"listings": "last_scraped", "reviews": "date"}
+CAMPOS_CONTENIDO = {"calendar": ["price", "available", "minimum_nights", "maximum_nights"]}
+
+# Plan de tipos compactos (category/int8/int32) aplicado desde la extracción y en la sábana
+USAR_PLAN_TIPOS = True
+
+# Carga a SQLite: 'bulk' (esquema tipado + executemany por lotes) o 'pandas' (to_sql)
+MODO_SQLITE = "bulk"
+
+# Esquema en SQLite: 'plano' (tabla airbnb_limpio con la sábana) o 'estrella' (dim_listing,
+# fact_calendar_day, fact_reviews_month con índices y la vista airbnb_limpio que reconstruye la sábana)
+ESQUEMA_SQLITE = "plano"
+
+# Exportación Excel: motor (xlsxwriter/openpyxl) y procesos que escriben partes en paralelo
+EXCEL_MOTOR = "xlsxwriter"
+EXCEL_WORKERS = os.cpu_count() or 1
+
+# Limpieza de texto largo (comments, description, neighborhood_overview) en procesos
+TEXT_WORKERS = os.cpu_count() or 1
+
+# Vocabulario completo de amenities (tabla larga listing_amenities en SQLite, además de las dummies curadas)
+AMENITIES_COMPLETAS = False
+TABLA_AMENITIES = "listing_amenities"
+
+# Perfilado por etapas (solo con --perfil): reporte JSON/CSV en <salida>/perfil
+PERFIL_SUBDIR = "perfil"
+
+# Calendar denso listing × día (calendario_denso.py), memory-mapped en <salida>/calendario_denso
+CALENDARIO_DENSO = False
+CALENDARIO_DENSO_SUBDIR = "calendario_denso"
+
+# Cubos de agregados (cubos.py): tablas cubo_* en SQLite y Parquet por mes en <salida>/cubos
+CUBOS = False
+CUBOS_SUBDIR = "cubos"
+
+# Reviews resumidas en Mongo por (listing_id, año, mes) en lugar de extraer la colección completa
+# (Extraction.review_month_summary); la sábana no usa el texto de las reviews
+RESUMEN_REVIEWS = False
+
+# Checkpoints por etapa de la transformación (Parquet + manifest) en <salida>/checkpoints: con --reanudar
+# una corrida que falló en una etapa tardía o en la carga sigue desde el último checkpoint vigente
+CHECKPOINT_SUBDIR = "checkpoints"
+
+# Muestra determinista para desarrollo/CI (--muestra): fracción de listings elegida por hash de id
+# (Extraction.sample_listing_ids) y filtrada con $in en las tres colecciones por la clave del listing;
+# la salida (SQLite, Excel, checkpoints, perfil) va a <salida>/muestra y los snapshots a su propio directorio
+MUESTRA = None
+SEMILLA_MUESTRA = 0
+MUESTRA_SUBDIR = "muestra"
+CLAVES_MUESTRA = {"listings": "id", "calendar": "listing_id", "reviews": "listing_id"}
+
+def contar_mongo(ex, db, coleccion: str, exacto: bool = CONTEO_EXACTO, query=None) -> int:
+    return ex.count_mongodb_documents(db, coleccion, exact=exacto, query=query)
+
+def cargar_coleccion(ex, db, base: str, sufijo: str = SUFIJO, snapshot: bool = USAR_SNAPSHOT,
+                     refrescar: bool = False, snapshot_dir: str = SNAPSHOT_DIR, query=None):
+    coleccion = f"{base}_{sufijo}"
+    n = PARTICIONES.get(base, 1)
+    dtypes = plan_tipos.PLAN_TIPOS.get(base) if USAR_PLAN_TIPOS else None
+    if snapshot:
+        return ex.load_mongodb_snapshot(db, coleccion, snapshot_dir, refresh=refrescar,
+                                        fingerprint_field=CAMPOS_HUELLA.get(base),
+                                        projection=PROYECCIONES.get(base), batch_size=BATCH_SIZE,
+                                        n_partitions=n, query=query, dtypes=dtypes,
+                                        content_fields=CAMPOS_CONTENIDO.get(base))
+    if n > 1:
+        return ex.load_mongodb_parallel(db, coleccion, n_partitions=n,
+                                        projection=PROYECCIONES.get(base), batch_size=BATCH_SIZE,
+                                        query=query, dtypes=dtypes)
+    return ex.load_mongodb_datasets(db, coleccion, PROYECCIONES.get(base), BATCH_SIZE, query, dtypes)
+
+def fraccion_muestra(valor: str) -> float:
+    # Tipo de --muestra: fracción en (0, 1]
+    f = float(valor)
+    if not 0 < f <= 1:
+        raise argparse.ArgumentTypeError(f"la fracción debe estar en (0, 1]: {valor}")
+    return f
+
+def filtros_muestra(ids) -> dict:
+    # Filtro por colección para los listings de la muestra (id en listings, listing_id en calendar y reviews)
+    return {c: {clave: {"$in": list(ids)}} for c, clave in CLAVES_MUESTRA.items()}
+
+def construir_parser():
+    parser = argparse.ArgumentParser(description="ETL Airbnb: MongoDB → Transformación → SQLite/Excel")
+    parser.add_argument("--mongo-uri", default=MONGO_URI,
+                        help="URI de MongoDB (por defecto: %(default)s).")
+    parser.add_argument("--conteo-exacto", action="store_true",
+                        help="Usar count_documents (recorre la colección) en lugar del conteo estimado.")
+    snapshots = parser.add_mutually_exclusive_group()
+    snapshots.add_argument("--snapshot", action="store_true", default=USAR_SNAPSHOT,
+                           help="Reutilizar snapshots Parquet de las colecciones mientras la huella en MongoDB no cambie.")
+    snapshots.add_argument("--sin-snapshot", action="store_true",
+                           help="Leer siempre de MongoDB sin usar ni escribir snapshots Parquet (por defecto).")
+    parser.add_argument("--refrescar-snapshot", action="store_true",
+                        help="Ignorar los snapshots vigentes, volver a extraer de MongoDB y reescribirlos; implica --snapshot.")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR,
+                        help="Directorio de snapshots Parquet (por defecto: %(default)s).")
+    parser.add_argument("--sqlite-modo", choices=["bulk", "pandas"], default=MODO_SQLITE,
+                        help="Carga a SQLite: 'bulk' (executemany por lotes) o 'pandas' (to_sql) (por defecto: %(default)s).")
+    parser.add_argument("--esquema", choices=["plano", "estrella"], default=ESQUEMA_SQLITE,
+                        help="Esquema en SQLite: 'plano' (tabla con la sábana) o 'estrella' (dimensión + hechos "
+                             "con índices y la vista airbnb_limpio); no aplica con --incremental (por defecto: %(default)s).")
+    parser.add_argument("--excel-motor", choices=["xlsxwriter", "openpyxl"], default=EXCEL_MOTOR,
+                        help="Motor de escritura de los .xlsx (por defecto: %(default)s).")
+    parser.add_argument("--excel-workers", type=int, default=EXCEL_WORKERS,
+                        help="Procesos que escriben partes Excel en paralelo (por defecto: %(default)s).")
+    parser.add_argument("--text-workers", type=int, default=TEXT_WORKERS,
+                        help="Procesos para limpiar texto largo en la transformación (por defecto: %(default)s).")
+    parser.add_argument("--chunk-listings", type=int, default=None,
+                        help="Construir y cargar la sábana por bloques de N listings (memoria acotada).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Procesar solo listings nuevos o cambiados y días nuevos de calendar (upsert en SQLite).")
+    parser.add_argument("--amenities-completas", action="store_true", default=AMENITIES_COMPLETAS,
+                        help="Guardar todas las amenities por listing en la tabla SQLite listing_amenities.")
+    parser.add_argument("--calendario-denso", action="store_true", default=CALENDARIO_DENSO,
+                        help="Guardar el calendar como matriz listing × día (bitmaps y matrices .npy memory-mapped) "
+                             "en <salida>/calendario_denso; no aplica con --incremental.")
+    parser.add_argument("--cubos", action="store_true", default=CUBOS,
+                        help="Materializar cubos de agregados (tablas cubo_* en SQLite y Parquet por mes en <salida>/cubos); "
+                             "solo se reemplazan los meses que trae la corrida.")
+    parser.add_argument("--resumen-reviews", action="store_true", default=RESUMEN_REVIEWS,
+                        help="Calcular en MongoDB ($group/$dateToParts) el conteo y las fechas de reviews por listing y mes "
+                             "en lugar de extraer la colección reviews completa.")
+    parser.add_argument("--checkpoints", action="store_true",
+                        help="Guardar la salida de cada etapa de la transformación en <salida>/checkpoints (Parquet + manifest).")
+    parser.add_argument("--reanudar", action="store_true",
+                        help="Continuar desde el último checkpoint vigente (misma huella en Mongo y mismos parámetros) "
+                             "sin volver a extraer; implica --checkpoints. No aplica con --incremental.")
+    parser.add_argument("--desde", choices=Transformation.ETAPAS, default=None,
+                        help="Ejecutar desde esta etapa partiendo del checkpoint de la anterior; implica --checkpoints.")
+    parser.add_argument("--hasta", choices=Transformation.ETAPAS, default=None,
+                        help="Detenerse tras esta etapa (sin carga si no es la última); implica --checkpoints.")
+    parser.add_argument("--muestra", type=fraccion_muestra, default=MUESTRA, metavar="FRACCION",
+                        help="Procesar solo una fracción determinista de listings (hash de id) con todo su calendar y "
+                             "sus reviews; la salida va a <salida>/muestra. No aplica con --incremental.")
+    parser.add_argument("--semilla-muestra", type=int, default=SEMILLA_MUESTRA,
+                        help="Semilla del hash de --muestra: otra semilla elige otros listings (por defecto: %(default)s).")
+    parser.add_argument("--perfil", action="store_true",
+                        help="Medir cada etapa (tiempo, CPU, RSS, filas) y escribir un reporte JSON/CSV en <salida>/perfil.")
+    parser.add_argument("--perfil-tracemalloc", action="store_true",
+                        help="Con --perfil: medir también asignaciones de Python con tracemalloc (más lento).")
+    parser.add_argument("--perfil-cprofile", action="store_true",
+                        help="Con --perfil: guardar un volcado cProfile (.prof) por etapa.")
+    return parser
+
+def parse_args(argv=None):
+    return construir_parser().parse_args(argv)
+
+def directorio_checkpoints(args, salida_dir: str):
+    # Checkpoints activos con cualquiera de las opciones que los usan; None si no se pidieron
+    if any(getattr(args, a, None) for a in ("checkpoints", "reanudar", "desde", "hasta")):
+        return os.path.join(salida_dir, CHECKPOINT_SUBDIR)
+    return None
+
+def opciones_run(args):
+    # Argumentos de Transformation.run que dependen de la línea de comandos (rango de etapas y reanudación)
+    return {"text_workers": getattr(args, "text_workers", TEXT_WORKERS),
+            "reanudar": getattr(args, "reanudar", False),
+            "desde": getattr(args, "desde", None),
+            "hasta": getattr(args, "hasta", None)}
+
+def exigir_extraccion(**dfs):
+    # Extraction registra el error y devuelve None si falla la lectura de una colección: se corta la corrida
+    # antes de transformar y reemplazar las tablas de salida con datos incompletos
+    faltan = [nombre for nombre, df in dfs.items() if df is None]
+    if faltan:
+        Logs().log(f"[Extracción] Falló la lectura de {faltan}; no se transforma ni se carga.", "error")
+        raise RuntimeError(f"No se pudieron extraer las colecciones {faltan} de MongoDB.")
+
+def crear_transformacion(args, salida_dir: str, df_listings=None, df_calendar=None, df_reviews=None,
+                         resumen_reviews: bool = False, checkpoint_dir: str = None, huella=None):
+    # Transformation con las opciones de la corrida; sin DataFrames (solo con checkpoint_dir) sirve para
+    # reanudar desde checkpoints. Fuera de ese caso un DataFrame None es una extracción fallida.
+    if checkpoint_dir and df_listings is None and df_calendar is None and df_reviews is None:
+        df_listings, df_calendar = pd.DataFrame(), pd.DataFrame()
+    else:
+        exigir_extraccion(listings=df_listings, calendar=df_calendar, reviews=df_reviews)
+    if resumen_reviews:
+        tf = Transformation(df_listings, df_calendar, review_summary=df_reviews)
+    else:
+        tf = Transformation(df_listings, df_calendar, df_reviews)
+    tf.plan_tipos = USAR_PLAN_TIPOS
+    tf.amenities_completas = getattr(args, "amenities_completas", AMENITIES_COMPLETAS)
+    tf.calendario_denso = getattr(args, "calendario_denso", CALENDARIO_DENSO)
+    tf.calendario_denso_dir = os.path.join(salida_dir, CALENDARIO_DENSO_SUBDIR)
+    tf.checkpoint_dir = checkpoint_dir
+    tf.huella_entrada = huella
+    return tf
+
+def fin_parcial(db_name: str, hasta: str):
+    # Corrida detenida con --hasta antes de la sábana: no hay nada que cargar
     logs = Logs()
-    logs.log("=== INICIO ETL (main_etl.py) ===", "info")
+    logs.log(f"[Checkpoints] Detenido tras {hasta}; sin carga (continúa con --reanudar)", "info")
+    logs.log(f"=== FIN ETL (main_etl.py) | {db_name} ===", "info")
+    return {"ciudad": db_name, "filas": 0, "columnas": 0, "hasta": hasta}
+
+def cargar_amenities(tf, cg):
+    # Forma larga (listing_id, amenity) del vocabulario completo: la versión dispersa para SQL
+    if tf.amenities_long is not None:
+        cg.insertar_en_sqlite_bulk(TABLA_AMENITIES, if_exists="replace", df=tf.amenities_long)
+
+def cargar_cubos(base, cg, salida_dir: str):
+    # Cubos derivados del cubo base: cada uno reemplaza en SQLite (y en Parquet, si hay pyarrow) solo sus meses
+    logs = Logs()
+    with perfilado.etapa("cubos.derivar", len(base)):
+        tablas = cubos.derivar(base)
+    parquet = arrow_disponible()
+    if not parquet:
+        logs.log("[Cubos] pyarrow no disponible; los cubos solo se guardan en SQLite.", "warning")
+    for nombre, cubo in tablas.items():
+        cg.reemplazar_meses_sqlite(cubo, nombre)
+        if parquet:
+            reemplazar_meses_parquet(cubo, os.path.join(salida_dir, CUBOS_SUBDIR, nombre))
+    logs.log(f"[Cubos] {len(tablas)} cubos | meses={len(cubos.meses(base))} | filas={ {n: len(c) for n, c in tablas.items()} }", "info")
+
+def sesion_perfil(args, salida_dir: str, nombre: str):
+    # Perfilado de la corrida completa si se pidió --perfil (no hace nada en caso contrario)
+    return perfilado.sesion(
+        activo=getattr(args, "perfil", False),
+        salida_dir=os.path.join(salida_dir, PERFIL_SUBDIR),
+        usar_tracemalloc=getattr(args, "perfil_tracemalloc", False),
+        usar_cprofile=getattr(args, "perfil_cprofile", False),
+        nombre=nombre,
+        parametros={k: v for k, v in vars(args).items() if k != "mongo_uri"},
+        logs=Logs(),
+    )
+
+def ejecutar_etl(args, db_name: str = DB_NAME, sufijo: str = SUFIJO, salida_dir: str = SALIDA_DIR):
+    """
+    Extracción → Transformación → Carga para una ciudad (base db_name, colecciones *_<sufijo>).
+    Escribe <salida_dir>/airbnb.db y <salida_dir>/airbnb_limpio_part_N.xlsx.
+    Con --perfil escribe además el reporte por etapas en <salida_dir>/perfil.
+    Con --muestra todo lo anterior se escribe en <salida_dir>/muestra.
+    Retorna un resumen {ciudad, filas, columnas}.
+    """
+    if getattr(args, "muestra", None):
+        salida_dir = os.path.join(salida_dir, MUESTRA_SUBDIR)
+    with sesion_perfil(args, salida_dir, f"etl_{db_name}"):
+        return _ejecutar_etl(args, db_name, sufijo, salida_dir)
+
+def _ejecutar_etl(args, db_name: str, sufijo: str, salida_dir: str):
+    logs = Logs()
+    logs.log(f"=== INICIO ETL (main_etl.py) | {db_name} ===", "info")
 
     # --------- 1) EXTRACCIÓN ---------
+    # Un solo MongoClient para conteos y cargas; se cierra aunque falle la extracción
     ex = Extraction()
-    db = ex.mongodb_connection(MONGO_URI, DB_NAME)
+    db = ex.mongodb_connection(args.mongo_uri, db_name)
+    try:
+        colecciones = ["listings", "calendar", "reviews"]
+        snapshot = (getattr(args, "snapshot", USAR_SNAPSHOT) or args.refrescar_snapshot) and not args.sin_snapshot
+        snapshot_dir = os.path.join(args.snapshot_dir, db_name)
+
+        # Muestra: ids elegidos por hash en listings y el mismo filtro en las tres colecciones
+        muestra = getattr(args, "muestra", None)
+        filtros = {}
+        if muestra:
+            semilla = getattr(args, "semilla_muestra", SEMILLA_MUESTRA)
+            ids = ex.sample_listing_ids(db, f"listings_{sufijo}", muestra, semilla)
+            if not ids:
+                logs.log(f"[Muestra] Ningún listing quedó en la muestra (fracción={muestra}, semilla={semilla})", "error")
+                raise RuntimeError("La muestra no tiene listings; usa una fracción mayor u otra semilla.")
+            filtros = filtros_muestra(ids)
+            snapshot_dir = os.path.join(snapshot_dir, f"{MUESTRA_SUBDIR}_{muestra:g}_{semilla}")
+
+        # Conteos esperados en origen (para verificación); con muestra, exactos sobre el filtro
+        expected = {c: contar_mongo(ex, db, f"{c}_{sufijo}", args.conteo_exacto, filtros.get(c)) for c in colecciones}
+        logs.log(f"[Origen Mongo] Esperados ({'exacto' if args.conteo_exacto or filtros else 'estimado'}) -> {expected}", "info")
+
+        resumen_reviews = getattr(args, "resumen_reviews", RESUMEN_REVIEWS)
+        esquema_estrella = getattr(args, "esquema", ESQUEMA_SQLITE) == "estrella"
+        chunk_listings = None if esquema_estrella else getattr(args, "chunk_listings", None)
 
-    # Conteos esperados en origen (para verificación)
-    expected = {
-        "listings": contar_mongo("listings_mx"),
-        "calendar": contar_mongo("calendar_mx"),
-        "reviews":  contar_mongo("reviews_mx")
-    }
-    logs.log(f"[Origen Mongo] Esperados -> {expected}", "info")
+        # Checkpoints: la huella de las colecciones en origen (sin extraerlas) los valida; si hay uno
+        # vigente desde el que reanudar, la extracción se omite
+        tf, huella = None, None
+        checkpoint_dir = directorio_checkpoints(args, salida_dir)
+        if checkpoint_dir:
+            huella = {"base": db_name, "resumen_reviews": resumen_reviews,
+                      **{c: ex.collection_fingerprint(db, f"{c}_{sufijo}", CAMPOS_HUELLA.get(c), PROYECCIONES.get(c),
+                                                      filtros.get(c), CAMPOS_CONTENIDO.get(c))["hash"] for c in colecciones}}
+            if getattr(args, "reanudar", False) or getattr(args, "desde", None):
+                tf = crear_transformacion(args, salida_dir, checkpoint_dir=checkpoint_dir, huella=huella)
+                previa = tf.ultimo_checkpoint(chunk_listings=chunk_listings, star_schema=esquema_estrella,
+                                              desde=getattr(args, "desde", None), hasta=getattr(args, "hasta", None))
+                if previa is None:
+                    tf = None
+                else:
+                    logs.log(f"[Checkpoints] Se reanuda tras {previa}: no se extrae de Mongo", "info")
 
-    df_listings = ex.load_mongodb_datasets(db, "listings_mx")
-    df_calendar = ex.load_mongodb_datasets(db, "calendar_mx")
-    df_reviews  = ex.load_mongodb_datasets(db, "reviews_mx")
-    ex.close_mongodb_connection(MONGO_URI)
+        def cargar(c):
+            if c == "reviews" and resumen_reviews:
+                return ex.review_month_summary(db, f"{c}_{sufijo}", query=filtros.get(c))
+            return cargar_coleccion(ex, db, c, sufijo, snapshot, args.refrescar_snapshot, snapshot_dir, filtros.get(c))
+
+        if tf is None:
+            if CARGA_CONCURRENTE:
+                with ThreadPoolExecutor(max_workers=len(colecciones)) as pool:
+                    df_listings, df_calendar, df_reviews = pool.map(cargar, colecciones)
+            else:
+                df_listings, df_calendar, df_reviews = (cargar(c) for c in colecciones)
+    finally:
+        ex.close_mongodb_connection()
 
     # --------- 2) TRANSFORMACIÓN ---------
-    tf = Transformation(df_listings,df_calendar,df_reviews)
+    if tf is None:
+        tf = crear_transformacion(args, salida_dir, df_listings, df_calendar, df_reviews,
+                                  resumen_reviews, checkpoint_dir, huella)
+
+    # Esquema estrella: dimensión y hechos en lugar de la sábana; la sábana queda como vista en SQLite
+    if esquema_estrella:
+        if getattr(args, "chunk_listings", None):
+            logs.log("[Carga] --chunk-listings no aplica al esquema estrella (la sábana no se materializa).", "warning")
+        tablas = tf.run(star_schema=True, **opciones_run(args))
+        if tablas is tf:
+            return fin_parcial(db_name, args.hasta)
+        cg = Carga(None, sqlite_path=os.path.join(salida_dir, "airbnb.db"))
+        resumen = cg.ejecutar_carga_estrella(
+            tablas,
+            tf.star_columns,
+            vista="airbnb_limpio",
+            excel_path=os.path.join(salida_dir, "airbnb_limpio.xlsx"),
+            excel_motor=getattr(args, "excel_motor", EXCEL_MOTOR),
+            excel_workers=getattr(args, "excel_workers", EXCEL_WORKERS),
+        )
+        cargar_amenities(tf, cg)
+        if getattr(args, "cubos", CUBOS):
+            with perfilado.etapa("cubos.agregar", len(tablas["fact_calendar_day"])):
+                base = cubos.agregar(cubos.sabana_desde_estrella(tablas))
+            cargar_cubos(base, cg, salida_dir)
+        logs.log(f"=== FIN ETL (main_etl.py) | {db_name} ===", "info")
+        return {"ciudad": db_name, "filas": resumen["filas"], "columnas": resumen["columnas"]}
+
+    # Modo por bloques: la sábana nunca se materializa completa; cada bloque se carga y se libera
+    if chunk_listings:
+        chunks = tf.run(chunk_listings=chunk_listings, **opciones_run(args))
+        if chunks is tf:
+            return fin_parcial(db_name, args.hasta)
+        partes_cubo = []
+        if getattr(args, "cubos", CUBOS):
+            # Cada bloque trae todas las filas de sus listings: se agrega al pasar y se combinan al final
+            chunks = cubos.acumular(chunks, partes_cubo)
+        cg = Carga(None, sqlite_path=os.path.join(salida_dir, "airbnb.db"))
+        resumen = cg.ejecutar_carga_por_chunks(
+            chunks,
+            table_name="airbnb_limpio",
+            excel_path=os.path.join(salida_dir, "airbnb_limpio.xlsx"),
+            modo_sqlite=getattr(args, "sqlite_modo", MODO_SQLITE),
+            excel_motor=getattr(args, "excel_motor", EXCEL_MOTOR),
+            excel_workers=getattr(args, "excel_workers", EXCEL_WORKERS),
+        )
+        cargar_amenities(tf, cg)
+        if getattr(args, "cubos", CUBOS):
+            cargar_cubos(cubos.combinar(partes_cubo), cg, salida_dir)
+        logs.log(f"=== FIN ETL (main_etl.py) | {db_name} ===", "info")
+        return {"ciudad": db_name, "filas": resumen["filas"], "columnas": resumen["columnas"]}
 
     # pipeline típico (ajusta al nombre real de tus métodos)
-    tf.run()
+    if tf.run(**opciones_run(args)) is tf:
+        return fin_parcial(db_name, args.hasta)
 
     # DataFrame final para carga (ajusta al nombre que tu clase expone)
     # Ej: tf.flat_sheet o tf.listings_clean; usa el que defina tu clase como “listo para carga”
@@ -53,14 +409,166 @@ def main():
     logs.log(f"[Transformacion] DF final con {len(df_final)} filas y {len(df_final.columns)} columnas.", "info")
 
     # --------- 3) CARGA ---------
-    cg = Carga(df_final)
+    cg = Carga(df_final, sqlite_path=os.path.join(salida_dir, "airbnb.db"))
     # a) Carga completa con SQLite + Excel siempre; SQL Server solo si pasas parámetros
     cg.ejecutar_carga_completa(
         table_name="airbnb_limpio",
-        excel_path="data/airbnb_limpio.xlsx",
+        excel_path=os.path.join(salida_dir, "airbnb_limpio.xlsx"),
+        modo_sqlite=getattr(args, "sqlite_modo", MODO_SQLITE),
+        excel_motor=getattr(args, "excel_motor", EXCEL_MOTOR),
+        excel_workers=getattr(args, "excel_workers", EXCEL_WORKERS),
+    )
+    cargar_amenities(tf, cg)
+    if getattr(args, "cubos", CUBOS):
+        with perfilado.etapa("cubos.agregar", len(df_final)):
+            base = cubos.agregar(df_final)
+        cargar_cubos(base, cg, salida_dir)
+
+    logs.log(f"=== FIN ETL (main_etl.py) | {db_name} ===", "info")
+    return {"ciudad": db_name, "filas": len(df_final), "columnas": len(df_final.columns)}
+
+def ejecutar_etl_incremental(args, db_name: str = DB_NAME, sufijo: str = SUFIJO, salida_dir: str = SALIDA_DIR):
+    """
+    ETL incremental para una ciudad (ver incremental.py). Con el estado guardado en airbnb.db solo se
+    extraen y transforman los listings nuevos o cambiados (con todo su calendar y sus reviews) y los días
+    de calendar posteriores al último procesado del resto; la sábana resultante se carga con upsert
+    sobre (listing_id, date). La primera corrida (sin estado) procesa todo. El Excel no se regenera.
+    Los días nuevos de un listing sin cambio toman sus fechas de review y conteos por mes del resumen de
+    reviews en Mongo y el rango de su calendar completo, así sus atributos coinciden con los de las filas
+    ya cargadas (y con una corrida completa). Lo que depende de otros listings (medianas de imputación, cuantiles de price_bucket y
+    daily_price_bucket) no se recalcula en las filas ya cargadas; una corrida completa lo vuelve a alinear.
+    Retorna un resumen {ciudad, filas, columnas, nuevos, cambiados, sin_cambio, eliminados}.
+    """
+    with sesion_perfil(args, salida_dir, f"etl_incremental_{db_name}"):
+        return _ejecutar_etl_incremental(args, db_name, sufijo, salida_dir)
+
+def _ejecutar_etl_incremental(args, db_name: str, sufijo: str, salida_dir: str):
+    logs = Logs()
+    logs.log(f"=== INICIO ETL incremental (main_etl.py) | {db_name} ===", "info")
+    if directorio_checkpoints(args, salida_dir):
+        logs.log("[Checkpoints] --checkpoints/--reanudar/--desde/--hasta no aplican con --incremental.", "warning")
+    if getattr(args, "muestra", None):
+        logs.log("[Muestra] --muestra no aplica con --incremental; se procesa la colección completa.", "warning")
+    cg = Carga(None, sqlite_path=os.path.join(salida_dir, "airbnb.db"))
+    estado = cg.leer_tabla_sqlite(incremental.TABLA_ESTADO)
+
+    # --------- 1) DETECCIÓN DE CAMBIOS Y EXTRACCIÓN ---------
+    ex = Extraction()
+    db = ex.mongodb_connection(args.mongo_uri, db_name)
+    try:
+        # Listings completos (son pocos): la huella por documento decide qué se reprocesa
+        df_listings = cargar_coleccion(ex, db, "listings", sufijo, snapshot=False)
+        exigir_extraccion(listings=df_listings)
+        huellas = incremental.huellas_listings(df_listings)
+        huellas_cont = incremental.huellas_contadores(df_listings)
+        # Firma de contenido del calendar (sumas de precio/disponibilidad/noches) sobre los días ya
+        # procesados, para detectar días cargados que cambiaron en origen
+        campos_cal = CAMPOS_CONTENIDO["calendar"]
+        ejemplo = ex.sample_value(db, f"calendar_{sufijo}", "date")
+        corte = incremental.corte_calendar(estado)
+        firmas_cal = incremental.normalizar_firmas(ex.group_signatures(
+            db, f"calendar_{sufijo}", content_fields=campos_cal,
+            content_before=incremental.fecha_mongo(corte, ejemplo) if corte else None))
+        firmas_rev = incremental.normalizar_firmas(ex.group_signatures(db, f"reviews_{sufijo}"))
+        huellas = incremental.huellas_con_calendar(huellas, firmas_cal)
+        limite = incremental.limite_inicio(firmas_cal)
+        valores_inicio = (ex.content_values(db, f"calendar_{sufijo}", campos_cal,
+                                            before=incremental.fecha_mongo(limite, ejemplo)) if limite else None)
+
+        cambios = incremental.detectar_cambios(huellas, firmas_rev, estado, firmas_cal, campos_cal, huellas_cont)
+        reprocesar = cambios["nuevos"] + cambios["cambiados"]
+        logs.log(f"[Incremental] nuevos={len(cambios['nuevos'])} | cambiados={len(cambios['cambiados'])} "
+                 f"(calendar editado={len(cambios['calendar_editado'])}) | sin_cambio={len(cambios['sin_cambio'])} "
+                 f"(contadores={len(cambios['contadores'])}) | eliminados={len(cambios['eliminados'])}", "info")
+
+        # Listings sin cambio que suman días de calendar: sus reviews no se re-extraen, pero las filas
+        # nuevas necesitan sus fechas de review y conteos por mes como las ya cargadas
+        continuan = incremental.con_dias_nuevos(cambios["cortes"], firmas_cal)
+        resumen_reviews = getattr(args, "resumen_reviews", RESUMEN_REVIEWS)
+        if len(estado) == 0:
+            filtro_cal, filtro_rev = {}, {}
+        else:
+            filtro_cal = incremental.filtro_calendar(reprocesar, cambios["cortes"], ejemplo)
+            ids_rev = reprocesar + continuan if resumen_reviews else reprocesar
+            filtro_rev = {"listing_id": {"$in": ids_rev}} if ids_rev else None
+
+        def cargar(base, filtro):
+            if filtro is None:
+                return pd.DataFrame()
+            if base == "reviews" and resumen_reviews:
+                return ex.review_month_summary(db, f"{base}_{sufijo}", query=filtro or None)
+            dtypes = plan_tipos.PLAN_TIPOS.get(base) if USAR_PLAN_TIPOS else None
+            return ex.load_mongodb_datasets(db, f"{base}_{sufijo}", PROYECCIONES.get(base), BATCH_SIZE,
+                                            filtro or None, dtypes)
+
+        df_calendar = cargar("calendar", filtro_cal)
+        df_reviews = cargar("reviews", filtro_rev)
+        exigir_extraccion(calendar=df_calendar, reviews=df_reviews)
+        resumen_continuan = None
+        if continuan and not resumen_reviews:
+            resumen_continuan = ex.review_month_summary(db, f"reviews_{sufijo}",
+                                                        query={"listing_id": {"$in": continuan}})
+    finally:
+        ex.close_mongodb_connection()
+
+    if len(estado):
+        # El filtro en Mongo usa el corte mínimo; aquí se aplica el corte exacto de cada listing
+        df_calendar = incremental.filtrar_dias_nuevos(df_calendar, reprocesar, cambios["cortes"])
+    logs.log(f"[Incremental] Re-extraído: calendar={len(df_calendar)} | reviews={len(df_reviews)}", "info")
+
+    # --------- 2) TRANSFORMACIÓN ---------
+    df_final = None
+    if len(df_calendar):
+        if resumen_reviews:
+            tf = Transformation(df_listings, df_calendar, review_summary=df_reviews)
+        else:
+            if not len(df_reviews.columns):
+                df_reviews = pd.DataFrame(columns=["listing_id", "date"])
+            tf = Transformation(df_listings, df_calendar, df_reviews, review_summary=resumen_continuan)
+        tf.plan_tipos = USAR_PLAN_TIPOS
+        tf.rango_calendar = firmas_cal.reindex(continuan)[["min_fecha", "max_fecha"]].rename_axis("listing_id").reset_index()
+        tf.run(text_workers=getattr(args, "text_workers", TEXT_WORKERS))
+        df_final = tf.flat_sheet
+
+    # --------- 3) CARGA (upsert) Y ESTADO ---------
+    resumen = cg.upsert_en_sqlite(
+        df_final,
+        table_name="airbnb_limpio",
+        reemplazar_listings=reprocesar,
+        inicio_calendar=firmas_cal.rename_axis("listing_id").reset_index()[["listing_id", "min_fecha"]],
+        eliminar_listings=cambios["eliminados"],
     )
+    # Contadores de ventana móvil de los listings sin cambio y fechas de review tomadas del rango del calendar:
+    # se actualizan en las filas ya cargadas
+    if cambios["contadores"]:
+        cg.actualizar_columnas_sqlite(incremental.contadores_sabana(df_listings, cambios["contadores"]), "airbnb_limpio")
+    cg.actualizar_columnas_sqlite(incremental.rango_calendar_sabana(df_final, continuan, firmas_rev), "airbnb_limpio")
+    firmas_contenido = incremental.firmas_calendar_estado(firmas_cal, valores_inicio, campos_cal, limite)
+    cg.insertar_en_sqlite_bulk(incremental.TABLA_ESTADO, if_exists="replace",
+                               df=incremental.estado_nuevo(huellas, firmas_rev, firmas_cal, huellas_cont, firmas_contenido))
+
+    # Cubos: los meses que tocó la corrida (todos si se eliminaron listings) se recalculan desde airbnb_limpio
+    if getattr(args, "cubos", CUBOS):
+        meses = cubos.meses(df_final) if df_final is not None else []
+        if cambios["eliminados"]:
+            meses = cubos.meses(cg.leer_tabla_sqlite("airbnb_limpio", columnas=["year", "month"]))
+        if meses:
+            with perfilado.etapa("cubos.agregar"):
+                base = cubos.agregar(cg.leer_tabla_sqlite("airbnb_limpio", columnas=cubos.COLUMNAS_SABANA, meses=meses))
+            cargar_cubos(base, cg, salida_dir)
+
+    logs.log(f"=== FIN ETL incremental (main_etl.py) | {db_name} | {resumen} ===", "info")
+    return {"ciudad": db_name,
+            "filas": 0 if df_final is None else len(df_final),
+            "columnas": 0 if df_final is None else len(df_final.columns),
+            **{k: len(cambios[k]) for k in ("nuevos", "cambiados", "sin_cambio", "eliminados")}}
 
-    logs.log("=== FIN ETL (main_etl.py) ===", "info")
+def main(argv=None):
+    args = parse_args(argv)
+    if args.incremental:
+        ejecutar_etl_incremental(args)
+    else:
+        ejecutar_etl(args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,65 @@
+# multi_ciudad.py
+# Ejecuta el ETL (extracción → Transformation.run → Carga) para varias ciudades de Inside Airbnb
+# en un pool de procesos. Cada ciudad es una base de MongoDB con colecciones *_<sufijo> y escribe
+# su propia partición de salida: <salida>/<base>/airbnb.db y <salida>/<base>/airbnb_limpio_part_N.xlsx
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from logs import Logs
+import main_etl
+
+SALIDA_CIUDADES = "data/ciudades"
+WORKERS = 2
+
+# "bi_mx:mx" → ("bi_mx", "mx"); sin ':' el sufijo es lo que sigue al último '_' ("bi_co" → "co")
+def parse_ciudad(spec: str):
+    if ":" in spec:
+        db_name, sufijo = spec.split(":", 1)
+    else:
+        db_name, sufijo = spec, spec.rsplit("_", 1)[-1]
+    return db_name, sufijo
+
+# Trabajo de un proceso: una ciudad completa. Los errores se devuelven en el resumen
+# para que una ciudad fallida no detenga al resto del lote.
+def procesar_ciudad(args, db_name: str, sufijo: str, salida: str):
+    inicio = time.time()
+    try:
+        etl = main_etl.ejecutar_etl_incremental if getattr(args, "incremental", False) else main_etl.ejecutar_etl
+        resumen = etl(args, db_name, sufijo, os.path.join(salida, db_name))
+        resumen["ok"] = True
+    except Exception as e:
+        resumen = {"ciudad": db_name, "ok": False, "error": str(e)}
+    resumen["segundos"] = round(time.time() - inicio, 1)
+    return resumen
+
+def ejecutar_ciudades(args, ciudades, workers: int = WORKERS, salida: str = SALIDA_CIUDADES):
+    logs = Logs()
+    logs.log(f"=== INICIO ETL multi-ciudad | ciudades={len(ciudades)} | workers={workers} ===", "info")
+    resumenes = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = [pool.submit(procesar_ciudad, args, db_name, sufijo, salida) for db_name, sufijo in ciudades]
+        for f in as_completed(futuros):
+            r = f.result()
+            resumenes.append(r)
+            nivel = "info" if r["ok"] else "error"
+            logs.log(f"[multi_ciudad] {r}", nivel)
+    fallidas = [r["ciudad"] for r in resumenes if not r["ok"]]
+    logs.log(f"=== FIN ETL multi-ciudad | ok={len(resumenes) - len(fallidas)} | fallidas={fallidas} ===", "info")
+    return resumenes
+
+def main(argv=None):
+    parser = main_etl.construir_parser()
+    parser.description = "ETL Airbnb para varias ciudades en paralelo (una base MongoDB por ciudad)."
+    parser.add_argument("--ciudades", nargs="+", required=True,
+                        help="Bases de MongoDB por ciudad: 'bi_mx' o 'base:sufijo' (p. ej. bi_mx:mx bi_co:co).")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="Procesos en paralelo (por defecto: %(default)s).")
+    parser.add_argument("--salida", default=SALIDA_CIUDADES,
+                        help="Directorio raíz de salida por ciudad (por defecto: %(default)s).")
+    args = parser.parse_args(argv)
+    resumenes = ejecutar_ciudades(args, [parse_ciudad(c) for c in args.ciudades], args.workers, args.salida)
+    for r in sorted(resumenes, key=lambda r: r["ciudad"]):
+        print(r)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#Perfilado por etapas del ETL: tiempo de pared, CPU, memoria (RSS y tracemalloc), filas de entrada/salida
+#y filas por segundo. Las etapas se marcan con `with perfilado.etapa(...)` o con el decorador `medir`;
+#sin un Perfilador activo no hacen nada, así que extracción, transformación y carga no cambian.
+#Las métricas de proceso (CPU, RSS, tracemalloc) se solapan cuando dos etapas corren a la vez en hilos,
+#y no incluyen a los procesos hijos (text_workers, excel_workers).
+import contextlib
+import cProfile
+import csv
+import functools
+import inspect
+import json
+import os
+import platform
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource  # Unix
+except ImportError:
+    resource = None
+
+try:
+    import psutil  # opcional (RSS en Windows)
+except ImportError:
+    psutil = None
+
+#Perfilador activo del proceso (None = perfilado apagado)
+_activo = None
+
+COLUMNAS_REPORTE = [
+    "etapa", "nivel", "hilo", "inicio", "pared_s", "cpu_s",
+    "rss_inicio_mb", "rss_fin_mb", "rss_pico_mb", "rss_pico_delta_mb",
+    "tracemalloc_delta_mb", "tracemalloc_pico_mb",
+    "filas_entrada", "filas_salida", "filas_por_s", "error",
+]
+
+
+#RSS actual del proceso en MB (psutil, /proc o None si no hay cómo medirlo)
+def rss_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+#RSS máximo alcanzado por el proceso hasta ahora, en MB
+def rss_pico_mb():
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 1024 ** 2 if platform.system() == "Darwin" else pico / 1024  # bytes en macOS, KB en Linux
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 ** 2
+    return None
+
+
+def _filas(obj):
+    if obj is None or isinstance(obj, (bool, dict)):
+        return None
+    if isinstance(obj, int):
+        return obj
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+def _redondear(v, n=4):
+    return round(v, n) if isinstance(v, float) else v
+
+
+class Perfilador:
+    """
+    Acumula un registro por etapa y escribe el reporte de la corrida (JSON + CSV).
+    - tracemalloc: traza asignaciones de Python (delta y pico por etapa); ralentiza la corrida.
+    - cprofile: guarda un .prof por etapa en <salida_dir>/<corrida>_prof/. cProfile no admite perfiles
+      anidados en un mismo hilo: se perfila la etapa más externa de cada hilo (sin contar la de la sesión)
+      y sus etapas internas quedan incluidas en ese volcado.
+    """
+
+    def __init__(self, salida_dir="data/perfil", usar_tracemalloc=False, usar_cprofile=False, nombre="etl"):
+        self.salida_dir = salida_dir
+        self.usar_tracemalloc = usar_tracemalloc
+        self.usar_cprofile = usar_cprofile
+        self.corrida = f"{nombre}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.registros = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._abiertas = 0
+
+    @contextlib.contextmanager
+    def etapa(self, nombre, filas_entrada=None, cprofile=True):
+        local = self._local
+        nivel = getattr(local, "nivel", 0)
+        reg = {"etapa": nombre, "nivel": nivel, "hilo": threading.current_thread().name,
+               "inicio": datetime.now().isoformat(timespec="milliseconds"),
+               "filas_entrada": _filas(filas_entrada), "filas_salida": None, "error": None}
+
+        traza = self.usar_tracemalloc and tracemalloc.is_tracing()
+        with self._lock:
+            if traza and self._abiertas == 0:
+                tracemalloc.reset_peak()
+            self._abiertas += 1
+        tm_inicio = tracemalloc.get_traced_memory()[0] if traza else None
+
+        perfil = None
+        if cprofile and self.usar_cprofile and not getattr(local, "perfilando", False):
+            perfil = cProfile.Profile()
+
+        rss_inicio, pico_inicio = rss_mb(), rss_pico_mb()
+        local.nivel = nivel + 1
+        t0, c0 = time.perf_counter(), time.process_time()
+        if perfil is not None:
+            try:
+                perfil.enable()
+                local.perfilando = True
+            except ValueError:  # otro perfilador activo (Python 3.12+ admite uno por proceso)
+                perfil = None
+        try:
+            yield reg
+        except BaseException as e:
+            reg["error"] = type(e).__name__
+            raise
+        finally:
+            if perfil is not None:
+                perfil.disable()
+                local.perfilando = False
+            reg["pared_s"] = time.perf_counter() - t0
+            reg["cpu_s"] = time.process_time() - c0
+            local.nivel = nivel
+            reg["rss_inicio_mb"], reg["rss_fin_mb"] = rss_inicio, rss_mb()
+            pico = rss_pico_mb()
+            reg["rss_pico_mb"] = max(pico, reg["rss_fin_mb"] or 0.0) if pico is not None else None  # fuentes distintas
+            reg["rss_pico_delta_mb"] = (reg["rss_pico_mb"] - pico_inicio) if pico_inicio is not None else None
+            if traza and tracemalloc.is_tracing():
+                actual, pico = tracemalloc.get_traced_memory()
+                reg["tracemalloc_delta_mb"] = (actual - tm_inicio) / 1024 ** 2
+                reg["tracemalloc_pico_mb"] = max(pico - tm_inicio, 0) / 1024 ** 2
+            else:
+                reg["tracemalloc_delta_mb"] = reg["tracemalloc_pico_mb"] = None
+            reg["filas_salida"] = _filas(reg["filas_salida"])
+            filas = reg["filas_salida"] if reg["filas_salida"] is not None else reg["filas_entrada"]
+            reg["filas_por_s"] = filas / reg["pared_s"] if filas is not None and reg["pared_s"] > 0 else None
+            with self._lock:
+                self._abiertas -= 1
+                self.registros.append(reg)
+                if perfil is not None:
+                    self._guardar_cprofile(perfil, nombre)
+
+    def _guardar_cprofile(self, perfil, nombre):
+        directorio = os.path.join(self.salida_dir, f"{self.corrida}_prof")
+        os.makedirs(directorio, exist_ok=True)
+        base = re.sub(r"[^\w.-]+", "_", nombre)
+        ruta = os.path.join(directorio, f"{base}.prof")
+        i = 1
+        while os.path.exists(ruta):
+            i += 1
+            ruta = os.path.join(directorio, f"{base}_{i}.prof")
+        perfil.dump_stats(ruta)
+
+    def resumen(self):
+        """Agregado por etapa: llamadas, sumas de tiempo y filas (salida, o entrada si no hay), máximos de memoria."""
+        agregado = {}
+        for r in self.registros:
+            a = agregado.setdefault(r["etapa"], {"etapa": r["etapa"], "nivel": r["nivel"], "llamadas": 0,
+                                                 "pared_s": 0.0, "cpu_s": 0.0, "filas": None,
+                                                 "rss_pico_mb": None, "tracemalloc_pico_mb": None, "errores": 0})
+            a["llamadas"] += 1
+            a["pared_s"] += r["pared_s"]
+            a["cpu_s"] += r["cpu_s"]
+            a["errores"] += r["error"] is not None
+            filas = r["filas_salida"] if r["filas_salida"] is not None else r["filas_entrada"]
+            if filas is not None:
+                a["filas"] = (a["filas"] or 0) + filas
+            for k in ("rss_pico_mb", "tracemalloc_pico_mb"):
+                if r[k] is not None:
+                    a[k] = max(a[k] or 0.0, r[k])
+        for a in agregado.values():
+            a["filas_por_s"] = a["filas"] / a["pared_s"] if a["filas"] and a["pared_s"] > 0 else None
+        return [{k: _redondear(v) for k, v in a.items()} for a in agregado.values()]
+
+    def guardar(self, parametros=None):
+        """
+        Escribe <salida_dir>/<corrida>.json (entorno, parámetros, etapas y resumen) y <corrida>.csv
+        (una fila por etapa). Retorna las rutas (json, csv).
+        """
+        os.makedirs(self.salida_dir, exist_ok=True)
+        registros = [{k: _redondear(r.get(k)) for k in COLUMNAS_REPORTE} for r in self.registros]
+        ruta_json = os.path.join(self.salida_dir, f"{self.corrida}.json")
+        ruta_csv = os.path.join(self.salida_dir, f"{self.corrida}.csv")
+        reporte = {
+            "corrida": self.corrida,
+            "entorno": {"python": platform.python_version(), "plataforma": platform.platform(),
+                        "cpus": os.cpu_count(), "tracemalloc": self.usar_tracemalloc,
+                        "cprofile": self.usar_cprofile},
+            "parametros": parametros or {},
+            "etapas": registros,
+            "resumen": self.resumen(),
+        }
+        with open(ruta_json, "w", encoding="utf-8") as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2, default=str)
+        with open(ruta_csv, "w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=COLUMNAS_REPORTE)
+            w.writeheader()
+            w.writerows(registros)
+        return ruta_json, ruta_csv
+
+
+def activo():
+    return _activo
+
+
+#Activa un perfilador para el proceso (y arranca tracemalloc si se pidió)
+def activar(perfilador):
+    global _activo
+    _activo = perfilador
+    if perfilador.usar_tracemalloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return perfilador
+
+
+def desactivar():
+    global _activo
+    perfilador, _activo = _activo, None
+    if perfilador is not None and perfilador.usar_tracemalloc and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return perfilador
+
+
+#Marca una etapa; con el perfilado apagado entrega un registro descartable
+@contextlib.contextmanager
+def etapa(nombre, filas_entrada=None):
+    perfilador = _activo
+    if perfilador is None:
+        yield {}
+        return
+    with perfilador.etapa(nombre, filas_entrada) as reg:
+        yield reg
+
+
+#Decorador: mide la función como la etapa `nombre` (más `.<valor>` del argumento `clave`, si se indica).
+#Filas de entrada: len() del argumento `entrada` (o de self.<entrada> si viene en None);
+#filas de salida: len() del resultado, o el resultado si es un entero (salida=False lo ignora).
+def medir(nombre, clave=None, entrada=None, salida=True):
+    def decorador(fn):
+        firma = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            if _activo is None:
+                return fn(*args, **kwargs)
+            argumentos = firma.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            etiqueta = nombre
+            if clave is not None:
+                etiqueta = f"{nombre}.{argumentos.arguments.get(clave)}"
+            filas = None
+            if entrada is not None:
+                filas = argumentos.arguments.get(entrada)
+                if filas is None and args:
+                    filas = getattr(args[0], entrada, None)
+            with etapa(etiqueta, filas) as reg:
+                resultado = fn(*args, **kwargs)
+                if salida:
+                    reg["filas_salida"] = resultado
+                return resultado
+        return envoltura
+    return decorador
+
+
+#Sesión de perfilado para una corrida completa: activa, mide todo como etapa `nombre` y guarda el reporte.
+#Con activo=False no hace nada.
+@contextlib.contextmanager
+def sesion(activo=True, salida_dir="data/perfil", usar_tracemalloc=False, usar_cprofile=False,
+           nombre="etl", parametros=None, logs=None):
+    if not activo:
+        yield None
+        return
+    perfilador = activar(Perfilador(salida_dir, usar_tracemalloc, usar_cprofile, nombre))
+    try:
+        with perfilador.etapa(nombre, cprofile=False):
+            yield perfilador
+    finally:
+        desactivar()
+        ruta_json, ruta_csv = perfilador.guardar(parametros)
+        if logs is not None:
+            for a in perfilador.resumen():
+                pico = f"{a['rss_pico_mb']:,.1f} MB" if a["rss_pico_mb"] is not None else "n/d"
+                logs.log(f"[perfil] {a['etapa']}: {a['pared_s']:.2f}s pared | {a['cpu_s']:.2f}s CPU "
+                         f"| llamadas={a['llamadas']} | filas={a['filas']} | RSS pico={pico}", "info")
+            logs.log(f"[perfil] Reporte: {ruta_json} | {ruta_csv}", "info")
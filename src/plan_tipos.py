@@ -0,0 +1,209 @@
+#Plan declarado de tipos compactos para las colecciones extraídas, la dimensión de listings y la sábana.
+#Cada plan es {columna: dtype}; una clave terminada en '*' aplica a todas las columnas con ese prefijo.
+#Las columnas ausentes se ignoran y una conversión que no es segura (enteros con NaN o fuera de rango,
+#texto con demasiados valores distintos) deja la columna como estaba.
+import numpy as np
+import pandas as pd
+
+#Texto muy repetido en listings (se hereda en la sábana a través del join)
+_CATEGORICAS_LISTING = [
+    'neighbourhood_cleansed', 'property_type', 'room_type', 'host_name', 'host_since',
+    'host_response_time', 'price_bucket', 'instant_bookable', 'host_is_superhost',
+    'host_identity_verified', 'host_has_profile_pic', 'first_review', 'last_review',
+]
+
+PLAN_TIPOS = {
+    #Extracción: solo columnas que Transformation lee como texto (fechas, precio, t/f)
+    'calendar': {'date': 'category', 'available': 'category', 'price': 'category'},
+    'reviews':  {'date': 'category'},
+    'listings': {},
+
+    #Dimensión de listings antes del join con calendar
+    'listings_dim': {
+        **{c: 'category' for c in _CATEGORICAS_LISTING},
+        'amenities_*': 'int8',
+        'host_verifications_*': 'int8',
+    },
+
+    #Sábana final (por bloque): banderas int8, partes de fecha y conteos enteros pequeños.
+    #Los float64 se mantienen: precios, tasas y coordenadas se exportan tal cual.
+    'flat': {
+        'date': 'category',
+        **{c: 'category' for c in _CATEGORICAS_LISTING},
+        'year': 'int16', 'month': 'int8', 'day': 'int8', 'quarter': 'int8', 'week_of_month': 'int8',
+        'booked_night': 'int8', 'is_weekend': 'int8',
+        'amenities_*': 'int8',
+        'host_verifications_*': 'int8',
+        'reviews_in_month': 'int32', 'minimum_nights': 'int32', 'maximum_nights': 'int32',
+        'accommodates': 'int16', 'bedrooms': 'int16', 'beds': 'int16',
+        'host_total_listings_count': 'int32',
+        'availability_30': 'int16', 'availability_60': 'int16', 'availability_90': 'int16',
+        'availability_365': 'int16',
+        'number_of_reviews': 'int32', 'number_of_reviews_ltm': 'int32',
+        'number_of_reviews_l30d': 'int32', 'number_of_reviews_ly': 'int32',
+    },
+}
+
+#Tipos lógicos declarados por colección ('lista' | 'texto'); solo deciden en columnas object, porque para
+#numéricas, booleanas y fechas manda el dtype. Lo no declarado se infiere de una muestra (inferir_tipos).
+TIPOS_LOGICOS = {
+    'listings': {'amenities': 'lista', 'host_verifications': 'lista'},
+    'calendar': {},
+    'reviews':  {},
+}
+
+#Filas no nulas que se revisan por columna object al inferir tipos lógicos
+MUESTRA_TIPOS = 1_000
+
+#Máxima proporción de valores distintos para convertir texto a category
+MAX_PROPORCION_UNICOS = 0.5
+
+
+#Resuelve el plan a {columna: dtype} para las columnas presentes en df (los prefijos 'x_*' se expanden)
+def resolver_plan(df, plan):
+    tipos = {}
+    for clave, dtype in plan.items():
+        if clave.endswith('*'):
+            prefijo = clave[:-1]
+            tipos.update({c: dtype for c in df.columns if isinstance(c, str) and c.startswith(prefijo)})
+        elif clave in df.columns:
+            tipos[clave] = dtype
+    return tipos
+
+
+#Convierte una serie al dtype pedido solo si no se pierde información; None si no es seguro
+def _convertir(s, dtype):
+    if dtype == 'category':
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            return None
+        if s.dtype != object and not pd.api.types.is_string_dtype(s.dtype):
+            return None
+        try:
+            n_unicos = s.nunique(dropna=True)
+        except TypeError:
+            return None  # listas/dicts: no hashables
+        if len(s) and n_unicos > MAX_PROPORCION_UNICOS * len(s) and n_unicos > 1_000:
+            return None
+        return s.astype('category')
+
+    tipo = np.dtype(dtype)
+    if s.dtype == tipo:
+        return None
+    if tipo.kind in 'iu':
+        if not (pd.api.types.is_integer_dtype(s.dtype) or pd.api.types.is_float_dtype(s.dtype) or s.dtype == bool):
+            return None
+        if s.hasnans:
+            return None
+        v = s.to_numpy()
+        if v.size:
+            if pd.api.types.is_float_dtype(s.dtype) and not np.array_equal(v, np.floor(v)):
+                return None
+            info = np.iinfo(tipo)
+            if v.min() < info.min or v.max() > info.max:
+                return None
+        return s.astype(tipo)
+    if tipo.kind == 'f':
+        return s.astype(tipo) if pd.api.types.is_float_dtype(s.dtype) else None
+    return None
+
+
+#Aplica un plan (dict o nombre en PLAN_TIPOS) sobre df en sitio; retorna las columnas convertidas
+def aplicar_tipos(df, plan):
+    if isinstance(plan, str):
+        plan = PLAN_TIPOS.get(plan, {})
+    convertidas = []
+    for col, dtype in resolver_plan(df, plan or {}).items():
+        nuevo = _convertir(df[col], dtype)
+        if nuevo is not None:
+            df[col] = nuevo
+            convertidas.append(col)
+    return convertidas
+
+
+#Memoria del DataFrame en MB (deep: cuenta los objetos Python de columnas de texto)
+def memoria_mb(df):
+    return float(df.memory_usage(deep=True).sum()) / 1024 ** 2
+
+
+#Aplica el plan y registra antes/después de memoria con logs (instancia de Logs)
+def aplicar_con_reporte(df, plan, nombre, logs):
+    antes = memoria_mb(df)
+    convertidas = aplicar_tipos(df, plan)
+    despues = memoria_mb(df)
+    logs.log(f"[plan_tipos] {nombre}: {antes:,.1f} MB → {despues:,.1f} MB "
+             f"| columnas convertidas={len(convertidas)}", "info")
+    return convertidas
+
+
+#Tipo lógico por dtype (sin recorrer datos); None para object/category (decide el registro)
+def tipo_por_dtype(s):
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return 'num'
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return 'bool'
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return 'fecha'
+    return None
+
+
+#Tipo lógico de una serie: dtype, luego el declarado y si no, una muestra
+#(hasta `muestra` valores no nulos de las primeras filas: 'lista' si alguno es lista, si no 'texto')
+def tipo_logico(s, declarado=None, muestra=MUESTRA_TIPOS):
+    tipo = tipo_por_dtype(s) or declarado
+    if tipo is None:
+        valores = s.iloc[:muestra * 4].dropna().iloc[:muestra] if s.dtype == object else []
+        tipo = 'lista' if any(isinstance(v, list) for v in valores) else 'texto'
+    return tipo
+
+
+#Registro {columna: tipo lógico} de df con los declarados de la colección y el resto inferido;
+#se guarda en df.attrs['tipos_logicos'] para que la transformación no lo vuelva a calcular
+def inferir_tipos(df, coleccion=None, muestra=MUESTRA_TIPOS):
+    declarados = TIPOS_LOGICOS.get(coleccion or '', {})
+    tipos = {c: tipo_logico(df[c], declarados.get(c), muestra) for c in df.columns}
+    df.attrs['tipos_logicos'] = tipos
+    return tipos
+
+
+#Nombre de colección base ('listings_mx' → 'listings') para el registro de tipos
+def coleccion_base(colecction_name):
+    return next((c for c in TIPOS_LOGICOS if str(colecction_name).startswith(c)), None)
+
+
+#Perfil de nulos en una sola pasada: {columna: nulos} solo para las columnas con nulos
+def perfil_nulos(df):
+    if len(df.columns) == 0:
+        return {}
+    conteos = df.isna().sum()
+    return {c: int(n) for c, n in conteos.items() if n}
+
+
+#Concatena lotes con columnas category: unifica categorías antes de concatenar para no caer a object
+def concatenar(frames):
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    for col in frames[0].columns:
+        if not all(col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames):
+            continue
+        categorias = pd.api.types.union_categoricals([f[col].array for f in frames]).categories
+        for f in frames:
+            f[col] = f[col].cat.set_categories(categorias)
+    return pd.concat(frames, ignore_index=True)
+
+
+#Concatena un flujo de lotes a medida que llegan, sin juntarlos en una lista: los pendientes se unen al
+#acumulado cuando ya suman tantas filas como él (cada fila se copia un número acotado de veces).
+#Un DataFrame contiguo necesita una copia al unir, así que el pico sigue cerca de 2× el resultado
+#(la última unión), pero sin la lista completa de lotes más el resultado más las copias de categorías.
+def concatenar_lotes(lotes):
+    acumulado, pendientes, filas = None, [], 0
+    for lote in lotes:
+        pendientes.append(lote)
+        filas += len(lote)
+        if acumulado is None or filas >= len(acumulado):
+            acumulado = concatenar([acumulado] + pendientes)
+            pendientes, filas = [], 0
+    return concatenar([acumulado] + pendientes)
@@ -126,18 +126,82 @@ Se registran transformaciones aplicadas, tamaños antes/después, y cuentas de i
 
 import pandas as pd
 import numpy as np
-import unicodedata
 import re
+import ast
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from logs import Logs
+import perfilado
+import plan_tipos
+import checkpoints
+from columnar import arrow_disponible
+from calendario_denso import CalendarioDenso, ARCHIVO_META
+
+
+def _clean_text_series(s: pd.Series) -> pd.Series:
+    """
+    Quita HTML, normaliza Unicode (NFC), colapsa espacios y limpia 'nan'.
+    A nivel de módulo para que los procesos del pool la puedan ejecutar.
+    """
+    t = s.astype(str)
+    t = t.str.replace(r'<br\s*/?>', ' ', flags=re.I, regex=True)
+    t = t.str.replace(r'<[^>]+>', ' ', regex=True)
+    t = t.str.normalize('NFC')
+    t = t.str.replace(r'\s+', ' ', regex=True).str.strip()
+    return t.replace({'None':'','nan':'','NaN':''})
+
+
+def _parse_list_text(v: str):
+    """Texto '[...]' → lista (JSON o literal de Python); inválido → []."""
+    try:
+        return json.loads(v)
+    except ValueError:
+        try:
+            return ast.literal_eval(v)
+        except Exception:
+            return []
+
+
+def _parse_list_texts(values: list) -> list:
+    """
+    Varios textos '[...]' → listas con un solo json.loads sobre todos; si alguno no es JSON
+    (p. ej. "['email', 'phone']"), se parsean uno por uno con _parse_list_text.
+    """
+    try:
+        out = json.loads('[' + ','.join(values) + ']')
+        if len(out) == len(values):
+            return out
+    except ValueError:
+        pass
+    return [_parse_list_text(v) for v in values]
+
 
 class Transformation:
+    # Texto largo casi sin repetidos: la memoización no ayuda, se limpia por bloques en paralelo
+    LONG_TEXT_COLS = ('description', 'neighborhood_overview', 'comments')
+    # Etapas de run() en orden (build_calendar_matrix solo con calendario_denso; build_flat_sheet solo
+    # si se materializa la sábana completa) y parámetros que cambian la salida de cada una
+    ETAPAS = ('normalize_types', 'clean_nulls', 'build_calendar_matrix', 'derive_features',
+              'expand_nested_fields', 'build_flat_sheet')
+    PARAMETROS_ETAPA = {
+        'normalize_types': ('date_output',),
+        'derive_features': ('price_mode', 'price_bins', 'price_labels'),
+        'expand_nested_fields': ('amenities_completas',),
+        'build_flat_sheet': ('plan_tipos',),
+    }
     # ---------------------------------------------------------------------
     # Constructor
     # ---------------------------------------------------------------------
-    def __init__(self, df_listings: pd.DataFrame, df_calendar: pd.DataFrame, df_reviews: pd.DataFrame):
+    def __init__(self, df_listings: pd.DataFrame, df_calendar: pd.DataFrame, df_reviews: pd.DataFrame = None,
+                 review_summary: pd.DataFrame = None):
         """
         Propósito:
           - Inicializar copias de dataframes y el manejador de logs.
+          - review_summary: resumen de reviews por (listing_id, year, month) con n/min_fecha/max_fecha
+            (Extraction.review_month_summary); reemplaza a df_reviews cuando no se necesita el texto.
+            Si llegan ambos, el resumen solo cuenta para los listings que no traen reviews (ETL incremental:
+            reviews de los listings reprocesados + resumen de los que solo suman días de calendar).
 
         Logs:
           - Tamaño y cantidad de columnas de cada dataframe.
@@ -148,14 +212,52 @@ class Transformation:
         self.logs = Logs()
         self.listings = df_listings.copy()
         self.calendar = df_calendar.copy()
-        self.reviews  = df_reviews.copy()
+        self.reviews  = df_reviews.copy() if df_reviews is not None else pd.DataFrame()
+        self.review_summary = review_summary.copy() if review_summary is not None else None
+        # Registro de tipos lógicos por tabla (de la extracción, o inferido aquí de una muestra)
+        self.tipos = {name: dict(df.attrs.get('tipos_logicos') or plan_tipos.inferir_tipos(df, name))
+                      for name, df in (('listings', self.listings), ('calendar', self.calendar),
+                                       ('reviews', self.reviews))}
         self.flat_sheet = None
+        self.date_output = 'iso'
+        # Rango (listing_id, min_fecha, max_fecha) del calendar completo de listings que llegan solo con parte
+        # de sus días (ETL incremental): _fill_review_dates lo usa en lugar del rango del lote
+        self.rango_calendar = None
+        # Caché de transformaciones por valor único, compartida entre columnas y etapas
+        # (clave → {valor: resultado}); memo_max acota las entradas por clave (0 = sin caché)
+        self.memo_max = 200_000
+        self._memo = {}
+        # Fechas parseadas (datetime64 UTC) por (tabla, columna): normalize_types parsea una vez y las
+        # etapas siguientes (_fill_review_dates, derive_features, reviews por mes) las reutilizan
+        self._fechas = {}
+        # Limpieza de texto largo: procesos (1 = serial) y filas por bloque
+        self.text_workers = 1
+        self.text_chunk_rows = 50_000
+        # Plan de tipos compactos (plan_tipos) en la dimensión de listings y en la sábana
+        self.plan_tipos = True
+        self._int_keys = False
+        # Vocabulario completo de amenities (además de las dummies curadas): forma larga y matriz dispersa
+        self.amenities_completas = False
+        self.amenities_long = None
+        self.amenities_sparse = None
+        # Calendar denso listing × día (build_calendar_matrix), opcional y memory-mapped si hay directorio
+        self.calendario_denso = False
+        self.calendario_denso_dir = None
+        self.calendar_matrix = None
+        # Esquema estrella (build_star_schema): tablas por nombre y orden de columnas de la sábana
+        self.star_schema = None
+        self.star_columns = None
+        # Checkpoints por etapa (checkpoints.py) en este directorio (None = sin checkpoints) y huella de las
+        # entradas que los valida (None → se calcula de los DataFrames recibidos al empezar run)
+        self.checkpoint_dir = None
+        self.huella_entrada = None
 
         self.logs.log(
             f"[INIT] Recibidos | "
             f"listings: {self.listings.shape} cols={len(self.listings.columns)} | "
             f"calendar: {self.calendar.shape} cols={len(self.calendar.columns)} | "
-            f"reviews: {self.reviews.shape} cols={len(self.reviews.columns)}",
+            f"reviews: {self.reviews.shape} cols={len(self.reviews.columns)}"
+            + (f" | review_summary: {self.review_summary.shape}" if self.review_summary is not None else ""),
             "info"
         )
 
@@ -167,32 +269,247 @@ class Transformation:
         if isinstance(v, dict) and '$date' in v: v = v['$date']
         return pd.to_datetime(v, errors='coerce', utc=True)
 
+    def _unwrap_mongo_dates(self, s: pd.Series) -> pd.Series:
+        """Desenvuelve {'$date': ...} en bloque; el resto de valores queda igual."""
+        if s.dtype != object:
+            return s
+        vals = s.to_numpy()
+        is_dict = np.fromiter((type(v) is dict for v in vals), dtype=bool, count=len(vals))
+        if not is_dict.any():
+            return s
+        vals = vals.copy()
+        vals[is_dict] = [v.get('$date') for v in vals[is_dict]]
+        return pd.Series(vals, index=s.index, name=s.name)
+
+    def _parse_dates_vectorized(self, s: pd.Series) -> pd.Series:
+        """
+        Serie → datetime64[ns, UTC] en bloque:
+          1) desenvuelve $date, 2) un solo pd.to_datetime(format=ISO8601),
+          3) fallback por fila (_parse_any_date) solo para los sobrantes.
+        """
+        if pd.api.types.is_datetime64_any_dtype(s):
+            return s.dt.tz_localize('UTC') if s.dt.tz is None else s.dt.tz_convert('UTC')
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # Fechas como category (plan de tipos): cada categoría se parsea una vez; código -1 (nulo) → NaT.
+            # pd.to_datetime sobre un categórico puede devolver otro categórico en lugar de datetime64.
+            cats = self._parse_dates_vectorized(pd.Series(s.cat.categories.astype(object)))
+            vals = np.append(cats.dt.tz_convert(None).to_numpy(), np.datetime64('NaT', 'ns'))
+            return pd.Series(vals[s.cat.codes.to_numpy()], index=s.index, name=s.name).dt.tz_localize('UTC')
+
+        s = self._unwrap_mongo_dates(s)
+        out = pd.to_datetime(s, format='ISO8601', errors='coerce', utc=True)
+
+        pending = out.isna() & s.notna()
+        if pending.any():
+            rest = s[pending].apply(self._parse_any_date)
+            out[pending] = pd.to_datetime(rest, errors='coerce', utc=True)
+        return out
+
+    def _format_iso_date(self, dt: pd.Series) -> pd.Series:
+        """datetime64 → 'YYYY-MM-DD' sin strftime por fila (NaT → NaN)."""
+        if dt.dt.tz is not None:
+            dt = dt.dt.tz_convert(None)
+        vals = dt.to_numpy().astype('datetime64[D]').astype(str).astype(object)
+        vals[dt.isna().to_numpy()] = np.nan
+        return pd.Series(vals, index=dt.index, name=dt.name)
+
+    def _to_date(self, s: pd.Series, clave=None) -> pd.Series:
+        """
+        Serie → fecha según self.date_output ('iso' → string, 'datetime' → datetime64 UTC).
+        clave=(tabla, columna): guarda el datetime parseado para que _fecha no vuelva a parsear.
+        """
+        dt = self._parse_dates_vectorized(s)
+        if clave is not None:
+            self._fechas[clave] = dt
+        return self._as_output_date(dt)
+
+    def _fecha(self, tabla: str, col: str) -> pd.Series:
+        """
+        datetime64 UTC de getattr(self, tabla)[col] reutilizando el parseo de normalize_types.
+        Las partes de fecha (día, mes, año) coinciden con las de la fecha de salida.
+        Si se eliminaron filas se realinea por índice; si el índice ya no corresponde, se parsea de nuevo.
+        """
+        df = getattr(self, tabla)
+        dt = self._fechas.get((tabla, col))
+        if dt is not None:
+            if dt.index.equals(df.index):
+                return dt
+            if dt.index.is_unique and df.index.is_unique and df.index.isin(dt.index).all():
+                return dt.reindex(df.index)
+        dt = self._parse_dates_vectorized(df[col])
+        self._fechas[(tabla, col)] = dt
+        return dt
+
+    def _as_output_date(self, dt: pd.Series) -> pd.Series:
+        """datetime64 UTC ya parseado → formato de salida según self.date_output."""
+        return dt.dt.normalize() if self.date_output == 'datetime' else self._format_iso_date(dt)
+
+    def _date_fill_value(self, iso: str):
+        """Valor de relleno de fecha acorde a self.date_output."""
+        return pd.to_datetime(iso, utc=True) if self.date_output == 'datetime' else iso
+
     def _to_iso_date(self, s: pd.Series) -> pd.Series:
         """Serie → 'YYYY-MM-DD' (string ISO de fecha)."""
-        return s.apply(self._parse_any_date).dt.strftime('%Y-%m-%d')
+        return self._format_iso_date(self._parse_dates_vectorized(s))
 
     def _to_iso_datetime(self, s: pd.Series) -> pd.Series:
         """Serie → 'YYYY-MM-DDTHH:MM:SSZ' (string ISO datetime)."""
-        return s.apply(self._parse_any_date).dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+        return self._parse_dates_vectorized(s).dt.strftime('%Y-%m-%dT%H:%M:%SZ')
 
-    def _to_price_num(self, s: pd.Series) -> pd.Series:
-        """Limpia '$' y comas → float."""
+    def _memo_map(self, s: pd.Series, key: str, fn, dtype=object) -> pd.Series:
+        """
+        Aplica fn (Serie → Serie, vectorizada) solo a los valores únicos de s y
+        reparte el resultado por código (factorize → fn(únicos) → take).
+        Los resultados se guardan en self._memo[key] (hasta memo_max entradas),
+        así otras columnas/etapas con la misma clave solo calculan valores nuevos.
+        """
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # categorías = únicos; NaN (código -1) va al final
+            codes = s.cat.codes.to_numpy().copy()
+            codes[codes < 0] = len(s.cat.categories)
+            uniques = pd.Series(list(s.cat.categories) + [np.nan], dtype=object)
+        else:
+            try:
+                codes, uniques = pd.factorize(s, use_na_sentinel=False)
+            except TypeError:
+                # valores no hashables (listas/dicts): sin memoización
+                return fn(s)
+            uniques = pd.Series(uniques)
+
+        cache = self._memo.setdefault(key, {}) if self.memo_max else None
+        if cache is None:
+            res = np.asarray(fn(uniques), dtype=dtype)
+        else:
+            vals = uniques.tolist()
+            miss = [u for u in vals if u not in cache]
+            local = {}
+            if miss:
+                computed = fn(pd.Series(miss, dtype=uniques.dtype)).tolist()
+                target = cache if len(cache) + len(miss) <= self.memo_max else local
+                target.update(zip(miss, computed))
+            res = np.array([cache[u] if u in cache else local[u] for u in vals], dtype=dtype)
+        return pd.Series(res[codes], index=s.index, name=s.name)
+
+    def _price_num_values(self, s: pd.Series) -> pd.Series:
         return (s.astype(str).str.replace(r'[\$,]', '', regex=True)
                              .replace({'': np.nan}).astype(float))
 
-    def _to_percent_num(self, s: pd.Series) -> pd.Series:
-        """Elimina '%' y 'N/A' → float."""
+    def _percent_num_values(self, s: pd.Series) -> pd.Series:
         return (s.astype(str).str.replace('%', '', regex=False)
                              .replace({'': np.nan, 'N/A': np.nan}).astype(float))
 
+    def _slug_values(self, s: pd.Series) -> pd.Series:
+        t = s.astype(str).str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+        return t.str.replace(r'[^0-9a-zA-Z]+', '_', regex=True).str.strip('_').str.lower()
+
+    def _to_price_num(self, s: pd.Series) -> pd.Series:
+        """Limpia '$' y comas → float (por valor único)."""
+        return self._memo_map(s, 'price_num', self._price_num_values, float)
+
+    def _to_percent_num(self, s: pd.Series) -> pd.Series:
+        """Elimina '%' y 'N/A' → float (por valor único)."""
+        return self._memo_map(s, 'percent_num', self._percent_num_values, float)
+
     def _clean_text(self, s: pd.Series) -> pd.Series:
-        """Quita HTML, normaliza Unicode, colapsa espacios, limpia 'nan'."""
-        t = s.astype(str)
-        t = t.str.replace(r'<br\s*/?>', ' ', flags=re.I, regex=True)
-        t = t.str.replace(r'<[^>]+>', ' ', regex=True)
-        t = t.apply(lambda x: unicodedata.normalize('NFC', x))
-        t = t.str.replace(r'\s+', ' ', regex=True).str.strip()
-        return t.replace({'None':'','nan':'','NaN':''})
+        """Quita HTML, normaliza Unicode, colapsa espacios, limpia 'nan' (por valor único)."""
+        return self._memo_map(s, 'clean_text', _clean_text_series)
+
+    def _clean_text_parallel(self, s: pd.Series, pool) -> pd.Series:
+        """Misma limpieza que _clean_text, por bloques de filas en un pool de procesos (orden preservado)."""
+        n = self.text_chunk_rows
+        parts = [s.iloc[i:i + n] for i in range(0, len(s), n)]
+        return pd.concat(pool.map(_clean_text_series, parts))
+
+    def _clean_text_col(self, s: pd.Series, pool=None) -> pd.Series:
+        """Texto largo y pool disponible → paralelo; resto → _clean_text (memoizado)."""
+        if pool is not None and s.name in self.LONG_TEXT_COLS and len(s) > self.text_chunk_rows:
+            return self._clean_text_parallel(s, pool)
+        return self._clean_text(s)
+
+    def _slug(self, s: pd.Series) -> pd.Series:
+        """Texto → slug ASCII en minúsculas con '_' (por valor único)."""
+        return self._memo_map(s, 'slug', self._slug_values)
+
+    def _as_lists(self, s: pd.Series) -> pd.Series:
+        """
+        Fuerza listas: listas tal cual; texto '[...]' → lista (parseo en bloque de los valores
+        únicos, ver _parse_list_texts); vacío/NaN → []; cualquier otro valor → [str(valor)].
+        """
+        vals = s.to_numpy(dtype=object)
+        kind = np.fromiter((2 if isinstance(v, list) else 1 if isinstance(v, str) else 0 for v in vals),
+                           dtype=np.int8, count=len(vals))
+        out = np.empty(len(vals), dtype=object)
+        out[kind == 2] = vals[kind == 2]
+
+        pos_txt = np.flatnonzero(kind == 1)
+        txt = pd.Series(vals[pos_txt], dtype=object)
+        is_list_txt = txt.str.lstrip().str.startswith('[').to_numpy(dtype=bool)
+        codes, uniques = pd.factorize(txt[is_list_txt])
+        parsed = pd.Series(_parse_list_texts(list(uniques)), dtype=object).to_numpy()
+        out[pos_txt[is_list_txt]] = parsed[codes]
+
+        rest = np.concatenate([pos_txt[~is_list_txt], np.flatnonzero(kind == 0)])
+        out[rest] = pd.Series([[] if (isinstance(v, str) and v == '') or (not isinstance(v, str) and pd.isna(v))
+                               else [str(v)] for v in vals[rest]], dtype=object).to_numpy()
+        return pd.Series(out, index=s.index, name=s.name)
+
+    def _slug_long(self, s: pd.Series) -> pd.DataFrame:
+        """Serie de listas → forma larga (pos = posición de fila, slug), sin repetidos por fila."""
+        ex = s.reset_index(drop=True).explode()
+        ex = ex[[isinstance(x, str) for x in ex.to_numpy()]]
+        long = pd.DataFrame({'pos': ex.index.to_numpy(dtype=np.int64), 'slug': self._slug(ex).to_numpy()})
+        return long.drop_duplicates(ignore_index=True)
+
+    def _dummies(self, long: pd.DataFrame, n_rows: int, slugs, prefix: str) -> pd.DataFrame:
+        """Forma larga → matriz 0/1 (n_rows × slugs) con una sola asignación indexada."""
+        cols = pd.Index(slugs)
+        j = cols.get_indexer(long['slug'])
+        keep = j >= 0
+        mat = np.zeros((n_rows, len(cols)), dtype=np.int64)
+        mat[long['pos'].to_numpy()[keep], j[keep]] = 1
+        return pd.DataFrame(mat, columns=[f"{prefix}_{c}" for c in cols])
+
+    def _sparse_matrix(self, long: pd.DataFrame, index: pd.Index, prefix: str) -> pd.DataFrame:
+        """Forma larga → DataFrame disperso (Sparse[int8, 0]) con una columna por slug del vocabulario."""
+        codes, vocab = pd.factorize(long['slug'], sort=True)
+        pos = long['pos'].to_numpy()[np.argsort(codes, kind='stable')]
+        bounds = np.searchsorted(np.sort(codes), np.arange(len(vocab) + 1))
+        buf = np.zeros(len(index), dtype=np.int8)
+        cols = {}
+        for k, slug in enumerate(vocab):
+            p = pos[bounds[k]:bounds[k + 1]]
+            buf[p] = 1
+            cols[f"{prefix}_{slug}"] = pd.arrays.SparseArray(buf, fill_value=0)
+            buf[p] = 0
+        return pd.DataFrame(cols, index=index)
+
+    def _impute_hierarchical(self, cols, levels):
+        """
+        Imputa cols de listings en cascada: por cada nivel un solo
+        groupby(claves)[cols].transform('median') para todas las columnas,
+        relleno alineado por índice y al final mediana global.
+
+        levels: [(nombre, [claves])] en orden de prioridad.
+        Retorna {col: {nivel: n_imputados, ..., 'global': n_imputados}}.
+        """
+        df = self.listings
+        counts = {c: {} for c in cols}
+        if not cols:
+            return counts
+        for name, keys in levels:
+            keys = [k for k in keys if k in df.columns]
+            na_before = df[cols].isna().sum()
+            if not keys or not na_before.any():
+                for c in cols: counts[c][name] = 0
+                continue
+            med = df.groupby(keys)[cols].transform('median')
+            df[cols] = df[cols].fillna(med)
+            filled = na_before - df[cols].isna().sum()
+            for c in cols: counts[c][name] = int(filled[c])
+        na_before = df[cols].isna().sum()
+        df[cols] = df[cols].fillna(df[cols].median())
+        for c in cols: counts[c]['global'] = int(na_before[c])
+        return counts
 
     def _shape_str(self):
         """Devuelve resumen de formas de dataframes para logging."""
@@ -203,15 +520,23 @@ class Transformation:
     # ---------------------------------------------------------------------
     # 1) Normalizar tipos
     # ---------------------------------------------------------------------
-    def normalize_types(self):
+    def normalize_types(self, date_output='iso', text_workers=None):
         """
         Propósito:
           - Unificar tipos: fechas (→ ISO string), precios (→ float), % (→ float),
             textos (→ limpio) y dropear columnas no usadas.
 
+        Parámetros:
+          - date_output: 'iso' (string 'YYYY-MM-DD', por defecto) o 'datetime'
+            (datetime64 UTC, evita el ida y vuelta por strings).
+          - text_workers: procesos para limpiar texto largo (description,
+            neighborhood_overview, comments); None → self.text_workers, 1 = serial.
+
         Transformaciones:
           - listings: fechas (last_scraped, host_since, first/last_review) a ISO.
           - calendar/reviews: date a ISO.
+          - parseo vectorizado: $date en bloque + un solo pd.to_datetime; por fila
+            solo los valores que no son ISO.
           - price → price_num (float) y se elimina price.
           - host_*_rate → *_pct (float) y se elimina original.
           - limpieza de texto en columnas descriptivas.
@@ -223,16 +548,18 @@ class Transformation:
         Retorna:
           - self
         """
-        self.logs.log("[normalize_types] Inicio", "info")
+        self.date_output = date_output
+        self.logs.log(f"[normalize_types] Inicio | date_output={date_output}", "info")
 
-        # Fechas -> ISO (strings)
+        # Fechas -> ISO (strings) o datetime64
+        # calendar.date y reviews.date quedan además parseadas en self._fechas (ver _fecha)
         for c in ['last_scraped','calendar_last_scraped','host_since','first_review','last_review']:
             if c in self.listings.columns:
-                self.listings[c] = self._to_iso_date(self.listings[c])
+                self.listings[c] = self._to_date(self.listings[c])
         if 'date' in self.calendar.columns:
-            self.calendar['date'] = self._to_iso_date(self.calendar['date'])
+            self.calendar['date'] = self._to_date(self.calendar['date'], ('calendar', 'date'))
         if 'date' in self.reviews.columns:
-            self.reviews['date'] = self._to_iso_date(self.reviews['date'])
+            self.reviews['date'] = self._to_date(self.reviews['date'], ('reviews', 'date'))
 
         # Calendar: columnas no usadas
         dropped = []
@@ -267,15 +594,25 @@ class Transformation:
             self.calendar.drop(columns=['price'], inplace=True, errors='ignore')
 
         # Limpieza de texto
+        if text_workers is not None:
+            self.text_workers = text_workers
         text_cols = ['name','description','neighborhood_overview','neighbourhood','neighbourhood_cleansed',
                      'property_type','room_type','host_name','host_location','host_neighbourhood','host_response_time']
         touched = [c for c in text_cols if c in self.listings.columns]
-        for c in touched:
-            self.listings[c] = self._clean_text(self.listings[c])
-        if 'reviewer_name' in self.reviews.columns:
-            self.reviews['reviewer_name'] = self._clean_text(self.reviews['reviewer_name'])
-        if 'comments' in self.reviews.columns:
-            self.reviews['comments'] = self._clean_text(self.reviews['comments'])
+        pool = ProcessPoolExecutor(max_workers=self.text_workers) if self.text_workers > 1 else None
+        if pool is not None:
+            self.logs.log(f"[normalize_types] Texto largo en paralelo | procesos={self.text_workers} "
+                          f"| filas/bloque={self.text_chunk_rows}", "info")
+        try:
+            for c in touched:
+                self.listings[c] = self._clean_text_col(self.listings[c], pool)
+            if 'reviewer_name' in self.reviews.columns:
+                self.reviews['reviewer_name'] = self._clean_text(self.reviews['reviewer_name'])
+            if 'comments' in self.reviews.columns:
+                self.reviews['comments'] = self._clean_text_col(self.reviews['comments'], pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
         if touched:
             self.logs.log(f"[normalize_types] Limpieza de texto: {len(touched)} cols", "info")
 
@@ -376,62 +713,24 @@ class Transformation:
 
         # --- Tasas del host: host → grupo → global → clip ---
         if 'host_id' in self.listings.columns:
+            filled = self._impute_hierarchical(rate_cols, [('host', ['host_id']), ('grupo', group_keys)])
             for c in rate_cols:
-                filled_host = filled_grp = 0
-                m_init = self.listings[c].isna().sum()
-                by_host = self.listings.groupby('host_id')[c].median(numeric_only=True)
-                m = self.listings[c].isna()
-                if not by_host.empty:
-                    before_na = m.sum()
-                    self.listings.loc[m, c] = self.listings.loc[m, 'host_id'].map(by_host)
-                    filled_host = before_na - self.listings[c].isna().sum()
-                if group_keys:
-                    by_grp = self.listings.groupby(group_keys)[c].median(numeric_only=True)
-                    m = self.listings[c].isna()
-                    if not by_grp.empty and m.any():
-                        before_na = m.sum()
-                        self.listings.loc[m, c] = self.listings.loc[m, group_keys].apply(
-                            lambda r: by_grp.get(tuple(r.values), np.nan), axis=1
-                        )
-                        filled_grp = before_na - self.listings[c].isna().sum()
-                m = self.listings[c].isna()
-                glob = self.listings[c].median()
-                filled_glob = m.sum()
-                self.listings[c] = self.listings[c].fillna(glob).clip(0, 100)
+                self.listings[c] = self.listings[c].clip(0, 100)
                 self.logs.log(
-                    f"[clean_nulls] {c}: host={filled_host} grupo={filled_grp} global={filled_glob}",
+                    f"[clean_nulls] {c}: host={filled[c]['host']} grupo={filled[c]['grupo']} global={filled[c]['global']}",
                     "info"
                 )
 
         # --- Scores: grupo/barrio → global → winsor p1..p99 ---
+        filled = self._impute_hierarchical(score_cols, [('grupo', group_keys), ('barrio', ['neighbourhood_cleansed'])])
         for c in score_cols:
-            filled_grp = filled_nb = 0
-            if group_keys:
-                by_grp = self.listings.groupby(group_keys)[c].median(numeric_only=True)
-                m = self.listings[c].isna()
-                if not by_grp.empty and m.any():
-                    b = m.sum()
-                    self.listings.loc[m, c] = self.listings.loc[m, group_keys].apply(
-                        lambda r: by_grp.get(tuple(r.values), np.nan), axis=1
-                    )
-                    filled_grp = b - self.listings[c].isna().sum()
-            if 'neighbourhood_cleansed' in self.listings.columns:
-                by_nb = self.listings.groupby('neighbourhood_cleansed')[c].median(numeric_only=True)
-                m = self.listings[c].isna()
-                if not by_nb.empty and m.any():
-                    b = m.sum()
-                    self.listings.loc[m, c] = self.listings.loc[m, 'neighbourhood_cleansed'].map(by_nb)
-                    filled_nb = b - self.listings[c].isna().sum()
-            m = self.listings[c].isna()
-            glob = self.listings[c].median()
-            filled_glob = m.sum()
-            self.listings[c] = self.listings[c].fillna(glob)
             v = pd.to_numeric(self.listings[c], errors='coerce')
             lo, hi = v.quantile(0.01), v.quantile(0.99)
             self.listings[c] = v.clip(lower=lo if np.isfinite(lo) else v.min(),
                                       upper=hi if np.isfinite(hi) else v.max())
             self.logs.log(
-                f"[clean_nulls] {c}: grupo={filled_grp} barrio={filled_nb} global={filled_glob} winsor p1..p99",
+                f"[clean_nulls] {c}: grupo={filled[c]['grupo']} barrio={filled[c]['barrio']} "
+                f"global={filled[c]['global']} winsor p1..p99",
                 "info"
             )
 
@@ -444,21 +743,10 @@ class Transformation:
 
 
         # --- Coordenadas: barrio → global ---
-        for c in ['latitude','longitude']:
-            if c in self.listings.columns:
-                filled_nb = 0
-                if 'neighbourhood_cleansed' in self.listings.columns:
-                    by_nb = self.listings.groupby('neighbourhood_cleansed')[c].median(numeric_only=True)
-                    m = self.listings[c].isna()
-                    if not by_nb.empty and m.any():
-                        b = m.sum()
-                        self.listings.loc[m, c] = self.listings.loc[m, 'neighbourhood_cleansed'].map(by_nb)
-                        filled_nb = b - self.listings[c].isna().sum()
-                m = self.listings[c].isna()
-                glob = self.listings[c].median()
-                filled_glob = m.sum()
-                self.listings[c] = self.listings[c].fillna(glob)
-                self.logs.log(f"[clean_nulls] {c}: barrio={filled_nb} global={filled_glob}", "info")
+        coord_cols = [c for c in ['latitude','longitude'] if c in self.listings.columns]
+        filled = self._impute_hierarchical(coord_cols, [('barrio', ['neighbourhood_cleansed'])])
+        for c in coord_cols:
+            self.logs.log(f"[clean_nulls] {c}: barrio={filled[c]['barrio']} global={filled[c]['global']}", "info")
 
         # --- bathrooms: imputar SOLO nulos (preservando decimales) ---
         if 'bathrooms' in self.listings.columns:
@@ -492,23 +780,16 @@ class Transformation:
                 )
 
         # --- Contadores: grupo → global → enteros ≥ 0 ---
-        for c in count_cols:
-            filled_grp = 0
-            if group_keys:
-                by_grp = self.listings.groupby(group_keys)[c].median(numeric_only=True)
-                m = self.listings[c].isna()
-                if not by_grp.empty and m.any():
-                    b = m.sum()
-                    self.listings.loc[m, c] = self.listings.loc[m, group_keys].apply(
-                        lambda r: by_grp.get(tuple(r.values), np.nan), axis=1
-                    )
-                    filled_grp = b - self.listings[c].isna().sum()
-            m = self.listings[c].isna()
-            glob = self.listings[c].median()
-            filled_glob = m.sum()
-            self.listings[c] = self.listings[c].fillna(glob)
-            self.listings[c] = np.maximum(0, np.floor(pd.to_numeric(self.listings[c], errors='coerce'))).astype(int)
-            self.logs.log(f"[clean_nulls] {c}: grupo={filled_grp} global={filled_glob} cast→int≥0", "info")
+        # Los contadores que también son clave de grupo (accommodates) se imputan y castean
+        # antes que los siguientes, para que estos agrupen con la clave ya completa.
+        cut = max([count_cols.index(k) + 1 for k in group_keys if k in count_cols], default=0)
+        for batch in (count_cols[:cut], count_cols[cut:]):
+            filled = self._impute_hierarchical(batch, [('grupo', group_keys)])
+            for c in batch:
+                self.listings[c] = np.maximum(0, np.floor(pd.to_numeric(self.listings[c], errors='coerce'))).astype(int)
+                self.logs.log(
+                    f"[clean_nulls] {c}: grupo={filled[c]['grupo']} global={filled[c]['global']} cast→int≥0", "info"
+                )
 
         # --- Booleanos y categóricos ---
         for c in ['host_is_superhost','host_has_profile_pic','host_identity_verified','instant_bookable']:
@@ -534,27 +815,19 @@ class Transformation:
                 mask = self.listings['host_since'].isna() | (self.listings['host_since'].astype(str).str.strip() == '')
             n_final = mask.sum()
             if n_final:
-                self.listings.loc[mask, 'host_since'] = '1970-01-01T00:00:00Z'
+                self.listings.loc[mask, 'host_since'] = self._date_fill_value('1970-01-01T00:00:00Z')
             self.logs.log(f"[clean_nulls] host_since: desde last_scraped={n_mask - n_final} | a 1970={n_final}", "info")
 
         # --- Forzar listas en campos anidados ---
         for c in ['amenities','host_verifications']:
             if c in self.listings.columns:
-                def as_list(x):
-                    if isinstance(x, list): return x
-                    import ast
-                    if isinstance(x, str) and x.strip().startswith('['):
-                        try: return ast.literal_eval(x)
-                        except: return []
-                    if pd.isna(x) or x == '': return []
-                    return [str(x)]
-                self.listings[c] = self.listings[c].apply(as_list)
+                self.listings[c] = self._as_lists(self.listings[c])
 
         # --- Calendar: available y noches mín/max ---
         if 'available' in self.calendar.columns:
             n_na = self.calendar['available'].isna().sum()
             self.calendar['available'] = self.calendar['available'].map({'t': True, 'f': False, True: True, False: False})
-            self.calendar['available'] = self.calendar['available'].fillna(True)
+            self.calendar['available'] = self.calendar['available'].fillna(True).astype(bool)
             if n_na:
                 self.logs.log(f"[clean_nulls] calendar.available: {n_na} → True (normalizado)", "info")
         for c in ['minimum_nights','maximum_nights']:
@@ -587,34 +860,9 @@ class Transformation:
                 self.logs.log(f"[clean_nulls] comments: {n_na} → ''", "info")
 
         # --- Red de seguridad: completa cualquier NaN residual por tipo ---
-        def fill_all_nulls(df, name):
-            changed = {}
-            for c in df.columns:
-                if df[c].isna().any():
-                    n_na = df[c].isna().sum()
-                    if pd.api.types.is_numeric_dtype(df[c]):
-                        med = pd.to_numeric(df[c], errors='coerce').median()
-                        df[c] = pd.to_numeric(df[c], errors='coerce').fillna(med)
-                        changed[c] = f"num→mediana({med}) {n_na}"
-                    elif pd.api.types.is_bool_dtype(df[c]):
-                        df[c] = df[c].fillna(False)
-                        changed[c] = f"bool→False {n_na}"
-                    elif pd.api.types.is_datetime64_any_dtype(df[c]):
-                        df[c] = df[c].fillna(pd.Timestamp('1970-01-01T00:00:00Z'))
-                        changed[c] = f"datetime→1970 {n_na}"
-                    elif df[c].apply(lambda x: isinstance(x, list)).any():
-                        df[c] = df[c].apply(lambda x: [] if pd.isna(x) else x)
-                        changed[c] = f"list→[] {n_na}"
-                    else:
-                        df[c] = df[c].astype(object).fillna('unknown')
-                        changed[c] = f"str→'unknown' {n_na}"
-            if changed:
-                self.logs.log(f"[clean_nulls] Red de seguridad {name}: {changed}", "info")
-            return df
-
-        self.listings = fill_all_nulls(self.listings, "listings")
-        self.calendar = fill_all_nulls(self.calendar, "calendar")
-        self.reviews  = fill_all_nulls(self.reviews,  "reviews")
+        self.listings = self._fill_residual_nulls(self.listings, "listings")
+        self.calendar = self._fill_residual_nulls(self.calendar, "calendar")
+        self.reviews  = self._fill_residual_nulls(self.reviews,  "reviews")
 
         # --- Resumen final de limpieza ---
         self.logs.log(
@@ -624,6 +872,46 @@ class Transformation:
         )
         return self
 
+    def _fill_residual_nulls(self, df: pd.DataFrame, name: str) -> pd.DataFrame:
+        """
+        Red de seguridad de clean_nulls: un solo perfil de nulos (isna().sum()) para todo df y
+        relleno solo de las columnas con nulos, según su tipo lógico (dtype o registro self.tipos;
+        las columnas nuevas se infieren de una muestra y se agregan al registro). Las fechas rellenadas
+        se quitan de self._fechas.
+        """
+        tipos = self.tipos.setdefault(name, {})
+        changed = {}
+        for c, n_na in plan_tipos.perfil_nulos(df).items():
+            tipo = plan_tipos.tipo_por_dtype(df[c])
+            if tipo is None:
+                tipo = tipos.get(c) if tipos.get(c) in ('lista', 'texto') else None
+                tipo = tipos[c] = tipo or plan_tipos.tipo_logico(df[c])
+            if tipo == 'num':
+                num = pd.to_numeric(df[c], errors='coerce')
+                med = num.median()
+                df[c] = num.fillna(med)
+                changed[c] = f"num→mediana({med}) {n_na}"
+            elif tipo == 'bool':
+                df[c] = df[c].fillna(False)
+                changed[c] = f"bool→False {n_na}"
+            elif tipo == 'fecha':
+                df[c] = df[c].fillna(pd.Timestamp('1970-01-01T00:00:00Z'))
+                # El parseo guardado por _to_date aún tiene NaT en estas filas: _fecha debe volver a parsear
+                self._fechas.pop((name, c), None)
+                changed[c] = f"datetime→1970 {n_na}"
+            elif tipo == 'lista':
+                s = df[c].astype(object)
+                for i in np.flatnonzero(s.isna().to_numpy()):
+                    s.iat[i] = []
+                df[c] = s
+                changed[c] = f"list→[] {n_na}"
+            else:
+                df[c] = df[c].astype(object).fillna('unknown')
+                changed[c] = f"str→'unknown' {n_na}"
+        if changed:
+            self.logs.log(f"[clean_nulls] Red de seguridad {name}: {changed}", "info")
+        return df
+
     # ---------------------------------------------------------------------
     # 3) Rasgos de fecha y buckets de precio
     # ---------------------------------------------------------------------
@@ -647,7 +935,7 @@ class Transformation:
 
         # Partes de fecha
         if 'date' in self.calendar.columns:
-            dt = pd.to_datetime(self.calendar['date'], errors='coerce', utc=True)
+            dt = self._fecha('calendar', 'date')
             self.calendar['year']       = dt.dt.year
             self.calendar['month']      = dt.dt.month
             self.calendar['day']        = dt.dt.day
@@ -656,6 +944,8 @@ class Transformation:
             self.calendar['week_of_month'] = (
                 ((dt.dt.day - 1) // 7 + 1)
             )
+            # Último uso de la fecha parseada de calendar: se libera (es del tamaño de calendar)
+            self._fechas.pop(('calendar', 'date'), None)
 
         # Buckets de precio
         default_labels = ['Very Low','Low','Medium','High','Very High']
@@ -682,6 +972,39 @@ class Transformation:
         self.logs.log(f"[derive_features] Fin | {self._shape_str()}", "info")
         return self
 
+    def build_calendar_matrix(self, directorio=None):
+        """
+        Propósito:
+          - Representación compacta del calendar como matriz listing × día (CalendarioDenso) para
+            consultas de ocupación, noches reservadas e ingresos por ventana de fechas y listings.
+
+        Transformaciones:
+          - Índice de listings (ordenado) e índice de días consecutivos.
+          - available y presencia de la celda → bitmaps empaquetados; price_num → float32;
+            minimum/maximum_nights → int16.
+          - directorio: matrices .npy memory-mapped en disco en lugar de RAM.
+          - Reutiliza la fecha parseada de calendar (_fecha); se llama después de clean_nulls.
+
+        Logs:
+          - Forma de la matriz y memoria frente al calendar en formato largo.
+
+        Retorna:
+          - self (self.calendar_matrix)
+        """
+        directorio = directorio or self.calendario_denso_dir
+        if not {'listing_id', 'date'}.issubset(self.calendar.columns):
+            self.logs.log("[build_calendar_matrix] calendar SIN listing_id/date → no se construye la matriz", "warning")
+            return self
+        self.calendar_matrix = CalendarioDenso.desde_largo(self.calendar, self._fecha('calendar', 'date'), directorio)
+        n, m = self.calendar_matrix.shape
+        self.logs.log(
+            f"[build_calendar_matrix] listings={n} × días={m} desde {self.calendar_matrix.inicio} | "
+            f"MB={self.calendar_matrix.memoria_mb():,.1f} (calendar largo={plan_tipos.memoria_mb(self.calendar):,.1f})"
+            f"{f' | memory-map en {directorio}' if directorio else ''}",
+            "info"
+        )
+        return self
+
     # ---------------------------------------------------------------------
     # 4) Expandir campos anidados (amenities/verifications)
     # ---------------------------------------------------------------------
@@ -690,14 +1013,19 @@ class Transformation:
         Propósito:
           - Convertir 'amenities' y 'host_verifications' a columnas dummies,
             usando un conjunto curado (evita explosión de columnas).
+          - Con amenities_completas=True conserva además el vocabulario completo de amenities
+            fuera de la sábana: self.amenities_long (listing_id, amenity) y self.amenities_sparse
+            (matriz dispersa listing × amenity).
 
         Transformaciones:
           - Forzar listas válidas.
-          - Normalizar a 'slugs' y crear dummies 'amenities_*' y 'host_verifications_*'.
+          - Una sola explosión a forma larga (fila, slug) por campo; slugs por valor único.
+          - Dummies 'amenities_*' y 'host_verifications_*' en una sola asignación sobre la matriz
+            (columnas en el orden de la lista curada).
           - Eliminar columnas originales anidadas.
 
         Logs:
-          - Cantidad de columnas nuevas creadas por cada grupo.
+          - Cantidad de columnas nuevas creadas por cada grupo (y tamaño del vocabulario completo).
 
         Retorna:
           - self
@@ -715,63 +1043,61 @@ class Transformation:
         ]
         verifications_keep = ["phone", "email", "work_email"]
 
-        import ast
         df = self.listings
 
-        def safe_slug(x: str) -> str:
-            x = unicodedata.normalize('NFKD', str(x)).encode('ascii', 'ignore').decode('ascii')
-            return re.sub(r'[^0-9a-zA-Z]+', '_', x).strip('_').lower()
-
-        am_keep = set(safe_slug(a) for a in (amenities_keep or []))
-        vr_keep = set(safe_slug(v) for v in (verifications_keep or []))
-
-        # Asegurar listas
-        for col in ['amenities', 'host_verifications']:
-            if col in df.columns:
-                def to_list(x):
-                    if isinstance(x, list): return x
-                    if isinstance(x, str) and x.strip().startswith('['):
-                        try: return ast.literal_eval(x)
-                        except: return []
-                    if pd.isna(x) or x == '': return []
-                    return [str(x)]
-                df[col] = df[col].apply(to_list)
-
-        # Dummies de amenities (subset)
-        new_am_cols = []
-        if 'amenities' in df.columns and am_keep:
-            am_col_slugs = df['amenities'].apply(lambda lst: set(safe_slug(x) for x in lst if isinstance(x, str)))
-            for a_slug in am_keep:
-                col_name = f"amenities_{a_slug}"
-                df[col_name] = am_col_slugs.apply(lambda s: int(a_slug in s))
-                new_am_cols.append(col_name)
-            df.drop(columns=['amenities'], inplace=True, errors='ignore')
-
-        # Dummies de verifications (subset)
-        new_vr_cols = []
-        if 'host_verifications' in df.columns and vr_keep:
-            vr_col_slugs = df['host_verifications'].apply(lambda lst: set(safe_slug(x) for x in lst if isinstance(x, str)))
-            for v_slug in vr_keep:
-                col_name = f"host_verifications_{v_slug}"
-                df[col_name] = vr_col_slugs.apply(lambda s: int(v_slug in s))
-                new_vr_cols.append(col_name)
-            df.drop(columns=['host_verifications'], inplace=True, errors='ignore')
+        # slugs curados por valor único (caché compartida 'slug'), sin repetir y en orden
+        def safe_slug(values) -> list:
+            return list(dict.fromkeys(self._slug(pd.Series(list(values), dtype=object))))
+
+        keep = {'amenities': safe_slug(amenities_keep or []),
+                'host_verifications': safe_slug(verifications_keep or [])}
+
+        new_cols = {}
+        for col, slugs in keep.items():
+            if col not in df.columns or not slugs:
+                new_cols[col] = []
+                continue
+            long = self._slug_long(self._as_lists(df[col]))
+            dummies = self._dummies(long, len(df), slugs, col)
+            dummies.index = df.index
+            new_cols[col] = list(dummies.columns)
+
+            if col == 'amenities' and self.amenities_completas:
+                ids = df['id'] if 'id' in df.columns else pd.Series(df.index, index=df.index)
+                self.amenities_long = pd.DataFrame({'listing_id': ids.to_numpy()[long['pos'].to_numpy()],
+                                                    'amenity': long['slug'].to_numpy()})
+                self.amenities_sparse = self._sparse_matrix(long, pd.Index(ids.to_numpy(), name='listing_id'), col)
+                self.logs.log(f"[expand_nested_fields] Vocabulario completo de amenities: "
+                              f"{self.amenities_sparse.shape[1]} | pares listing-amenity={len(long)}", "info")
+
+            df = pd.concat([df.drop(columns=[col] + [c for c in dummies.columns if c in df.columns]), dummies],
+                           axis=1)
 
         self.listings = df
         self.logs.log(
-            f"[expand_nested_fields] Fin | amenities={len(new_am_cols)} verifications={len(new_vr_cols)}",
+            f"[expand_nested_fields] Fin | amenities={len(new_cols['amenities'])} "
+            f"verifications={len(new_cols['host_verifications'])}",
             "info"
         )
         return self
 
     # ----------------- Fechas de review e imputación de precio -----------------
 
+    def _resumen_sin_reviews(self):
+        """Filas de review_summary de los listings sin reviews en self.reviews (None si no hay resumen)."""
+        rs = self.review_summary
+        if rs is None or 'listing_id' not in rs.columns:
+            return None
+        if {'listing_id', 'date'}.issubset(self.reviews.columns):
+            rs = rs[~rs['listing_id'].isin(self.reviews['listing_id'])]
+        return rs
+
     def _fill_review_dates(self):
         """
         Propósito:
           - Completar first_review/last_review de listings con:
-            1) min/max en reviews, 2) rango en calendar, 3) last_scraped,
-            4) fallback '1970-01-01'.
+            1) min/max en reviews (o review_summary), 2) rango en calendar (o rango_calendar),
+            3) last_scraped, 4) fallback '1970-01-01'.
 
         Logs:
           - Conteo por fuente (reviews/calendar/last_scraped/fallback) para first/last.
@@ -785,24 +1111,40 @@ class Transformation:
         cal = self.calendar
         rev = self.reviews
 
-        # Fechas desde reviews
+        # Fechas desde reviews y/o desde el resumen por listing-mes calculado en Mongo
+        grp = None
         if 'listing_id' in rev.columns and 'date' in rev.columns:
-            rdt = pd.to_datetime(rev['date'], errors='coerce', utc=True)
+            rdt = self._fecha('reviews', 'date')
             grp = (rev.assign(_dt=rdt).groupby('listing_id')['_dt'].agg(['min','max']).reset_index())
-            grp['first_review_from_rev'] = grp['min'].dt.strftime('%Y-%m-%d')
-            grp['last_review_from_rev']  = grp['max'].dt.strftime('%Y-%m-%d')
+        rs = self._resumen_sin_reviews()
+        if rs is not None and {'min_fecha','max_fecha'}.issubset(rs.columns):
+            grp_rs = (rs.assign(_min=self._parse_dates_vectorized(rs['min_fecha']),
+                                _max=self._parse_dates_vectorized(rs['max_fecha']))
+                        .groupby('listing_id').agg(min=('_min','min'), max=('_max','max')).reset_index())
+            grp = grp_rs if grp is None else pd.concat([grp, grp_rs], ignore_index=True)
+        if grp is not None:
+            grp['first_review_from_rev'] = self._as_output_date(grp['min'])
+            grp['last_review_from_rev']  = self._as_output_date(grp['max'])
             m1_first = grp.set_index('listing_id')['first_review_from_rev']
             m1_last  = grp.set_index('listing_id')['last_review_from_rev']
         else:
             m1_first = pd.Series(dtype=object)
             m1_last  = pd.Series(dtype=object)
 
-        # Rango desde calendar
+        # Rango desde calendar (el del calendar completo para los listings de rango_calendar)
         if 'listing_id' in cal.columns and 'date' in cal.columns:
-            cdt = pd.to_datetime(cal['date'], errors='coerce', utc=True)
+            cdt = self._fecha('calendar', 'date')
             cgrp = (cal.assign(_dt=cdt).groupby('listing_id')['_dt'].agg(['min','max']).reset_index())
-            cgrp['first_review_from_cal'] = cgrp['min'].dt.strftime('%Y-%m-%d')
-            cgrp['last_review_from_cal']  = cgrp['max'].dt.strftime('%Y-%m-%d')
+            rc = self.rango_calendar
+            if rc is not None and len(rc):
+                rc = rc.reset_index(drop=True)
+                cgrp = pd.concat([cgrp[~cgrp['listing_id'].isin(rc['listing_id'])],
+                                  pd.DataFrame({'listing_id': rc['listing_id'],
+                                                'min': self._parse_dates_vectorized(rc['min_fecha']),
+                                                'max': self._parse_dates_vectorized(rc['max_fecha'])})],
+                                 ignore_index=True)
+            cgrp['first_review_from_cal'] = self._as_output_date(cgrp['min'])
+            cgrp['last_review_from_cal']  = self._as_output_date(cgrp['max'])
             m2_first = cgrp.set_index('listing_id')['first_review_from_cal']
             m2_last  = cgrp.set_index('listing_id')['last_review_from_cal']
         else:
@@ -840,7 +1182,7 @@ class Transformation:
             # 4) fallback fijo
             mask = (lst[colname].isna()) | (lst[colname].astype(str).str.strip() == '')
             src_counts[f"fallback_{src_prefix}"] += int(mask.sum())
-            lst.loc[mask, colname] = '1970-01-01'
+            lst.loc[mask, colname] = self._date_fill_value('1970-01-01')
 
         _fill_by_map('first_review', m1_first, m2_first, 'first')
         _fill_by_map('last_review',  m1_last,  m2_last,  'last')
@@ -932,40 +1274,57 @@ class Transformation:
     # ---------------------------------------------------------------------
     # 5) Construcción de la sábana
     # ---------------------------------------------------------------------
-    def build_flat_sheet(self):
+    def _add_daily_measures(self, cal):
         """
         Propósito:
-          - Unir calendar con atributos de listing imputados y agregar reviews/mes.
-          - Derivar booked_night y daily_revenue.
+          - Medidas diarias sobre un bloque de calendar (se modifica en sitio).
 
         Transformaciones:
           - booked_night = ~available; daily_revenue = booked_night * price_num.
-          - Dimensión de listing: renombrar id → listing_id y price_num → listing_price_num.
-          - Join calendar ← listings_dim por listing_id (alineando tipos).
-          - reviews_in_month: conteo por (listing_id, year, month).
-          - Garantías de no-nulo: reviews_in_month→0; first/last_review→'1970-01-01';
-            listing_price_num→mediana; price_bucket→'Medium'.
-          - Reordenar columnas clave al frente.
-
-        Logs:
-          - Inicio/fin, tamaño de resultado, columnas añadidas, normalizaciones.
 
         Retorna:
-          - self
+          - cal
         """
-        self.logs.log("[build_flat_sheet] Inicio", "info")
-
-        cal = self.calendar.copy()
-        lst = self.listings.copy()
-        rev = self.reviews.copy()
-
-        # Medidas diarias
         if 'available' in cal.columns:
             cal['booked_night'] = (~cal['available']).astype(int)
         else:
             cal['booked_night'] = np.nan
         if 'price_num' in cal.columns:
             cal['daily_revenue'] = cal['booked_night'] * cal['price_num']
+        return cal
+
+    def _is_int_key(self, s: pd.Series) -> bool:
+        """True si la clave es entera (o float sin NaN ni decimales) y puede unirse como int64."""
+        if pd.api.types.is_integer_dtype(s.dtype):
+            return True
+        if pd.api.types.is_float_dtype(s.dtype) and not s.hasnans:
+            v = s.to_numpy()
+            return bool(np.array_equal(v, np.floor(v)))
+        return False
+
+    def _join_key(self, s: pd.Series) -> pd.Series:
+        """Clave de join de listing_id: int64 si todas las fuentes son enteras, si no str."""
+        return s.astype('int64') if self._int_keys else s.astype(str)
+
+    def _flat_sheet_inputs(self):
+        """
+        Propósito:
+          - Preparar lo que comparten todos los bloques de la sábana (se calcula una sola vez).
+
+        Transformaciones:
+          - Imputar precios/buckets de listings (_impute_listing_prices_and_buckets).
+          - Dimensión de listing: whitelist + dummies; id → listing_id, price_num → listing_price_num.
+          - Clave de join listing_id: int64 si listings/calendar/reviews la traen entera, si no str.
+          - Plan de tipos 'listings_dim' (categóricas e int8), que el join hereda a la sábana.
+          - reviews_in_month: conteo por (listing_id, rev_year, rev_month) sin copiar reviews,
+            o tomado de review_summary (n > 0) si la transformación recibió el resumen.
+
+        Retorna:
+          - (lst_dim, rmon); rmon es None si no hay reviews con listing_id/date ni resumen.
+        """
+        # Imputar precios/buckets antes del join
+        self._impute_listing_prices_and_buckets()
+        lst = self.listings
 
         # Dummies ya expandidos
         amen_cols  = [c for c in lst.columns if c.startswith('amenities_')]
@@ -984,38 +1343,59 @@ class Transformation:
             'availability_30','availability_60','availability_90','availability_365','number_of_reviews','number_of_reviews_ltm',
             'number_of_reviews_l30d','number_of_reviews_ly','first_review','last_review'
         ]
-        keep = [c for c in (base_keep + amen_cols + verif_cols) if c in lst.columns]
-
-        # Imputar precios/buckets antes del join
-        self._impute_listing_prices_and_buckets()
 
         # Dimensión de listing para join
-        lst = self.listings
         keep = [c for c in (base_keep + amen_cols + verif_cols) if c in lst.columns]
         lst_dim = lst[keep].rename(columns={'id':'listing_id', 'price_num':'listing_price_num'})
 
+        rev = self.reviews
+        sources = [lst_dim['listing_id']] + [df['listing_id'] for df in (self.calendar, rev, self.review_summary)
+                                             if df is not None and 'listing_id' in df.columns]
+        self._int_keys = all(self._is_int_key(s) for s in sources)
+        lst_dim['listing_id'] = self._join_key(lst_dim['listing_id'])
+        if self.plan_tipos:
+            plan_tipos.aplicar_con_reporte(lst_dim, 'listings_dim', 'listings_dim', self.logs)
+
+        # Reviews por mes (de reviews y, para los listings sin reviews, del resumen)
+        rmon = None
+        if {'listing_id','date'}.issubset(rev.columns):
+            rdt = self._fecha('reviews', 'date')
+            rmon = (pd.DataFrame({'listing_id': self._join_key(rev['listing_id']),
+                                  'rev_year': rdt.dt.year, 'rev_month': rdt.dt.month})
+                      .groupby(['listing_id','rev_year','rev_month']).size()
+                      .reset_index(name='reviews_in_month'))
+        rs = self._resumen_sin_reviews()
+        if rs is not None and {'year','month','n'}.issubset(rs.columns):
+            # n cuenta solo reviews con id (las mismas que deja clean_nulls)
+            rs = rs[rs['n'] > 0]
+            rmon_rs = (pd.DataFrame({'listing_id': self._join_key(rs['listing_id']),
+                                     'rev_year': rs['year'].astype('int64'), 'rev_month': rs['month'].astype('int64'),
+                                     'reviews_in_month': rs['n'].astype('int64')})
+                         .groupby(['listing_id','rev_year','rev_month'])['reviews_in_month'].sum()
+                         .reset_index())
+            rmon = rmon_rs if rmon is None else pd.concat([rmon, rmon_rs], ignore_index=True)
+        return lst_dim, rmon
+
+    def _flat_chunk(self, cal, lst_dim, rmon, med_lp=None):
+        """
+        Propósito:
+          - Construir la sábana de un bloque de calendar (completo o una partición de listings).
+          - cal debe ser una copia propia del llamador: se modifica en sitio.
+          - med_lp: mediana de relleno de listing_price_num; None → mediana del propio bloque.
+
+        Retorna:
+          - (flat, stats) con los conteos de normalización para el log.
+        """
+        self._add_daily_measures(cal)
+        stats = {}
+
         # Join calendar ← listings_dim
-        if 'listing_id' not in cal.columns:
-            self.flat_sheet = cal.copy()
-            self.logs.log("[build_flat_sheet] calendar SIN listing_id → se devuelve calendar sin join", "warning")
-            return self
-        lst_dim['listing_id'] = lst_dim['listing_id'].astype(str)
-        cal['listing_id'] = cal['listing_id'].astype(str)
-        before_join_rows = len(cal)
+        cal['listing_id'] = self._join_key(cal['listing_id'])
         flat = cal.merge(lst_dim, on='listing_id', how='left')
-        self.logs.log(
-            f"[build_flat_sheet] Join: filas calendar={before_join_rows} | "
-            f"resultado={len(flat)} | col_listings_dim={len(lst_dim.columns)-1}",
-            "info"
-        )
+        stats['join'] = (len(cal), len(flat))
+        del cal
 
-        # Reviews por mes
-        if 'date' in rev.columns:
-            rdt = pd.to_datetime(rev['date'], errors='coerce', utc=True)
-            rev['rev_year'], rev['rev_month'] = rdt.dt.year, rdt.dt.month
-        if {'listing_id','rev_year','rev_month'}.issubset(rev.columns) and {'year','month'}.issubset(flat.columns):
-            rev['listing_id'] = rev['listing_id'].astype(str)
-            rmon = (rev.groupby(['listing_id','rev_year','rev_month']).size().reset_index(name='reviews_in_month'))
+        if rmon is not None and {'year','month'}.issubset(flat.columns):
             flat = flat.merge(rmon, left_on=['listing_id','year','month'],
                               right_on=['listing_id','rev_year','rev_month'], how='left')
             flat.drop(columns=[c for c in ['rev_year','rev_month'] if c in flat.columns], inplace=True)
@@ -1024,68 +1404,467 @@ class Transformation:
 
         # Garantías de no-nulo
         if 'reviews_in_month' in flat.columns:
-            n_na = flat['reviews_in_month'].isna().sum()
+            stats['reviews_in_month'] = flat['reviews_in_month'].isna().sum()
             flat['reviews_in_month'] = flat['reviews_in_month'].fillna(0).astype(int)
-            if n_na:
-                self.logs.log(f"[build_flat_sheet] reviews_in_month: {n_na} → 0", "info")
 
         for c in ['first_review','last_review']:
             if c in flat.columns:
-                mask = (flat[c].isna()) | (flat[c].astype(str).str.strip() == '')
-                n_fill = mask.sum()
-                flat.loc[mask, c] = '1970-01-01'
-                if n_fill:
-                    self.logs.log(f"[build_flat_sheet] {c}: vacíos→'1970-01-01' ({n_fill})", "info")
+                mask = self._blank_mask(flat[c])
+                stats[c] = mask.sum()
+                self._fill_masked(flat, c, mask, self._date_fill_value('1970-01-01'))
 
         if 'listing_price_num' in flat.columns:
-            med_lp = pd.to_numeric(flat['listing_price_num'], errors='coerce').median()
-            n_na = flat['listing_price_num'].isna().sum()
-            flat['listing_price_num'] = pd.to_numeric(flat['listing_price_num'], errors='coerce').fillna(med_lp)
-            if n_na:
-                self.logs.log(f"[build_flat_sheet] listing_price_num: {n_na} → mediana={med_lp}", "info")
+            lp = pd.to_numeric(flat['listing_price_num'], errors='coerce')
+            if med_lp is None:
+                med_lp = lp.median()
+            stats['listing_price_num'] = (flat['listing_price_num'].isna().sum(), med_lp)
+            flat['listing_price_num'] = lp.fillna(med_lp)
 
         if 'price_bucket' in flat.columns:
-            n_na = flat['price_bucket'].isna().sum()
-            flat['price_bucket'] = flat['price_bucket'].astype(object).fillna('Medium')
-            if n_na:
-                self.logs.log(f"[build_flat_sheet] price_bucket: {n_na} → 'Medium'", "info")
+            stats['price_bucket'] = flat['price_bucket'].isna().sum()
+            if isinstance(flat['price_bucket'].dtype, pd.CategoricalDtype):
+                self._fill_masked(flat, 'price_bucket', flat['price_bucket'].isna(), 'Medium')
+            else:
+                flat['price_bucket'] = flat['price_bucket'].astype(object).fillna('Medium')
+
+        if self.plan_tipos:
+            plan_tipos.aplicar_tipos(flat, 'flat')
 
-        # Ordenar columnas clave primero
+        return flat[self._flat_column_order(flat.columns)], stats
+
+    def _flat_column_order(self, cols) -> list:
+        """Orden de columnas de la sábana: columnas clave primero y el resto en su orden original."""
         front = ['listing_id','date','year','month','day','quarter','weekday','is_weekend',
                  'price_num','daily_price_bucket','available','booked_night','daily_revenue']
-        front = [c for c in front if c in flat.columns]
-        others = [c for c in flat.columns if c not in front]
-        self.flat_sheet = flat[front + others]
+        front = [c for c in front if c in cols]
+        return front + [c for c in cols if c not in front]
+
+    def _blank_mask(self, s: pd.Series) -> pd.Series:
+        """NaN o texto vacío; en categóricas se evalúa solo sobre las categorías."""
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            cats = s.cat.categories
+            return s.isna() | s.isin(cats[cats.astype(str).str.strip() == ''])
+        return (s.isna()) | (s.astype(str).str.strip() == '')
+
+    def _fill_masked(self, df: pd.DataFrame, col: str, mask: pd.Series, value):
+        """df.loc[mask, col] = value, agregando la categoría si la columna es categórica."""
+        if not mask.any():
+            return
+        if isinstance(df[col].dtype, pd.CategoricalDtype) and value not in df[col].cat.categories:
+            df[col] = df[col].cat.add_categories([value])
+        df.loc[mask, col] = value
+
+    def _log_flat_stats(self, stats, n_dim_cols):
+        """
+        Propósito:
+          - Registrar join y normalizaciones de la sábana (mismo formato en modo completo y por bloques).
+        """
+        rows_cal, rows_flat = stats.get('join', (0, 0))
+        self.logs.log(
+            f"[build_flat_sheet] Join: filas calendar={rows_cal} | "
+            f"resultado={rows_flat} | col_listings_dim={n_dim_cols}",
+            "info"
+        )
+        if stats.get('reviews_in_month'):
+            self.logs.log(f"[build_flat_sheet] reviews_in_month: {stats['reviews_in_month']} → 0", "info")
+        for c in ['first_review','last_review']:
+            if stats.get(c):
+                self.logs.log(f"[build_flat_sheet] {c}: vacíos→'1970-01-01' ({stats[c]})", "info")
+        if 'listing_price_num' in stats and stats['listing_price_num'][0]:
+            n_na, med_lp = stats['listing_price_num']
+            self.logs.log(f"[build_flat_sheet] listing_price_num: {n_na} → mediana={med_lp}", "info")
+        if stats.get('price_bucket'):
+            self.logs.log(f"[build_flat_sheet] price_bucket: {stats['price_bucket']} → 'Medium'", "info")
+
+    def build_flat_sheet(self):
+        """
+        Propósito:
+          - Unir calendar con atributos de listing imputados y agregar reviews/mes.
+          - Derivar booked_night y daily_revenue.
 
+        Transformaciones:
+          - booked_night = ~available; daily_revenue = booked_night * price_num.
+          - Dimensión de listing: renombrar id → listing_id y price_num → listing_price_num.
+          - Join calendar ← listings_dim por listing_id (alineando tipos).
+          - reviews_in_month: conteo por (listing_id, year, month).
+          - Garantías de no-nulo: reviews_in_month→0; first/last_review→'1970-01-01';
+            listing_price_num→mediana; price_bucket→'Medium'.
+          - Reordenar columnas clave al frente.
+
+        Logs:
+          - Inicio/fin, tamaño de resultado, columnas añadidas, normalizaciones.
+
+        Retorna:
+          - self
+        """
+        self.logs.log("[build_flat_sheet] Inicio", "info")
+
+        lst_dim, rmon = self._flat_sheet_inputs()
+
+        if 'listing_id' not in self.calendar.columns:
+            self.flat_sheet = self._add_daily_measures(self.calendar.copy())
+            self.logs.log("[build_flat_sheet] calendar SIN listing_id → se devuelve calendar sin join", "warning")
+            return self
+
+        self.flat_sheet, stats = self._flat_chunk(self.calendar.copy(), lst_dim, rmon)
+        self._log_flat_stats(stats, len(lst_dim.columns) - 1)
+
+        if self.plan_tipos:
+            self.logs.log(f"[plan_tipos] flat_sheet: {plan_tipos.memoria_mb(self.flat_sheet):,.1f} MB "
+                          f"| dtypes={self.flat_sheet.dtypes.astype(str).value_counts().to_dict()}", "info")
         self.logs.log(f"[build_flat_sheet] Fin | flat_sheet={self.flat_sheet.shape}", "info")
         return self
 
+    def iter_flat_sheet(self, listings_per_chunk=2000):
+        """
+        Propósito:
+          - Variante por bloques de build_flat_sheet: la memoria pico depende del tamaño del bloque
+            y no del calendar completo (la sábana nunca se materializa entera).
+          - Cada bloque contiene todas las filas de calendar de hasta listings_per_chunk listings,
+            así que reviews_in_month y las garantías por fila coinciden con la sábana completa.
+
+        Transformaciones:
+          - Las mismas que build_flat_sheet. La mediana de relleno de listing_price_num se calcula
+            una vez sobre todas las filas de calendar (igual que en la sábana completa).
+          - Orden de filas: agrupado por listing_id (estable dentro de cada listing).
+
+        Logs:
+          - Inicio/fin, tamaño de cada bloque y normalizaciones acumuladas.
+
+        Retorna:
+          - Generador de pd.DataFrame (self.flat_sheet queda en None).
+        """
+        self.logs.log(f"[iter_flat_sheet] Inicio | listings_por_bloque={listings_per_chunk}", "info")
+        self.flat_sheet = None
+
+        lst_dim, rmon = self._flat_sheet_inputs()
+        cal = self.calendar
+
+        if 'listing_id' not in cal.columns:
+            self.logs.log("[build_flat_sheet] calendar SIN listing_id → se devuelve calendar sin join", "warning")
+            yield self._add_daily_measures(cal.copy())
+            return
+
+        # Partición por listing: códigos ordenados + límites por búsqueda binaria (sin copiar calendar)
+        codes, uniques = pd.factorize(cal['listing_id'], sort=True)
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        n_chunks = max(1, -(-len(uniques) // listings_per_chunk))
+        starts = np.searchsorted(sorted_codes, np.arange(n_chunks) * listings_per_chunk, side='left')
+        starts[0] = 0
+        ends = np.append(starts[1:], len(order))
+
+        # Mediana global de listing_price_num ponderada por filas de calendar
+        med_lp = None
+        if 'listing_price_num' in lst_dim.columns:
+            lp_by_id = (pd.to_numeric(lst_dim['listing_price_num'], errors='coerce')
+                          .groupby(lst_dim['listing_id']).first())
+            lp_codes = lp_by_id.reindex(self._join_key(pd.Series(uniques))).to_numpy()
+            med_lp = pd.Series(lp_codes[codes[codes >= 0]]).median()
+
+        total = {}
+        for i, (a, b) in enumerate(zip(starts, ends), start=1):
+            with perfilado.etapa("transformacion.flat_chunk", int(b - a)) as reg:
+                flat, stats = self._flat_chunk(cal.take(order[a:b]).reset_index(drop=True), lst_dim, rmon, med_lp)
+                reg["filas_salida"] = flat
+            for k, v in stats.items():
+                if k == 'join':
+                    prev = total.get(k, (0, 0))
+                    total[k] = (prev[0] + v[0], prev[1] + v[1])
+                elif k == 'listing_price_num':
+                    total[k] = (total.get(k, (0, med_lp))[0] + v[0], med_lp)
+                else:
+                    total[k] = total.get(k, 0) + v
+            mem = f" | MB={plan_tipos.memoria_mb(flat):,.1f}" if self.plan_tipos else ""
+            self.logs.log(f"[iter_flat_sheet] Bloque {i}/{n_chunks} | filas={len(flat)}{mem}", "info")
+            yield flat
+            del flat
+
+        self._log_flat_stats(total, len(lst_dim.columns) - 1)
+        self.logs.log(f"[iter_flat_sheet] Fin | bloques={n_chunks} | filas={total.get('join', (0, 0))[1]}", "info")
+
+    def build_star_schema(self):
+        """
+        Propósito:
+          - Alternativa a build_flat_sheet para la carga en esquema estrella: los atributos de listing
+            se guardan una vez por listing y no una vez por día de calendar.
+          - La sábana se reconstruye en SQL con una vista (Carga.crear_vista_sabana) usando star_columns.
+
+        Transformaciones:
+          - dim_listing: la dimensión de listing de la sábana (whitelist + dummies), con una fila vacía
+            por cada listing_id que solo aparece en calendar (en la sábana esas filas quedan sin atributos).
+          - Garantías de no-nulo de la sábana aplicadas en la dimensión: first/last_review→'1970-01-01';
+            listing_price_num→mediana sobre las filas de calendar; price_bucket→'Medium'.
+          - fact_calendar_day: calendar con booked_night y daily_revenue (fecha, partes de fecha, precio, disponibilidad).
+          - fact_reviews_month: conteo de reviews por (listing_id, year, month); sin reviews queda en None
+            y la vista usa reviews_in_month = 0.
+          - Plan de tipos 'flat' en las tres tablas (mismos tipos SQLite que la sábana).
+
+        Logs:
+          - Inicio/fin, filas de cada tabla y listings solo en calendar.
+
+        Retorna:
+          - self (self.star_schema = {tabla: DataFrame}, self.star_columns = columnas de la sábana en orden)
+        """
+        self.logs.log("[build_star_schema] Inicio", "info")
+
+        if 'listing_id' not in self.calendar.columns:
+            raise ValueError("[build_star_schema] calendar SIN listing_id: no se puede construir el esquema estrella")
+
+        lst_dim, rmon = self._flat_sheet_inputs()
+        fact = self._add_daily_measures(self.calendar.copy())
+        fact['listing_id'] = self._join_key(fact['listing_id'])
+
+        # Listings que solo aparecen en calendar: fila de dimensión sin atributos
+        solo_calendar = pd.Index(fact['listing_id'].unique()).difference(pd.Index(lst_dim['listing_id']))
+        if len(solo_calendar):
+            vacias = lst_dim.iloc[:0].reindex(range(len(solo_calendar)))
+            vacias['listing_id'] = solo_calendar.to_numpy()
+            lst_dim = pd.concat([lst_dim, vacias], ignore_index=True)
+
+        for c in ['first_review','last_review']:
+            if c in lst_dim.columns:
+                self._fill_masked(lst_dim, c, self._blank_mask(lst_dim[c]), self._date_fill_value('1970-01-01'))
+
+        if 'listing_price_num' in lst_dim.columns:
+            lp = pd.to_numeric(lst_dim['listing_price_num'], errors='coerce')
+            lp_by_id = lp.groupby(lst_dim['listing_id']).first()
+            med_lp = fact['listing_id'].map(lp_by_id).median()
+            lst_dim['listing_price_num'] = lp.fillna(med_lp)
+
+        if 'price_bucket' in lst_dim.columns:
+            if isinstance(lst_dim['price_bucket'].dtype, pd.CategoricalDtype):
+                self._fill_masked(lst_dim, 'price_bucket', lst_dim['price_bucket'].isna(), 'Medium')
+            else:
+                lst_dim['price_bucket'] = lst_dim['price_bucket'].astype(object).fillna('Medium')
+
+        if rmon is not None:
+            rmon = rmon.rename(columns={'rev_year': 'year', 'rev_month': 'month'})
+            rmon[['year', 'month']] = rmon[['year', 'month']].astype('int64')
+
+        if self.plan_tipos:
+            for df in (lst_dim, fact, rmon):
+                if df is not None:
+                    plan_tipos.aplicar_tipos(df, 'flat')
+
+        fact = fact[self._flat_column_order(fact.columns)]
+        self.star_schema = {'dim_listing': lst_dim, 'fact_calendar_day': fact, 'fact_reviews_month': rmon}
+        self.star_columns = self._flat_column_order(
+            list(fact.columns) + [c for c in lst_dim.columns if c != 'listing_id'] + ['reviews_in_month'])
+
+        self.logs.log(
+            f"[build_star_schema] Fin | dim_listing={lst_dim.shape} (solo en calendar={len(solo_calendar)}) | "
+            f"fact_calendar_day={fact.shape} | fact_reviews_month={None if rmon is None else rmon.shape} | "
+            f"columnas sábana={len(self.star_columns)}",
+            "info"
+        )
+        return self
+
     # ---------------------------------------------------------------------
     # 6) Pipeline completo
     # ---------------------------------------------------------------------
-    def run(self, price_mode='quantile', price_bins=None, price_labels=None):
+    # Filas de las tres tablas de trabajo (entrada/salida de cada etapa en el perfilado)
+    def _filas_entrada(self) -> int:
+        return sum(len(df) for df in (self.listings, self.calendar, self.reviews) if df is not None)
+
+    # ----------------------------- Checkpoints -----------------------------
+
+    def _etapas_run(self, chunk_listings=None, star_schema=False) -> list:
+        """Nombres de las etapas que ejecuta run() con esta configuración, en orden."""
+        return [e for e in self.ETAPAS
+                if (e != 'build_calendar_matrix' or self.calendario_denso)
+                and (e != 'build_flat_sheet' or not (chunk_listings or star_schema))]
+
+    def _parametros_checkpoint(self, **valores) -> dict:
+        """{etapa: parámetros que afectan a esa etapa y a las anteriores} (incluye flags de la instancia)."""
+        valores.update(amenities_completas=self.amenities_completas, plan_tipos=self.plan_tipos)
+        acumulado, salida = {}, {}
+        for etapa in self.ETAPAS:
+            acumulado.update({p: valores.get(p) for p in self.PARAMETROS_ETAPA.get(etapa, ())})
+            salida[etapa] = dict(acumulado)
+        return salida
+
+    def _huella_checkpoint(self):
+        """Huella de las entradas; si no se fijó, se calcula de los DataFrames recibidos (antes de transformarlos)."""
+        if self.huella_entrada is None:
+            self.huella_entrada = checkpoints.huella_frames({
+                'listings': self.listings, 'calendar': self.calendar, 'reviews': self.reviews,
+                'review_summary': self.review_summary})
+        return self.huella_entrada
+
+    def _checkpoint_vigente(self, etapa, parametros) -> bool:
+        return checkpoints.vigente(self.checkpoint_dir, etapa, self._huella_checkpoint(), parametros[etapa])
+
+    def _rango_etapas(self, nombres, parametros, reanudar=False, desde=None, hasta=None):
+        """
+        Índices (inicio, fin) de las etapas a ejecutar y checkpoint a restaurar antes de inicio
+        (None = se parte de las entradas). reanudar: continúa tras el último checkpoint vigente.
+        """
+        for etapa in (desde, hasta):
+            if etapa is not None and etapa not in nombres:
+                raise ValueError(f"[run] Etapa no aplicable en esta corrida: {etapa} (etapas: {nombres})")
+        fin = nombres.index(hasta) if hasta else len(nombres) - 1
+        inicio = nombres.index(desde) if desde else 0
+        if (reanudar or desde) and not self.checkpoint_dir:
+            raise ValueError("[run] reanudar/desde requieren checkpoint_dir")
+        if reanudar and not desde:
+            vigentes = [i for i in range(fin + 1) if self._checkpoint_vigente(nombres[i], parametros)]
+            inicio = vigentes[-1] + 1 if vigentes else 0
+        if inicio > fin + 1 or (desde and inicio > fin):
+            raise ValueError(f"[run] Rango de etapas vacío: desde={desde} hasta={hasta}")
+        previa = nombres[inicio - 1] if inicio > 0 else None
+        if previa and not self._checkpoint_vigente(previa, parametros):
+            raise ValueError(f"[run] Sin checkpoint vigente de {previa} en {self.checkpoint_dir} "
+                             f"(huella o parámetros distintos): no se puede empezar en {nombres[inicio]}")
+        return inicio, fin, previa
+
+    def ultimo_checkpoint(self, price_mode='quantile', price_bins=None, price_labels=None, date_output='iso',
+                          chunk_listings=None, star_schema=False, desde=None, hasta=None):
+        """
+        Checkpoint desde el que run(reanudar=True, ...) con los mismos argumentos continuaría, o None si
+        tiene que partir de las entradas (así quien llama sabe si puede omitir la extracción).
+        """
+        if not self.checkpoint_dir or not arrow_disponible():
+            return None
+        parametros = self._parametros_checkpoint(price_mode=price_mode, price_bins=price_bins,
+                                                 price_labels=price_labels, date_output=date_output)
+        return self._rango_etapas(self._etapas_run(chunk_listings, star_schema), parametros,
+                                  reanudar=True, desde=desde, hasta=hasta)[2]
+
+    def _guardar_checkpoint(self, etapa, parametros):
+        """Tablas de trabajo (o la sábana, tras build_flat_sheet) y amenities completas de la etapa."""
+        if etapa == 'build_flat_sheet':
+            tablas = {'flat_sheet': self.flat_sheet}
+        else:
+            tablas = {'listings': self.listings, 'calendar': self.calendar, 'reviews': self.reviews,
+                      'review_summary': self.review_summary}
+        tablas['amenities_long'] = self.amenities_long
+        if self.amenities_sparse is not None:
+            tablas['amenities_ids'] = pd.DataFrame({'listing_id': self.amenities_sparse.index.to_numpy()})
+        with perfilado.etapa(f"transformacion.checkpoint.{etapa}"):
+            manifest = checkpoints.guardar(self.checkpoint_dir, etapa, tablas, self._huella_checkpoint(),
+                                           parametros[etapa],
+                                           extra={'tipos': self.tipos, 'date_output': self.date_output},
+                                           posteriores=self.ETAPAS[self.ETAPAS.index(etapa) + 1:])
+        self.logs.log(f"[checkpoint] {etapa} guardado en {self.checkpoint_dir} | "
+                      f"filas={ {n: t['filas'] for n, t in manifest['tablas'].items()} }", "info")
+
+    def _restaurar_checkpoint(self, etapa, nombres):
+        """Carga el estado que dejó la etapa: tablas, registro de tipos, formato de fecha y amenities completas."""
+        with perfilado.etapa(f"transformacion.restaurar.{etapa}"):
+            tablas, manifest = checkpoints.cargar(self.checkpoint_dir, etapa)
+        if etapa == 'build_flat_sheet':
+            self.flat_sheet = tablas['flat_sheet']
+        else:
+            self.listings = tablas.get('listings', pd.DataFrame())
+            self.calendar = tablas.get('calendar', pd.DataFrame())
+            self.reviews = tablas.get('reviews', pd.DataFrame())
+            self.review_summary = tablas.get('review_summary')
+        self.tipos = manifest.get('tipos', self.tipos)
+        self.date_output = manifest.get('date_output', self.date_output)
+        self._fechas = {}
+
+        # Amenities completas: la forma larga se guarda tal cual; la matriz dispersa se rehace con sus ids
+        self.amenities_long = tablas.get('amenities_long')
+        ids = tablas.get('amenities_ids')
+        if self.amenities_long is not None and ids is not None and ids['listing_id'].is_unique:
+            index = pd.Index(ids['listing_id'], name='listing_id')
+            long = pd.DataFrame({'pos': index.get_indexer(self.amenities_long['listing_id']),
+                                 'slug': self.amenities_long['amenity']})
+            self.amenities_sparse = self._sparse_matrix(long, index, 'amenities')
+
+        # Calendar denso: se abre el que quedó en disco o se reconstruye desde el calendar restaurado
+        if self.calendario_denso and 'build_calendar_matrix' in nombres[:nombres.index(etapa)]:
+            directorio = self.calendario_denso_dir
+            if directorio and os.path.exists(os.path.join(directorio, ARCHIVO_META)):
+                self.calendar_matrix = CalendarioDenso.abrir(directorio)
+            elif etapa != 'build_flat_sheet':
+                self.build_calendar_matrix()
+            else:
+                self.logs.log("[checkpoint] Sin calendar denso en disco para la sábana restaurada", "warning")
+        self.logs.log(f"[checkpoint] Restaurado {etapa} ({manifest.get('creado')}) | "
+                      f"filas={ {n: t['filas'] for n, t in manifest['tablas'].items()} }", "info")
+
+    def run(self, price_mode='quantile', price_bins=None, price_labels=None, date_output='iso',
+            chunk_listings=None, text_workers=1, star_schema=False, reanudar=False, desde=None, hasta=None):
         """
         Propósito:
           - Ejecutar el flujo completo y devolver la sábana final.
+          - date_output: 'iso' (strings) o 'datetime' (datetime64 UTC) para las fechas.
+          - chunk_listings: si se indica, la sábana se entrega por bloques de ese número de
+            listings (ver iter_flat_sheet) en lugar de un único DataFrame.
+          - star_schema: construir dimensión y hechos (build_star_schema) en lugar de la sábana.
+          - text_workers: procesos para la limpieza de texto largo (1 = serial).
+          - Con checkpoint_dir, la salida de cada etapa se guarda en Parquet con su manifest.
+            reanudar: seguir tras el último checkpoint vigente (misma huella de entrada y parámetros).
+            desde/hasta: ejecutar solo ese rango de etapas (desde parte del checkpoint de la anterior).
 
         Logs:
           - Parámetros de ejecución y forma final de la sábana.
 
         Retorna:
-          - pd.DataFrame (flat_sheet)
+          - pd.DataFrame (flat_sheet), un generador de bloques si chunk_listings está definido,
+            o el dict de tablas (star_schema) si star_schema=True; self si hasta corta antes del final.
         """
         self.logs.log(
             f"[run] Inicio | price_mode={price_mode}, "
             f"price_bins={'set' if price_bins is not None else None}, "
-            f"price_labels={'set' if price_labels is not None else None}",
+            f"price_labels={'set' if price_labels is not None else None}, "
+            f"date_output={date_output}",
             "info"
         )
 
-        (self.normalize_types()
-             .clean_nulls()
-             .derive_features(price_mode=price_mode, price_bins=price_bins, price_labels=price_labels)
-             .expand_nested_fields()
-             .build_flat_sheet())
+        # Cada etapa se mide con perfilado (no hace nada si no hay un perfilador activo)
+        etapas = [
+            ("normalize_types", lambda: self.normalize_types(date_output=date_output, text_workers=text_workers)),
+            ("clean_nulls", self.clean_nulls),
+            ("derive_features", lambda: self.derive_features(price_mode=price_mode, price_bins=price_bins,
+                                                             price_labels=price_labels)),
+            ("expand_nested_fields", self.expand_nested_fields),
+        ]
+        if self.calendario_denso:
+            # Después de clean_nulls: available/price_num/noches ya normalizados e imputados
+            etapas.insert(2, ("build_calendar_matrix", self.build_calendar_matrix))
+        if not (chunk_listings or star_schema):
+            etapas.append(("build_flat_sheet", self.build_flat_sheet))
+        nombres = [nombre for nombre, _ in etapas]
+
+        if self.checkpoint_dir and not arrow_disponible():
+            self.logs.log("[run] pyarrow no disponible: se ejecuta sin checkpoints", "warning")
+            self.checkpoint_dir = None
+        parametros = self._parametros_checkpoint(price_mode=price_mode, price_bins=price_bins,
+                                                 price_labels=price_labels, date_output=date_output)
+        inicio, fin, previa = self._rango_etapas(nombres, parametros, reanudar, desde, hasta)
+        if self.checkpoint_dir:
+            self._huella_checkpoint()
+        if previa:
+            self._restaurar_checkpoint(previa, nombres)
+        if inicio or fin < len(nombres) - 1:
+            self.logs.log(f"[run] Etapas {nombres[inicio:fin + 1]} | checkpoint inicial={previa}", "info")
+
+        for nombre, paso in etapas[inicio:fin + 1]:
+            sabana = nombre == "build_flat_sheet"
+            with perfilado.etapa(f"transformacion.{nombre}",
+                                 len(self.calendar) if sabana else self._filas_entrada()) as reg:
+                paso()
+                reg["filas_salida"] = self.flat_sheet if sabana else self._filas_entrada()
+            if self.checkpoint_dir:
+                self._guardar_checkpoint(nombre, parametros)
+
+        if fin < len(nombres) - 1:
+            self.logs.log(f"[run] Fin | detenido tras {nombres[fin]}", "info")
+            return self
+
+        if star_schema:
+            with perfilado.etapa("transformacion.build_star_schema", len(self.calendar)) as reg:
+                self.build_star_schema()
+                reg["filas_salida"] = self.star_schema['fact_calendar_day']
+            self.logs.log(f"[run] Fin | esquema estrella={list(self.star_schema)}", "info")
+            return self.star_schema
+
+        if chunk_listings:
+            self.logs.log(f"[run] Fin | sábana por bloques de {chunk_listings} listings", "info")
+            return self.iter_flat_sheet(chunk_listings)
 
         self.logs.log(f"[run] Fin | flat_sheet={self.flat_sheet.shape}", "info")
         return self.flat_sheet
@@ -0,0 +1,64 @@
+#Exportación Excel por partes: la escritura en paralelo (Arrow IPC + pool de procesos) debe dejar
+#las mismas celdas que la secuencial, también con columnas de tipos mezclados.
+#
+#Uso (desde la raíz del repositorio):
+#  python -m pytest -q tests
+import glob
+import os
+import sys
+
+import pytest
+
+DIR_TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIR_TESTS, "..", "src"))
+sys.path.insert(0, os.path.join(DIR_TESTS, "..", "benchmarks"))
+
+import sintetico  # noqa: E402
+from carga import Carga  # noqa: E402
+from transformacion import Transformation  # noqa: E402
+
+openpyxl = pytest.importorskip("openpyxl")
+pytest.importorskip("pyarrow")
+
+FILAS_POR_PARTE = 400
+
+
+@pytest.fixture(scope="module")
+def sabana():
+    tf = Transformation(*sintetico.generar(0.25, 0, 20))
+    tf.run(text_workers=1)
+    flat = tf.flat_sheet
+    # 't'/'f' con False, como sale de Mongo cuando el campo se cargó con tipos distintos
+    mixta = flat["host_is_superhost"].astype(object)
+    mixta.iloc[::7] = False
+    return flat.assign(host_is_superhost=mixta)
+
+
+def _celdas(base_path):
+    filas = []
+    for ruta in sorted(glob.glob(f"{base_path}_part_*.xlsx"), key=lambda p: int(p.rsplit("_", 1)[1][:-5])):
+        wb = openpyxl.load_workbook(ruta, read_only=True)
+        filas.extend(list(wb.active.iter_rows(values_only=True))[1:])
+        wb.close()
+    return filas
+
+
+#openpyxl omite las celdas vacías del final de la fila: se comparan con relleno
+def _rellenar(filas, ancho):
+    return [tuple(f) + (None,) * (ancho - len(f)) for f in filas]
+
+
+@pytest.mark.parametrize("motor", ["xlsxwriter", "openpyxl"])
+def test_partes_en_paralelo_iguales_a_secuencial(sabana, tmp_path, motor):
+    celdas = {}
+    for workers in (1, 3):
+        base = str(tmp_path / f"w{workers}" / "sabana")
+        rutas = Carga(sabana, sqlite_path=str(tmp_path / "x.db")).exportar_a_excel_particionado(
+            df=sabana.copy(), base_path=base, max_rows_per_file=FILAS_POR_PARTE, motor=motor,
+            max_workers=workers, truncate_text_cols=False)
+        assert len(rutas) > 1
+        celdas[workers] = _celdas(base)
+    assert len(celdas[1]) == len(sabana)
+    ancho = len(sabana.columns)
+    assert _rellenar(celdas[1], ancho) == _rellenar(celdas[3], ancho)
+    assert not glob.glob(str(tmp_path / "w3" / "*_excel_tmp.*"))
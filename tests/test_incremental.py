@@ -0,0 +1,246 @@
+#Pruebas del ETL incremental (detección de cambios + upsert en SQLite) contra un MongoDB falso en memoria.
+#La colección falsa implementa find/find_one como pymongo (Extraction.iter_mongodb_batches y sample_value corren
+#tal cual); las agregaciones ($group, $project, resumen por mes) se calculan en pandas con la misma semántica.
+#
+#Uso (desde la raíz del repositorio):
+#  python -m pytest -q tests
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+DIR_TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DIR_TESTS, "..", "src"))
+sys.path.insert(0, os.path.join(DIR_TESTS, "..", "benchmarks"))
+
+import extraction  # noqa: E402
+import incremental  # noqa: E402
+import main_etl  # noqa: E402
+import sintetico  # noqa: E402
+
+DIAS = 20
+COLUMNAS_LISTING = ["first_review", "last_review"]
+
+
+# --------- MongoDB falso ---------
+def _cumple(doc, query):
+    for campo, cond in (query or {}).items():
+        if campo == "$and":
+            if not all(_cumple(doc, q) for q in cond):
+                return False
+        elif campo == "$or":
+            if not any(_cumple(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict):
+            v = doc.get(campo)
+            for op, ref in cond.items():
+                ok = {"$in": lambda: v in ref, "$ne": lambda: v != ref,
+                      "$gt": lambda: v is not None and v > ref, "$lt": lambda: v is not None and v < ref,
+                      "$gte": lambda: v is not None and v >= ref}[op]()
+                if not ok:
+                    return False
+        elif doc.get(campo) != cond:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __iter__(self):
+        return self._docs
+
+    def close(self):
+        pass
+
+
+class ColeccionFalsa:
+    def __init__(self, df):
+        self.docs = df.to_dict("records")
+
+    def _filtrar(self, query):
+        return [d for d in self.docs if _cumple(d, query)]
+
+    def find(self, query=None, projection=None, batch_size=None):
+        fuera = {k for k, v in (projection or {}).items() if not v}
+        return _Cursor([{k: v for k, v in d.items() if k not in fuera} for d in self._filtrar(query)])
+
+    def find_one(self, query=None, projection=None):
+        docs = self._filtrar(query)
+        if not docs:
+            return None
+        dentro = [k for k, v in (projection or {}).items() if v]
+        return {k: docs[0].get(k) for k in dentro} if dentro else docs[0]
+
+    def frame(self, query=None):
+        return pd.DataFrame(self._filtrar(query))
+
+
+class BaseFalsa(dict):
+    def list_collection_names(self):
+        return list(self)
+
+
+def _numero(v):
+    #Misma conversión que Extraction._numeric_expr
+    if isinstance(v, bool):
+        return float(v)
+    if isinstance(v, (int, float, np.integer, np.floating)):
+        return 0.0 if np.isnan(v) else float(v)
+    if v == "t":
+        return 1.0
+    if v is None or v == "f":
+        return 0.0
+    try:
+        return float(str(v).replace("$", "").replace(",", ""))
+    except ValueError:
+        return 0.0
+
+
+class ExtraccionFalsa(extraction.Extraction):
+    base = None
+
+    def mongodb_connection(self, uri, database, max_pool_size=50):
+        return self.base
+
+    def close_mongodb_connection(self):
+        pass
+
+    def group_signatures(self, db, colecction_name, key='listing_id', date_field='date', query=None,
+                         content_fields=None, content_before=None):
+        df = db[colecction_name].frame(query)
+        for c in content_fields or []:
+            df[f'_{c}'] = df[c].map(_numero)
+        g = df.groupby(key)
+        out = pd.DataFrame({'n': g.size(), 'min_fecha': g[date_field].min(), 'max_fecha': g[date_field].max()})
+        for c in content_fields or []:
+            out[f'suma_{c}'] = g[f'_{c}'].sum()
+        if content_fields and content_before is not None:
+            antes = df[df[date_field] < content_before]
+            out['n_antes'] = antes.groupby(key).size().reindex(out.index).fillna(0).astype(int)
+            for c in content_fields:
+                out[f'suma_{c}_antes'] = antes.groupby(key)[f'_{c}'].sum().reindex(out.index).fillna(0.0)
+        return out.rename_axis(key).reset_index()
+
+    def content_values(self, db, colecction_name, content_fields, before, key='listing_id', date_field='date', query=None):
+        df = db[colecction_name].frame(query)
+        df = df[df[date_field] < before]
+        out = pd.DataFrame({key: df[key], 'fecha': df[date_field]})
+        for c in content_fields:
+            out[c] = df[c].map(_numero)
+        return out.reset_index(drop=True)
+
+    def review_month_summary(self, db, colecction_name, key='listing_id', date_field='date', query=None):
+        df = db[colecction_name].frame(query)
+        fecha = pd.to_datetime(df[date_field], errors='coerce', utc=True)
+        df = df.assign(fecha=fecha, year=fecha.dt.year, month=fecha.dt.month, con_id=df['id'].notna())[fecha.notna()]
+        g = df.groupby([key, 'year', 'month'])
+        return pd.DataFrame({'n': g['con_id'].sum(), 'min_fecha': g['fecha'].min(),
+                             'max_fecha': g['fecha'].max()}).reset_index()
+
+
+# --------- Escenario ---------
+def _texto(fechas):
+    return [d["$date"][:10] if isinstance(d, dict) else d for d in fechas]
+
+
+@pytest.fixture
+def origen(monkeypatch):
+    listings, calendar, reviews = sintetico.generar(0.25, 0, DIAS)
+    calendar = calendar.assign(date=_texto(calendar["date"]))
+    reviews = reviews.assign(date=_texto(reviews["date"]))
+    base = BaseFalsa(listings_mx=ColeccionFalsa(listings), calendar_mx=ColeccionFalsa(calendar),
+                     reviews_mx=ColeccionFalsa(reviews))
+    monkeypatch.setattr(ExtraccionFalsa, "base", base)
+    monkeypatch.setattr(main_etl, "Extraction", ExtraccionFalsa)
+    monkeypatch.setattr(main_etl, "PARTICIONES", {})
+    monkeypatch.setattr(main_etl, "CUBOS", False)
+    return base
+
+
+def _correr(directorio):
+    args = main_etl.parse_args(["--incremental", "--text-workers", "1"])
+    return main_etl.ejecutar_etl_incremental(args, "bi_mx", "mx", str(directorio))
+
+
+def _sabana(directorio):
+    conn = sqlite3.connect(os.path.join(directorio, "airbnb.db"))
+    try:
+        df = pd.read_sql("SELECT * FROM airbnb_limpio", conn)
+    finally:
+        conn.close()
+    return df.sort_values(["listing_id", "date"]).reset_index(drop=True)
+
+
+def _correr_un_dia(base):
+    #El calendar avanza un día: sale el primero y entra uno nuevo (copia del último) por listing
+    cal = base["calendar_mx"]
+    primero, ultimo = min(d["date"] for d in cal.docs), max(d["date"] for d in cal.docs)
+    nuevo = (pd.Timestamp(ultimo) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    siguiente = max(d["_id"] for d in cal.docs) + 1
+    nuevos = []
+    for d in cal.docs:
+        if d["date"] == ultimo:
+            nuevos.append({**d, "_id": siguiente + len(nuevos), "date": nuevo})
+    cal.docs = [d for d in cal.docs if d["date"] != primero] + nuevos
+    return primero, nuevo
+
+
+def test_avance_de_un_dia_sin_reprocesar_y_como_corrida_completa(origen, tmp_path):
+    _correr(tmp_path / "inc")
+    primero, nuevo = _correr_un_dia(origen)
+    resumen = _correr(tmp_path / "inc")
+    _correr(tmp_path / "completa")
+
+    n_listings = len(origen["listings_mx"].docs)
+    assert resumen["nuevos"] == resumen["cambiados"] == resumen["eliminados"] == 0
+    assert resumen["filas"] == n_listings  # solo el día nuevo de cada listing
+
+    inc, completa = _sabana(tmp_path / "inc"), _sabana(tmp_path / "completa")
+    assert inc["date"].min() > primero and inc["date"].max() == nuevo
+    assert inc[["listing_id", "date"]].equals(completa[["listing_id", "date"]])
+    # Atributos del listing: un solo valor por listing e iguales a los de la corrida completa
+    assert (inc.groupby("listing_id")[COLUMNAS_LISTING].nunique() == 1).all().all()
+    for c in COLUMNAS_LISTING + ["reviews_in_month"]:
+        assert inc[c].equals(completa[c]), c
+
+
+def test_edicion_de_dia_cargado_y_contadores(origen, tmp_path):
+    _correr(tmp_path / "inc")
+    cal, lst = origen["calendar_mx"], origen["listings_mx"]
+    editado, con_contador = lst.docs[0]["id"], lst.docs[1]["id"]
+    dia = sorted((d for d in cal.docs if d["listing_id"] == editado), key=lambda d: d["date"])[5]
+    dia["price"] = "$99,999.00"
+    lst.docs[1]["availability_365"] = (lst.docs[1]["availability_365"] + 7) % 365
+
+    resumen = _correr(tmp_path / "inc")
+    assert (resumen["nuevos"], resumen["cambiados"], resumen["eliminados"]) == (0, 1, 0)
+    inc = _sabana(tmp_path / "inc")
+    assert inc.loc[(inc["listing_id"] == editado) & (inc["date"] == dia["date"]), "price_num"].item() == 99999.0
+    assert (inc.loc[inc["listing_id"] == con_contador, "availability_365"] == lst.docs[1]["availability_365"]).all()
+
+    estado = incremental.TABLA_ESTADO
+    conn = sqlite3.connect(os.path.join(tmp_path / "inc", "airbnb.db"))
+    try:
+        assert pd.read_sql(f"SELECT COUNT(*) AS n FROM {estado}", conn)["n"].item() == len(lst.docs)
+    finally:
+        conn.close()
+    # Sin cambios en origen, la siguiente corrida no re-extrae nada
+    assert _correr(tmp_path / "inc")["filas"] == 0
+
+
+def test_extraccion_fallida_no_reemplaza_la_sabana(origen, tmp_path, monkeypatch):
+    _correr(tmp_path / "inc")
+    antes = _sabana(tmp_path / "inc")
+    _correr_un_dia(origen)
+    # Extraction registra el error y devuelve None: la corrida debe cortarse sin tocar airbnb_limpio
+    cargar = ExtraccionFalsa.load_mongodb_datasets
+    monkeypatch.setattr(ExtraccionFalsa, "load_mongodb_datasets",
+                        lambda self, db, nombre, *a, **k: None if nombre == "calendar_mx" else cargar(self, db, nombre, *a, **k))
+    with pytest.raises(RuntimeError, match="calendar"):
+        _correr(tmp_path / "inc")
+    assert _sabana(tmp_path / "inc").equals(antes)